@@ -0,0 +1,169 @@
+"""
+Moves and copies originals into the archive without copying bytes when the file system allows it.
+
+Within a file system a move is a rename and a copy is a reflink (copy-on-write clone) where supported. Only across
+file systems, or when the file system can't clone, the bytes are copied, in the kernel with copy_file_range or
+sendfile where available, and the copy is verified before the source is removed.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from audio_conversion_tools.logging import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl of Linux to clone a file on Btrfs, XFS and other copy-on-write file systems, _IOW(0x94, 9, int).
+FICLONE = 0x40049409
+
+# How the file ended up in its destination.
+RENAMED = "rename"
+REFLINKED = "reflink"
+HARDLINKED = "hardlink"
+COPIED = "copy"
+
+_COPY_CHUNK_SIZE = 2**26
+_HASH_CHUNK_SIZE = 2**20
+
+
+class ArchiveError(OSError): ...
+
+
+def same_device(source: str | Path, destination: str | Path) -> bool:
+    """Whether source and the folder of destination are on the same file system."""
+    return os.stat(source).st_dev == os.stat(Path(destination).parent).st_dev
+
+
+def move_file(source: str | Path, destination: str | Path, verify_contents: bool = False) -> str:
+    """
+    Moves source to destination and returns how: renamed within a file system, or copied and verified across file
+    systems, after which source is removed. With verify_contents the copy is compared by hash instead of by size.
+    """
+    try:
+        os.rename(source, destination)
+        return RENAMED
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    method = copy_file(source, destination, verify_contents=verify_contents)
+    os.unlink(source)
+    return method
+
+
+def copy_file(
+    source: str | Path,
+    destination: str | Path,
+    allow_hardlink: bool = False,
+    verify_contents: bool = False,
+) -> str:
+    """
+    Copies source to destination and returns how: reflinked, hardlinked or copied.
+
+    A hardlink shares the data with source, so changing one changes the other, which is why it is only made with
+    allow_hardlink. Byte copies are verified by size, or by hash with verify_contents, and removed if they differ.
+    """
+    if same_device(source, destination):
+        if _reflink(source, destination):
+            return REFLINKED
+        if allow_hardlink:
+            try:
+                os.link(source, destination)
+                return HARDLINKED
+            except OSError as e:
+                logger.debug(f"Could not hardlink {source} to {destination}: {e}")
+
+    try:
+        _stream_copy(source, destination)
+        _verify_copy(source, destination, verify_contents)
+    except OSError:
+        # Never leave a partial copy behind in the archive.
+        Path(destination).unlink(missing_ok=True)
+        raise
+    return COPIED
+
+
+def _reflink(source: str | Path, destination: str | Path) -> bool:
+    if fcntl is None:
+        return False
+
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            reflinked = False
+        else:
+            reflinked = True
+    if not reflinked:
+        os.unlink(destination)
+    else:
+        shutil.copystat(source, destination)
+    return reflinked
+
+
+def _stream_copy(source: str | Path, destination: str | Path) -> None:
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        source_fd, destination_fd = source_file.fileno(), destination_file.fileno()
+        size = os.fstat(source_fd).st_size
+        if not _kernel_copy(source_fd, destination_fd, size):
+            shutil.copyfileobj(source_file, destination_file, _COPY_CHUNK_SIZE)
+        destination_file.flush()
+        os.fsync(destination_fd)
+    shutil.copystat(source, destination)
+
+
+def _kernel_copy(source_fd: int, destination_fd: int, size: int) -> bool:
+    """Copies in the kernel with copy_file_range or sendfile, returns False if neither works for these files."""
+    copy_chunks = [_copy_file_range_chunk]
+    # sendfile of macOS and the BSDs only writes to sockets.
+    if sys.platform.startswith("linux"):
+        copy_chunks.append(_sendfile_chunk)
+    for copy_chunk in copy_chunks:
+        copied = 0
+        try:
+            while copied < size:
+                n = copy_chunk(source_fd, destination_fd, copied, min(size - copied, _COPY_CHUNK_SIZE))
+                if n == 0:
+                    break
+                copied += n
+        except (OSError, AttributeError) as e:
+            # Nothing is copied yet when the platform or file system doesn't support it, so we can try the next one.
+            if copied > 0:
+                raise
+            logger.debug(f"Could not copy in the kernel with {copy_chunk.__name__}: {e}")
+            continue
+        if copied > 0 or size == 0:
+            return True
+    return False
+
+
+def _copy_file_range_chunk(source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(source_fd, destination_fd, count, offset, offset)
+
+
+def _sendfile_chunk(source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+    # Writes at the position of the destination, which advances with every call.
+    return os.sendfile(destination_fd, source_fd, offset, count)
+
+
+def _verify_copy(source: str | Path, destination: str | Path, verify_contents: bool) -> None:
+    source_size, destination_size = os.path.getsize(source), os.path.getsize(destination)
+    if source_size != destination_size:
+        raise ArchiveError(f"Copy of {source} to {destination} has {destination_size} of {source_size} bytes")
+    if verify_contents and file_hash(source) != file_hash(destination):
+        raise ArchiveError(f"Copy of {source} to {destination} differs from the original")
+
+
+def file_hash(file_name: str | Path) -> bytes:
+    file_hash = hashlib.blake2b()
+    with open(file_name, "rb") as file:
+        while chunk := file.read(_HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.digest()
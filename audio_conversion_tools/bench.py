@@ -0,0 +1,191 @@
+"""
+Benchmarks of the probe, classification and conversion throughput on synthetic corpora, so changes can be compared
+against a baseline. Everything is generated offline, nothing of a real collection is needed.
+"""
+
+import itertools
+import json
+import platform
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable
+from urllib.parse import quote
+
+import numpy as np
+import soundfile as sf
+
+from audio_conversion_tools.convert_audio import BACKENDS, convert_to_aiff, get_file_info
+from audio_conversion_tools.engine import run_jobs
+from audio_conversion_tools.rekordbox.classify import CollectionClassification, classify_tracks
+from audio_conversion_tools.rekordbox.xml_reader import iter_tracks
+
+# Formats of the synthetic files: (extension, soundfile format, subtypes). FLAC only goes up to 24 bit.
+CORPUS_FORMATS = [
+    ("wav", "WAV", ["PCM_16", "PCM_24", "PCM_32"]),
+    ("aiff", "AIFF", ["PCM_16", "PCM_24", "PCM_32"]),
+    ("flac", "FLAC", ["PCM_16", "PCM_24"]),
+]
+CORPUS_SAMPLE_RATES = [44100, 48000, 88200, 96000, 192000]
+DEFAULT_DURATION = 1.0
+DEFAULT_SEED = 0
+
+# Kinds of the tracks in a synthetic Rekordbox collection, with the bit rates Rekordbox writes for them.
+_XML_KINDS = ["WAV File", "AIFF File", "FLAC File", "MP3 File"]
+_BIT_DEPTHS = [16, 24, 32]
+
+
+def make_corpus(
+    directory: str | Path,
+    num_files: int,
+    duration: float = DEFAULT_DURATION,
+    seed: int = DEFAULT_SEED,
+) -> list[Path]:
+    """Writes num_files stereo noise files of duration seconds, cycling through all formats and sample rates."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    combinations = [
+        (extension, file_format, subtype, sample_rate)
+        for extension, file_format, subtypes in CORPUS_FORMATS
+        for subtype in subtypes
+        for sample_rate in CORPUS_SAMPLE_RATES
+    ]
+    # Shuffled, so a small corpus still has a mix of formats.
+    order = itertools.cycle(rng.permutation(len(combinations)))
+    files = []
+    for i, combination in enumerate(itertools.islice(order, num_files)):
+        extension, file_format, subtype, sample_rate = combinations[combination]
+        file_name = directory / f"{i:06d}_{subtype.lower()}_{sample_rate}.{extension}"
+        samples = rng.uniform(-0.5, 0.5, size=(int(duration * sample_rate), 2))
+        sf.write(file_name, samples, sample_rate, subtype=subtype, format=file_format)
+        files.append(file_name)
+    return files
+
+
+def make_rekordbox_xml(xml_location: str | Path, num_tracks: int, seed: int = DEFAULT_SEED) -> None:
+    """Writes a Rekordbox XML export with num_tracks tracks of random kinds, sample rates and bit depths."""
+    rng = np.random.default_rng(seed)
+    kinds = rng.integers(len(_XML_KINDS), size=num_tracks)
+    sample_rates = rng.choice(CORPUS_SAMPLE_RATES, size=num_tracks)
+    bit_depths = rng.choice(_BIT_DEPTHS, size=num_tracks)
+
+    with open(xml_location, "w") as xml_file:
+        xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n<DJ_PLAYLISTS Version="1.0.0">\n')
+        xml_file.write(f'  <COLLECTION Entries="{num_tracks}">\n')
+        for i in range(num_tracks):
+            kind = _XML_KINDS[kinds[i]]
+            bit_rate = 320 if kind == "MP3 File" else int(sample_rates[i] * bit_depths[i] * 2 / 1000)
+            location = quote(f"/Music/Synthetic/Track {i}.{kind.split()[0].lower()}")
+            xml_file.write(
+                f'    <TRACK TrackID="{i}" Name="Track {i}" Kind="{kind}" SampleRate="{sample_rates[i]}"'
+                f' BitRate="{bit_rate}" Location="file://localhost{location}"/>\n'
+            )
+        xml_file.write("  </COLLECTION>\n</DJ_PLAYLISTS>\n")
+
+
+def bench_probe(files: list[Path], repeat: int = 3) -> dict:
+    """Probes all files repeat times without the probe cache."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_name in files:
+            get_file_info(str(file_name))
+    elapsed = time.perf_counter() - start
+    return {"files": len(files), "seconds": elapsed, "probes_per_second": repeat * len(files) / elapsed}
+
+
+def bench_classify(xml_location: str | Path) -> dict:
+    """Reads and classifies a Rekordbox XML export, like rekordbox-convert-unplayable-files does."""
+    classification = CollectionClassification()
+    start = time.perf_counter()
+    num_unplayable = sum(1 for _ in classify_tracks(iter_tracks(xml_location), classification))
+    elapsed = time.perf_counter() - start
+    return {
+        "tracks": classification.num_tracks,
+        "unplayable": num_unplayable,
+        "seconds": elapsed,
+        "tracks_per_second": classification.num_tracks / elapsed,
+    }
+
+
+def bench_convert(files: list[Path], output_directory: str | Path, backend: str, jobs: int | None = None) -> dict:
+    """Converts all files to 16 bit AIFF in output_directory, the files themselves are left alone."""
+    output_directory = Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+    audio_seconds = sum(sf.info(str(file_name)).duration for file_name in files)
+
+    start = time.perf_counter()
+    summary = run_jobs(
+        lambda file_name: convert_to_aiff(
+            str(file_name), str(output_directory / f"{file_name.stem}.aiff"), backend=backend
+        ),
+        files,
+        jobs=jobs,
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(files),
+        "failed": len(summary.failed),
+        "seconds": elapsed,
+        "files_per_second": len(files) / elapsed,
+        "realtime_factor": audio_seconds / elapsed,
+    }
+
+
+def run_benchmarks(
+    num_files: int = 50,
+    collection_sizes: Iterable[int] = (1_000, 10_000, 200_000),
+    backends: Iterable[str] = BACKENDS,
+    jobs: int | None = None,
+    duration: float = DEFAULT_DURATION,
+    work_directory: str | Path | None = None,
+) -> dict:
+    """Runs all benchmarks on freshly generated corpora and returns the results as a JSON serializable dict."""
+    with tempfile.TemporaryDirectory(dir=work_directory) as directory:
+        directory = Path(directory)
+        files = make_corpus(directory / "corpus", num_files, duration=duration)
+
+        classify = {}
+        for num_tracks in collection_sizes:
+            xml_location = directory / f"rekordbox_{num_tracks}.xml"
+            make_rekordbox_xml(xml_location, num_tracks)
+            classify[str(num_tracks)] = bench_classify(xml_location)
+
+        convert = {
+            backend: bench_convert(files, directory / f"converted_{backend}", backend, jobs=jobs)
+            for backend in backends
+        }
+
+        return {
+            "machine": {"python": platform.python_version(), "platform": platform.platform()},
+            "probe": bench_probe(files),
+            "classify": classify,
+            "convert": convert,
+        }
+
+
+def compare(results: dict, baseline: dict) -> dict[str, float]:
+    """Ratios of the throughputs in results to the ones in baseline, above 1 means faster than the baseline."""
+    ratios = {}
+    for path, value in _throughputs(results).items():
+        baseline_value = _throughputs(baseline).get(path)
+        if baseline_value:
+            ratios[path] = value / baseline_value
+    return ratios
+
+
+def _throughputs(results: dict, prefix: str = "") -> dict[str, float]:
+    throughputs = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            throughputs.update(_throughputs(value, f"{path}."))
+        elif key.endswith("_per_second") or key == "realtime_factor":
+            throughputs[path] = value
+    return throughputs
+
+
+def write_results(results: dict, output_location: str | Path) -> None:
+    with open(output_location, "w") as output_file:
+        json.dump(results, output_file, indent=2)
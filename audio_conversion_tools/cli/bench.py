@@ -0,0 +1,52 @@
+import argparse
+import json
+
+from audio_conversion_tools.bench import DEFAULT_DURATION, compare, run_benchmarks, write_results
+from audio_conversion_tools.convert_audio import BACKENDS
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
+from audio_conversion_tools.logging import logger
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark probing, Rekordbox classification and conversion on synthetic corpora."
+    )
+    parser.add_argument("--files", type=int, default=50, help="Number of audio files to generate and convert.")
+    parser.add_argument(
+        "--tracks",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 200_000],
+        help="Sizes of the synthetic Rekordbox collections to classify.",
+    )
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS, help="Backends to benchmark.")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of files to convert in parallel, defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--duration", type=float, default=DEFAULT_DURATION, help="Length of the generated files in seconds."
+    )
+    parser.add_argument("--output", default="bench.json", help="JSON file to write the results to.")
+    parser.add_argument("--baseline", default=None, help="JSON file of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    with open_ffmpeg_runner(progress_interval=None):
+        results = run_benchmarks(
+            num_files=args.files,
+            collection_sizes=args.tracks,
+            backends=args.backends,
+            jobs=args.jobs,
+            duration=args.duration,
+        )
+    write_results(results, args.output)
+    logger.info(f"Wrote benchmark results to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            ratios = compare(results, json.load(baseline_file))
+        for path, ratio in ratios.items():
+            logger.info(f"{path}: {ratio:.2f}x the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,35 +2,88 @@ import argparse
 import os
 
 from audio_conversion_tools.convert_audio import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    FfmpegBatcher,
     check_bit_depth_allowed,
     check_sample_rate_allowed,
     convert_aif_to_16bit,
     get_file_info,
+    worker_threads,
 )
+from audio_conversion_tools.engine import run_jobs
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
 from audio_conversion_tools.logging import logger
-from audio_conversion_tools.utils import find_files
+from audio_conversion_tools.probe_cache import ProbeCache, open_probe_cache
+from audio_conversion_tools.scratch import DEFAULT_SCRATCH_BUDGET, ScratchFolder
+from audio_conversion_tools.utils import ask_yes_no, confirm_recursive, find_files
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert AIFF files to 16-bit format.")
     parser.add_argument("--recursive", action="store_true", help="Enable recursive mode to process subdirectories.")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of files to convert in parallel, defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Convert with ffmpeg or in-process with numpy (WAV / AIFF / FLAC only).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the probe cache, probe every file again.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of files to convert per ffmpeg process, batching saves the ffmpeg startup for short files.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Kill ffmpeg when converting a single file takes longer than this many seconds.",
+    )
+    parser.add_argument(
+        "--scratch",
+        default=None,
+        help="Local folder to copy the files to and convert them in, for folders on a network share.",
+    )
+    parser.add_argument(
+        "--scratch-budget",
+        type=int,
+        default=DEFAULT_SCRATCH_BUDGET // 2**20,
+        help="MiB of the scratch folder the files that are being converted may take.",
+    )
     args = parser.parse_args()
 
-    convert_aiff_to_16_bit(recursive=args.recursive)
+    if args.recursive:
+        confirm_recursive()
+    delete_files = ask_yes_no("Do you want to delete the temp files after conversion?")
+
+    with open_probe_cache(enabled=not args.no_cache) as cache, open_ffmpeg_runner(timeout=args.timeout):
+        convert_aiff_to_16_bit(
+            recursive=args.recursive,
+            jobs=args.jobs,
+            backend=args.backend,
+            cache=cache,
+            batcher=FfmpegBatcher(args.batch_size) if args.batch_size > 1 else None,
+            scratch=ScratchFolder(args.scratch, args.scratch_budget * 2**20) if args.scratch else None,
+            delete_files=delete_files,
+        )
 
     input("\nFinished! Press any key to exit.")
 
 
-def convert_aiff_to_16_bit(recursive: bool) -> None:
-    if recursive:
-        input("Recursive mode enabled, will process subdirectories, if you are sure, press any key to continue.")
-    delete_files = input("Do you want to delete the temp files after conversion? y/n\n")
-
-    if delete_files not in ["y", "n"]:
-        raise ValueError("Answer should be y or n")
-    else:
-        delete_files = delete_files == "y"
-
+def convert_aiff_to_16_bit(
+    recursive: bool,
+    jobs: int | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    scratch: ScratchFolder | None = None,
+    delete_files: bool = False,
+) -> None:
     if delete_files:
         logger.info("Will delete temp files after conversion!")
 
@@ -41,25 +94,32 @@ def convert_aiff_to_16_bit(recursive: bool) -> None:
 
     logger.info(f"Currently in {root_directory}")
 
-    # We check which aiff files we want to convert
+    # We check which aiff files we want to convert, probing starts while the folder is still being scanned
+    num_available_files = 0
     files_to_convert = []
     for filename in available_files:
-        sample_rate, bit_depth = get_file_info(filename)
+        num_available_files += 1
+        sample_rate, bit_depth = get_file_info(filename, cache=cache)
 
         if not (check_bit_depth_allowed(bit_depth) and check_sample_rate_allowed(sample_rate)):
             files_to_convert.append(filename)
 
     logger.info(
-        f"Found {len(available_files)} AIFF files in total, {len(files_to_convert)} of which need to be converted"
+        f"Found {num_available_files} AIFF files in total, {len(files_to_convert)} of which need to be converted"
     )
     if len(files_to_convert) > 0:
         logger.info(f"Converting all non 16-bit .aif and .aiff files in the current folder: {files_to_convert}")
 
-        for file_name in files_to_convert:
-            if convert_aif_to_16bit(file_name) and delete_files:
+        def convert(file_name: str) -> bool:
+            if not convert_aif_to_16bit(file_name, backend=backend, cache=cache, batcher=batcher, scratch=scratch):
+                return False
+            if delete_files:
                 temp_name = file_name.rsplit(".", 1)[0] + "_temp.aiff"
                 os.remove(temp_name)
                 logger.info(f"Deleted temp file {temp_name}")
+            return True
+
+        run_jobs(convert, files_to_convert, jobs=worker_threads(jobs, batcher)).log("AIFF files")
 
 
 if __name__ == "__main__":
@@ -1,49 +1,143 @@
 import argparse
 import os
 
-from audio_conversion_tools.convert_audio import convert_to_aiff
+from audio_conversion_tools.convert_audio import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    FfmpegBatcher,
+    convert_to_aiff,
+    worker_threads,
+)
+from audio_conversion_tools.engine import run_jobs
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
+from audio_conversion_tools.freshness import Manifest
 from audio_conversion_tools.logging import logger
-from audio_conversion_tools.utils import find_files
+from audio_conversion_tools.probe_cache import ProbeCache, open_probe_cache
+from audio_conversion_tools.scratch import DEFAULT_SCRATCH_BUDGET, ScratchFolder
+from audio_conversion_tools.utils import ask_yes_no, confirm_recursive, find_files
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert AIFF files to 16-bit format.")
     parser.add_argument("--recursive", action="store_true", help="Enable recursive mode to process subdirectories.")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of files to convert in parallel, defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Convert with ffmpeg or in-process with numpy (WAV / AIFF / FLAC only).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the probe cache, probe every file again.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of files to convert per ffmpeg process, batching saves the ffmpeg startup for short files.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Kill ffmpeg when converting a single file takes longer than this many seconds.",
+    )
+    parser.add_argument(
+        "--scratch",
+        default=None,
+        help="Local folder to copy the files to and convert them in, for folders on a network share.",
+    )
+    parser.add_argument(
+        "--scratch-budget",
+        type=int,
+        default=DEFAULT_SCRATCH_BUDGET // 2**20,
+        help="MiB of the scratch folder the files that are being converted may take.",
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="Only convert files without an AIFF that is newer than the file, like make.",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="With --skip-unchanged, also store a hash of every converted file, so touched files are not converted again.",
+    )
     args = parser.parse_args()
 
-    convert_lossless_to_aiff(recursive=args.recursive)
-
-    input("Finished! Press any key to exit.")
+    if args.recursive:
+        confirm_recursive()
+    delete_files = ask_yes_no("Do you want to delete the files after conversion?")
 
+    with open_probe_cache(enabled=not args.no_cache) as cache, open_ffmpeg_runner(timeout=args.timeout):
+        convert_lossless_to_aiff(
+            recursive=args.recursive,
+            jobs=args.jobs,
+            backend=args.backend,
+            cache=cache,
+            batcher=FfmpegBatcher(args.batch_size) if args.batch_size > 1 else None,
+            scratch=ScratchFolder(args.scratch, args.scratch_budget * 2**20) if args.scratch else None,
+            skip_unchanged=args.skip_unchanged,
+            hash_sources=args.hash,
+            delete_files=delete_files,
+        )
 
-def convert_lossless_to_aiff(recursive: bool) -> None:
-    if recursive:
-        input("Recursive mode enabled, will process subdirectories, if you are sure, press any key to continue.")
-    delete_files = input("Do you want to delete the files after conversion? y/n\n")
+    input("Finished! Press any key to exit.")
 
-    if delete_files not in ["y", "n"]:
-        raise ValueError("Answer should be y or n")
-    else:
-        delete_files = delete_files == "y"
 
+def convert_lossless_to_aiff(
+    recursive: bool,
+    jobs: int | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    skip_unchanged: bool = False,
+    hash_sources: bool = False,
+    scratch: ScratchFolder | None = None,
+    delete_files: bool = False,
+) -> None:
     if delete_files:
         logger.info("Will delete all files after conversion!")
 
     # Get all wav and flac files in the current directory
-    files_to_convert = find_files(os.getcwd(), extensions=[".wav", ".flac"], recursive=recursive)
+    files_to_convert = list(find_files(os.getcwd(), extensions=[".wav", ".flac"], recursive=recursive))
+
+    manifest = None
+    if skip_unchanged:
+        manifest = Manifest(os.getcwd(), hash_sources=hash_sources)
+        num_files = len(files_to_convert)
+        files_to_convert = [
+            file_name for file_name in files_to_convert if not manifest.is_fresh(file_name, _aiff_name(file_name))
+        ]
+        logger.info(f"Skipping {num_files - len(files_to_convert)} files that were converted already")
 
     logger.info(f"Currently in {os.getcwd()}")
     if len(files_to_convert) > 0:
         logger.info(f"Converting all .wav and .flac files in the current folder: {files_to_convert}")
 
-        for file_name in files_to_convert:
-            if convert_to_aiff(file_name):
-                if delete_files:
-                    os.remove(file_name)
-                    logger.info(f"Deleted {file_name}")
+        def convert(file_name: str) -> bool:
+            if not convert_to_aiff(file_name, backend=backend, cache=cache, batcher=batcher, scratch=scratch):
+                return False
+            if manifest is not None:
+                manifest.add(file_name, _aiff_name(file_name))
+            if delete_files:
+                os.remove(file_name)
+                logger.info(f"Deleted {file_name}")
+            return True
+
+        try:
+            run_jobs(convert, files_to_convert, jobs=worker_threads(jobs, batcher)).log("WAV / FLAC files")
+        finally:
+            if manifest is not None:
+                manifest.save()
     else:
         logger.info("No .wav or .flac files found")
 
 
+def _aiff_name(file_name: str) -> str:
+    # Like convert_to_aiff names its output.
+    return file_name.rsplit(".", 1)[0] + ".aiff"
+
+
 if __name__ == "__main__":
     main()
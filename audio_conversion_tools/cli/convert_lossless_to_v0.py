@@ -1,34 +1,88 @@
+import argparse
 import os
 
-from audio_conversion_tools.convert_audio import convert_aif_to_mp3_v0
+from audio_conversion_tools.convert_audio import FfmpegBatcher, convert_aif_to_mp3_v0, worker_threads
+from audio_conversion_tools.engine import run_jobs
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
+from audio_conversion_tools.freshness import Manifest
 from audio_conversion_tools.logging import logger
+from audio_conversion_tools.utils import ask_yes_no, find_files
 
 
 def main():
-    delete_files = input("Do you want to delete the files after conversion? y/n\n")
+    parser = argparse.ArgumentParser(description="Convert lossless files to V0 mp3.")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of files to convert in parallel, defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of files to convert per ffmpeg process, batching saves the ffmpeg startup for short files.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Kill ffmpeg when converting a single file takes longer than this many seconds.",
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="Only convert files without an mp3 that is newer than the file, like make.",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="With --skip-unchanged, also store a hash of every converted file, so touched files are not converted again.",
+    )
+    args = parser.parse_args()
+    batcher = FfmpegBatcher(args.batch_size) if args.batch_size > 1 else None
 
-    if delete_files not in ["y", "n"]:
-        raise ValueError("Answer should be y or n")
-    else:
-        delete_files = delete_files == "y"
+    delete_files = ask_yes_no("Do you want to delete the files after conversion?")
 
     if delete_files:
         logger.info("Will delete all files after conversion!")
 
     # Get all aif and aiff files in the current directory
-    files_to_convert = [f for f in os.listdir() if f.lower().endswith((".aif", ".aiff", ".wav", ".flac"))]
+    files_to_convert = list(find_files(os.getcwd(), extensions=[".aif", ".aiff", ".wav", ".flac"]))
+
+    manifest = None
+    if args.skip_unchanged:
+        manifest = Manifest(os.getcwd(), hash_sources=args.hash)
+        num_files = len(files_to_convert)
+        files_to_convert = [
+            file_name for file_name in files_to_convert if not manifest.is_fresh(file_name, _mp3_name(file_name))
+        ]
+        logger.info(f"Skipping {num_files - len(files_to_convert)} files that were converted already")
     logger.info(f"Currently in {os.getcwd()}")
     logger.info(f"Converting all .wav, .aif(f) and .flac files in the current folder: {files_to_convert}")
 
-    for file_name in files_to_convert:
-        if convert_aif_to_mp3_v0(file_name):
-            logger.info(f"Converted {file_name}")
-            if delete_files:
-                os.remove(file_name)
-                logger.info(f"Deleted {file_name}")
+    def convert(file_name: str) -> bool:
+        if not convert_aif_to_mp3_v0(file_name, batcher=batcher):
+            return False
+        logger.info(f"Converted {file_name}")
+        if manifest is not None:
+            manifest.add(file_name, _mp3_name(file_name))
+        if delete_files:
+            os.remove(file_name)
+            logger.info(f"Deleted {file_name}")
+        return True
+
+    try:
+        with open_ffmpeg_runner(timeout=args.timeout):
+            run_jobs(convert, files_to_convert, jobs=worker_threads(args.jobs, batcher)).log()
+    finally:
+        if manifest is not None:
+            manifest.save()
 
     input("Finished! Press any key to exit.")
 
 
+def _mp3_name(file_name: str) -> str:
+    # Like convert_aif_to_mp3_v0 names its output.
+    return file_name.rsplit(".", 1)[0] + ".mp3"
+
+
 if __name__ == "__main__":
     main()
@@ -1,16 +1,196 @@
 import argparse
+import os
 
 from audio_conversion_tools.cli.convert_aiff_to_16bit import convert_aiff_to_16_bit
 from audio_conversion_tools.cli.convert_lossless_to_aiff import convert_lossless_to_aiff
+from audio_conversion_tools.convert_audio import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    FfmpegBatcher,
+    check_bit_depth_allowed,
+    check_sample_rate_allowed,
+    convert_aif_to_16bit,
+    convert_to_aiff,
+    get_file_info,
+    worker_threads,
+)
+from audio_conversion_tools.engine import run_jobs
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.probe_cache import ProbeCache, open_probe_cache
+from audio_conversion_tools.utils import ask_yes_no, confirm_recursive
+from audio_conversion_tools.watch import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_TIME, watch_files
+
+WATCH_EXTENSIONS = [".aif", ".aiff", ".wav", ".flac"]
+# The originals of the AIFF conversion, and hidden files, like the partial downloads of some browsers and the
+# conversions that are still being written back from a scratch folder.
+WATCH_EXCLUDE = ["*_temp.aiff", ".*"]
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert AIFF files to 16-bit format.")
     parser.add_argument("--recursive", action="store_true", help="Enable recursive mode to process subdirectories.")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of files to convert in parallel, defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Convert with ffmpeg or in-process with numpy (WAV / AIFF / FLAC only).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the probe cache, probe every file again.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of files to convert per ffmpeg process, batching saves the ffmpeg startup for short files.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Kill ffmpeg when converting a single file takes longer than this many seconds.",
+    )
+    parser.add_argument(
+        "--watch",
+        nargs="*",
+        default=None,
+        metavar="FOLDER",
+        help="Keep running, and convert the files in the folders (the current folder by default) as soon as they are"
+        " added or changed.",
+    )
+    parser.add_argument(
+        "--settle-time",
+        type=float,
+        default=DEFAULT_SETTLE_TIME,
+        help="With --watch, seconds a file has to stay unchanged before it is converted, so downloads finish first.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="With --watch, seconds between scans of the folders when inotify is not available.",
+    )
+    parser.add_argument("--poll", action="store_true", help="With --watch, scan the folders instead of using inotify.")
+    parser.add_argument(
+        "--delete-temp-files", action="store_true", help="With --watch, delete the temp files of the AIFF conversion."
+    )
+    parser.add_argument(
+        "--delete-files",
+        action="store_true",
+        help="With --watch, delete the WAV / FLAC files after converting them to AIFF.",
+    )
     args = parser.parse_args()
+    batcher = FfmpegBatcher(args.batch_size) if args.batch_size > 1 else None
+
+    if args.watch is not None:
+        # Runs unattended, so nothing is asked on the command line.
+        with open_probe_cache(enabled=not args.no_cache) as cache, open_ffmpeg_runner(timeout=args.timeout):
+            watch_folders(
+                folders=args.watch or [os.getcwd()],
+                recursive=args.recursive,
+                jobs=args.jobs,
+                backend=args.backend,
+                cache=cache,
+                batcher=batcher,
+                delete_temp_files=args.delete_temp_files,
+                delete_files=args.delete_files,
+                settle_time=args.settle_time,
+                poll_interval=args.poll_interval,
+                use_inotify=not args.poll,
+            )
+        return
+
+    if args.recursive:
+        confirm_recursive()
+    delete_temp_files = ask_yes_no("Do you want to delete the temp files of the AIFF conversion?")
+    delete_files = ask_yes_no("Do you want to delete the WAV / FLAC files after converting them to AIFF?")
+
+    with open_probe_cache(enabled=not args.no_cache) as cache, open_ffmpeg_runner(timeout=args.timeout):
+        convert_aiff_to_16_bit(
+            recursive=args.recursive,
+            jobs=args.jobs,
+            backend=args.backend,
+            cache=cache,
+            batcher=batcher,
+            delete_files=delete_temp_files,
+        )
+        convert_lossless_to_aiff(
+            recursive=args.recursive,
+            jobs=args.jobs,
+            backend=args.backend,
+            cache=cache,
+            batcher=batcher,
+            delete_files=delete_files,
+        )
+
+
+def watch_folders(
+    folders: list[str],
+    recursive: bool = False,
+    jobs: int | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    delete_temp_files: bool = False,
+    delete_files: bool = False,
+    settle_time: float = DEFAULT_SETTLE_TIME,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    use_inotify: bool = True,
+) -> None:
+    """
+    Converts the files in the folders, and then every file that is added or changed once it is completely written,
+    until interrupted. Only the new and changed files are converted, the folders are not scanned again.
+    """
+    logger.info(f"Watching {', '.join(folders)} for WAV / AIFF / FLAC files, press Ctrl-C to stop")
+    files = watch_files(
+        folders,
+        extensions=WATCH_EXTENSIONS,
+        recursive=recursive,
+        exclude=WATCH_EXCLUDE,
+        settle_time=settle_time,
+        poll_interval=poll_interval,
+        use_inotify=use_inotify,
+    )
+    try:
+        run_jobs(
+            lambda file_name: convert_file(file_name, backend, cache, batcher, delete_temp_files, delete_files),
+            files,
+            jobs=worker_threads(jobs, batcher),
+        )
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+
+
+def convert_file(
+    file_name: str,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    delete_temp_files: bool = False,
+    delete_files: bool = False,
+) -> bool:
+    """Converts an AIFF that is not 16 bit to 16 bit, and a WAV / FLAC to AIFF, like the folder conversions."""
+    if file_name.lower().endswith((".aif", ".aiff")):
+        sample_rate, bit_depth = get_file_info(file_name, cache=cache)
+        # Also the AIFFs that were just converted from a WAV / FLAC, or in place.
+        if check_bit_depth_allowed(bit_depth) and check_sample_rate_allowed(sample_rate):
+            return True
+        if not convert_aif_to_16bit(file_name, backend=backend, cache=cache, batcher=batcher):
+            return False
+        original = file_name.rsplit(".", 1)[0] + "_temp.aiff"
+        delete_original = delete_temp_files
+    else:
+        if not convert_to_aiff(file_name, backend=backend, cache=cache, batcher=batcher):
+            return False
+        original = file_name
+        delete_original = delete_files
 
-    convert_aiff_to_16_bit(recursive=args.recursive)
-    convert_lossless_to_aiff(recursive=args.recursive)
+    if delete_original:
+        os.remove(original)
+        logger.info(f"Deleted {original}")
+    return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import typer
+from pyrekordbox import Rekordbox6Database
+
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE, PCM16_PROFILE, PROFILES
+from audio_conversion_tools.convert_audio import BACKENDS, DEFAULT_BACKEND, FfmpegBatcher
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.metrics import open_metrics
+from audio_conversion_tools.plan import (
+    FOLDER_ACTIONS,
+    PlanEntry,
+    PlanHeader,
+    execute_plan,
+    in_shard,
+    parse_shard,
+    plan_folder,
+    plan_rekordbox,
+    read_plan,
+    read_plan_header,
+    write_plan,
+)
+from audio_conversion_tools.probe_cache import open_probe_cache
+from audio_conversion_tools.rekordbox.db_reader import iter_database_tracks
+from audio_conversion_tools.rekordbox.main import validate_backend, validate_device
+from audio_conversion_tools.rekordbox.xml_reader import iter_tracks
+
+app = typer.Typer(help="Plan conversions without converting anything, and execute the plan later.")
+
+
+@app.command("plan-rekordbox")
+def plan_rekordbox_command(
+    archive_folder: str = typer.Option(...),
+    rekordbox_xml_location: str = typer.Argument(
+        None,
+        help="XML file to use in case Rekordbox 6 database does not work.",
+    ),
+    output: str = typer.Option("conversion_plan.jsonl", "--output", "-o", help="Plan file to write."),
+    rekordbox_db_location: str = typer.Option(
+        None,
+        "--rekordbox-db",
+        help="Rekordbox 6 master.db to read when no XML is given, found automatically by default.",
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Don't use the probe cache, probe every file again."),
+    device: str = typer.Option(
+        DEFAULT_PROFILE,
+        "--device",
+        help=f"Player to plan for, one of {list(PROFILES)}. The plan is executed for the same player.",
+        callback=validate_device,
+    ),
+):
+    """Probes and classifies the Rekordbox collection and writes what rekordbox-convert-unplayable-files would do."""
+    db = None
+    if not rekordbox_xml_location:
+        db = Rekordbox6Database(path=rekordbox_db_location)
+        tracks = iter_database_tracks(db)
+    else:
+        tracks = iter_tracks(rekordbox_xml_location)
+
+    with open_probe_cache(enabled=not no_cache) as cache:
+        _write(plan_rekordbox(tracks, archive_folder, cache=cache, profile=device), output, PlanHeader(device))
+
+    if db is not None:
+        db.close()
+
+
+@app.command("plan-folder")
+def plan_folder_command(
+    action: str = typer.Argument(..., help=f"One of {FOLDER_ACTIONS}."),
+    directory: str = typer.Option(None, "--directory", "-d", help="Folder to plan, defaults to the current folder."),
+    recursive: bool = typer.Option(False, "--recursive", help="Also plan the subdirectories."),
+    output: str = typer.Option("conversion_plan.jsonl", "--output", "-o", help="Plan file to write."),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Don't use the probe cache, probe every file again."),
+    device: str = typer.Option(
+        PCM16_PROFILE,
+        "--device",
+        help=f"Player to plan for, one of {list(PROFILES)}. The plan is executed for the same player.",
+        callback=validate_device,
+    ),
+):
+    """Probes a folder and writes what convert-aiff-to-16bit / convert-lossless-to-* would do."""
+    if action not in FOLDER_ACTIONS:
+        raise typer.BadParameter(f"Action should be one of {FOLDER_ACTIONS}, got {action}")
+
+    with open_probe_cache(enabled=not no_cache) as cache:
+        entries = plan_folder(directory or os.getcwd(), action, recursive=recursive, cache=cache, profile=device)
+        _write(entries, output, PlanHeader(device))
+
+
+@app.command("execute")
+def execute_command(
+    plan_location: str = typer.Argument(..., help="Plan file written by plan-rekordbox or plan-folder."),
+    shard: str = typer.Option(
+        None,
+        "--shard",
+        help="Only execute shard i of N, like 0/4. Files are assigned to a shard by a hash of their (archive) path.",
+    ),
+    jobs: int = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        help="Number of conversions to run in parallel, defaults to the number of CPUs.",
+    ),
+    backend: str = typer.Option(
+        DEFAULT_BACKEND,
+        "--backend",
+        help=f"Conversion backend, one of {BACKENDS}. The numpy backend converts in-process instead of using ffmpeg.",
+        callback=validate_backend,
+    ),
+    delete_originals: bool = typer.Option(
+        False,
+        "--delete-originals",
+        help="Delete the original files of folder conversions, Rekordbox originals are always archived.",
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Don't use the probe cache, probe every file again."),
+    batch_size: int = typer.Option(
+        1,
+        "--batch-size",
+        help="Number of files to convert per ffmpeg process, batching saves the ffmpeg startup for short files.",
+    ),
+    timeout: float = typer.Option(
+        None,
+        "--timeout",
+        help="Kill ffmpeg when converting a single file takes longer than this many seconds.",
+    ),
+    report: str = typer.Option(
+        None,
+        "--report",
+        help="Write a JSON report with the time spent per stage and the slowest files to this file.",
+    ),
+):
+    """Executes a plan, or one shard of it, for the player it was planned for."""
+    header = read_plan_header(plan_location)
+    if header is None:
+        logger.warning(f"{plan_location} has no header, executing it for the default players")
+    entries: Iterable[PlanEntry] = read_plan(plan_location)
+    if shard is not None:
+        try:
+            index, num_shards = parse_shard(shard)
+        except ValueError as e:
+            raise typer.BadParameter(str(e)) from None
+        entries = (entry for entry in entries if in_shard(entry, index, num_shards))
+
+    with (
+        open_metrics(report),
+        open_probe_cache(enabled=not no_cache) as cache,
+        open_ffmpeg_runner(timeout=timeout),
+    ):
+        execute_plan(
+            entries,
+            jobs=jobs,
+            backend=backend,
+            cache=cache,
+            delete_originals=delete_originals,
+            batcher=FfmpegBatcher(batch_size) if batch_size > 1 else None,
+            profile=None if header is None else header.profile,
+        )
+
+
+def _write(entries: Iterator[PlanEntry], output: str, header: PlanHeader) -> None:
+    totals = {"bytes": 0, "cost": 0.0}
+
+    def count(entries: Iterator[PlanEntry]) -> Iterator[PlanEntry]:
+        for entry in entries:
+            totals["bytes"] += entry.estimated_output_bytes
+            totals["cost"] += entry.estimated_cost_seconds
+            yield entry
+
+    num_entries = write_plan(count(entries), output, header)
+    logger.info(
+        f"Wrote {num_entries} conversions to {Path(output).resolve()}, estimated output size"
+        f" {totals['bytes'] / 2**30:.2f} GiB and ffmpeg time {totals['cost']:.0f}s",
+    )
+
+
+def main():
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+What a player can play, and what every other file is converted to, per device profile.
+
+A profile lists the containers, sample rates and bit depths a player supports. For every combination of container,
+sample rate, bit depth and sample format the decision is computed once, into a table that is looked up per file, or
+vectorized over a whole collection. Files that are not playable are converted to 16 bit in the same container, FLACs
+on players without FLAC support are transcoded to AIFF. Every sample rate gets a target: the highest supported rate
+of the same family (multiples of 11.025 or 8 kHz) that divides it, so the resampling is a decimation by an integer
+ratio where possible.
+"""
+
+import functools
+import itertools
+from dataclasses import dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+CONTAINERS = ["wav", "aiff", "flac"]
+SAMPLE_RATES = [8000, 11025, 16000, 22050, 32000, 44100, 48000, 88200, 96000, 176400, 192000, 352800, 384000]
+BIT_DEPTHS = [8, 16, 24, 32, 64]
+SAMPLE_FORMATS = ["int", "float"]
+
+# Actions, by their code in the vectorized table.
+SKIP = "skip"
+KEEP = "keep"
+CONVERT = "convert"
+TRANSCODE = "transcode"
+ACTIONS = [SKIP, KEEP, CONVERT, TRANSCODE]
+
+# Conversions are always to 16 bit, which every profile supports, and FLACs are transcoded to AIFF.
+TARGET_BIT_DEPTH = 16
+TRANSCODE_CONTAINER = "aiff"
+
+_EXTENSION_CONTAINERS = {".wav": "wav", ".aif": "aiff", ".aiff": "aiff", ".flac": "flac"}
+
+
+@dataclass(frozen=True)
+class DeviceProfile:
+    name: str
+    description: str
+    containers: frozenset[str]
+    sample_rates: tuple[int, ...]
+    bit_depths: tuple[int, ...]
+
+
+class Decision(NamedTuple):
+    action: str
+    container: str | None = None
+    sample_rate: int | None = None
+    bit_depth: int | None = None
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in [
+        DeviceProfile(
+            "cdj-2000",
+            "CDJ-2000 / CDJ-900NXS and older players, no FLAC",
+            frozenset({"wav", "aiff"}),
+            (44100, 48000),
+            (16, 24),
+        ),
+        DeviceProfile(
+            "cdj-2000nxs2",
+            "CDJ-2000NXS2 / CDJ-TOUR1",
+            frozenset({"wav", "aiff", "flac"}),
+            (44100, 48000),
+            (16, 24),
+        ),
+        DeviceProfile(
+            "cdj-3000",
+            "CDJ-3000, up to 96 kHz",
+            frozenset({"wav", "aiff", "flac"}),
+            (44100, 48000, 88200, 96000),
+            (16, 24),
+        ),
+        DeviceProfile(
+            "xdj",
+            "XDJ-1000MK2 / XDJ-XZ / XDJ-RX2 / XDJ-RX3",
+            frozenset({"wav", "aiff", "flac"}),
+            (44100, 48000),
+            (16, 24),
+        ),
+        DeviceProfile(
+            "16bit",
+            "16 bit WAV / AIFF at 44.1 / 48 kHz, what the folder tools convert to",
+            frozenset({"wav", "aiff"}),
+            (44100, 48000),
+            (16,),
+        ),
+    ]
+}
+# The FLACs in a Rekordbox collection are converted by default, like for the older players.
+DEFAULT_PROFILE = "cdj-2000"
+PCM16_PROFILE = "16bit"
+
+
+def get_profile(profile: str | DeviceProfile) -> DeviceProfile:
+    if isinstance(profile, DeviceProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown device profile {profile}, should be one of {list(PROFILES)}") from None
+
+
+def action(
+    profile: DeviceProfile, container: str | None, sample_rate: int, bit_depth: int, sample_format: str = "int"
+) -> str:
+    if container not in CONTAINERS:
+        return SKIP
+    playable = (
+        container in profile.containers
+        and sample_rate in profile.sample_rates
+        and bit_depth in profile.bit_depths
+        and sample_format == "int"
+    )
+    if playable:
+        return KEEP
+    # FLACs that can't be played are transcoded, also on players that play other FLACs.
+    return TRANSCODE if container == "flac" else CONVERT
+
+
+def decide(
+    profile: DeviceProfile, container: str | None, sample_rate: int, bit_depth: int, sample_format: str = "int"
+) -> Decision:
+    """Computes the decision for a file, use CompatibilityTable.lookup for the precomputed one."""
+    file_action = action(profile, container, sample_rate, bit_depth, sample_format)
+    if file_action == SKIP:
+        return Decision(SKIP)
+    if file_action == KEEP:
+        return Decision(KEEP, container, sample_rate, bit_depth)
+    return Decision(
+        file_action,
+        TRANSCODE_CONTAINER if file_action == TRANSCODE else container,
+        target_sample_rate(sample_rate, profile.sample_rates),
+        TARGET_BIT_DEPTH,
+    )
+
+
+def target_sample_rate(sample_rate: int, sample_rates: tuple[int, ...]) -> int:
+    """
+    The rate of sample_rates to convert sample_rate to: the highest rate of the same family that divides it, else the
+    highest lower rate of the family, else the lowest rate of the family.
+    """
+    if sample_rate in sample_rates:
+        return sample_rate
+    if sample_rate is None or sample_rate <= 0:
+        raise ValueError(f"Unknown sample rate {sample_rate}!")
+
+    family = [rate for rate in sample_rates if (rate % 11025 == 0) == (sample_rate % 11025 == 0)] or sample_rates
+    for candidates in (
+        [rate for rate in family if sample_rate % rate == 0],
+        [rate for rate in family if rate < sample_rate],
+    ):
+        if candidates:
+            return max(candidates)
+    return min(family)
+
+
+def container_of_kind(kind: str) -> str | None:
+    """The container of a Rekordbox Kind, like "WAV File"."""
+    kind = kind.lower()
+    if "wav" in kind:
+        return "wav"
+    if "aif" in kind:
+        return "aiff"
+    if kind[:4] == "flac":
+        return "flac"
+    return None
+
+
+def container_of_file(file_name: str | Path) -> str | None:
+    return _EXTENSION_CONTAINERS.get(Path(file_name).suffix.lower())
+
+
+class CompatibilityTable:
+    """The decisions of a profile for every combination of CONTAINERS, SAMPLE_RATES, BIT_DEPTHS and SAMPLE_FORMATS."""
+
+    def __init__(self, profile: DeviceProfile):
+        self.profile = profile
+        self.decisions = {
+            key: decide(profile, *key)
+            for key in itertools.product(CONTAINERS, SAMPLE_RATES, BIT_DEPTHS, SAMPLE_FORMATS)
+        }
+
+        # The last index of every axis is for the values that are not listed, like a container we don't convert or a
+        # sample rate of 0 when Rekordbox doesn't know it.
+        self.action_codes = np.full(
+            (len(CONTAINERS) + 1, len(SAMPLE_RATES) + 1, len(BIT_DEPTHS) + 1, len(SAMPLE_FORMATS)),
+            ACTIONS.index(SKIP),
+            dtype=np.int8,
+        )
+        for (c, container), (r, sample_rate), (d, bit_depth), (f, sample_format) in itertools.product(
+            enumerate(CONTAINERS),
+            enumerate([*SAMPLE_RATES, 0]),
+            enumerate([*BIT_DEPTHS, 0]),
+            enumerate(SAMPLE_FORMATS),
+        ):
+            self.action_codes[c, r, d, f] = ACTIONS.index(
+                action(profile, container, sample_rate, bit_depth, sample_format)
+            )
+
+    def lookup(self, container: str | None, sample_rate: int, bit_depth: int, sample_format: str = "int") -> Decision:
+        decision = self.decisions.get((container, sample_rate, bit_depth, sample_format))
+        if decision is None:
+            # Rates and depths that are not in the table still get a decision.
+            decision = decide(self.profile, container, sample_rate, bit_depth, sample_format)
+        return decision
+
+    def actions(
+        self,
+        containers: np.ndarray,
+        sample_rates: np.ndarray,
+        bit_depths: np.ndarray,
+        float_samples: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        The action codes (indices in ACTIONS) of whole collections at once. containers are indices in CONTAINERS, or
+        len(CONTAINERS) for other containers.
+        """
+        format_codes = np.zeros(len(containers), dtype=np.int64) if float_samples is None else float_samples.astype(int)
+        return self.action_codes[
+            containers, _codes(SAMPLE_RATES, sample_rates), _codes(BIT_DEPTHS, bit_depths), format_codes
+        ]
+
+
+@functools.lru_cache
+def compatibility_table(profile: str) -> CompatibilityTable:
+    """The table of a profile, computed once per profile."""
+    return CompatibilityTable(get_profile(profile))
+
+
+def lookup(
+    profile: str, container: str | None, sample_rate: int, bit_depth: int, sample_format: str = "int"
+) -> Decision:
+    return compatibility_table(profile).lookup(container, sample_rate, bit_depth, sample_format)
+
+
+def _codes(values: list[int], array: np.ndarray) -> np.ndarray:
+    # Index of every element of array in the sorted values, len(values) for elements that are not in values.
+    values_array = np.array(values)
+    indices = np.minimum(np.searchsorted(values_array, array), len(values) - 1)
+    return np.where(values_array[indices] == array, indices, len(values))
@@ -1,197 +1,320 @@
 import os
 import subprocess
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, TextIO, Tuple
 
+import mutagen
 import soundfile as sf
 
+from audio_conversion_tools import archive, compatibility, ffmpeg_runner, header_probe, journal, metrics, numpy_backend
+from audio_conversion_tools.engine import default_jobs
 from audio_conversion_tools.logging import logger
+from audio_conversion_tools.probe_cache import ProbeCache, ProbeResult
+from audio_conversion_tools.scratch import ScratchFolder, stage_in, write_back
 
 FFMPEG_LOG_LOCATION = Path(__file__).parent.parent / "ffmpeg_log.log"
 
+# Backends for conversions to 16 bit WAV / AIFF, "numpy" converts in-process instead of starting ffmpeg.
+BACKENDS = ["ffmpeg", "numpy"]
+DEFAULT_BACKEND = "ffmpeg"
+
+# Room for the header of a 16 bit WAV / AIFF and the tags ffmpeg adds, next to the tags and cover art of the input.
+_OUTPUT_HEADER_BYTES = 4096
+
+# Conversions can run concurrently, this makes sure the ffmpeg output of different files is not interleaved.
+_FFMPEG_LOG_LOCK = threading.Lock()
+
 
 class ConversionError(Exception): ...
 
 
-def get_file_info(file_name: str) -> Tuple[Optional[int], Optional[int]]:
-    subtype_mapping = {"PCM_16": 16, "PCM_24": 24, "PCM_32": 32}
+class FfmpegBatcher:
+    """
+    Groups the ffmpeg commands of concurrent conversions into one ffmpeg process with several inputs and outputs, which
+    saves the process startup and codec initialisation for every file.
+
+    Conversions call `run` from their own worker thread and block until their batch ran, so the probing, archiving
+    and rollback of every file still happens in its own conversion function. A batch starts when batch_size commands
+    are waiting, or when the oldest command waited max_wait seconds. When a batch fails, its files are converted one
+    by one, so only the files that actually fail raise an error. The batches run on runner and are logged to
+    ffmpeg_log, by default the current runner and the ffmpeg log.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_wait: float = 0.2,
+        runner: ffmpeg_runner.FfmpegRunner | None = None,
+        ffmpeg_log: TextIO | None = None,
+    ):
+        if batch_size < 1:
+            raise ValueError(f"Batch size should be at least 1, got {batch_size}")
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.runner = runner
+        self.ffmpeg_log = ffmpeg_log
+        self._lock = threading.Lock()
+        self._pending: list[tuple[list[str], Future[str]]] = []
+
+    def worker_threads(self, jobs: int | None) -> int:
+        """Number of conversion threads that keeps `jobs` batches running at the same time."""
+        return (jobs or default_jobs()) * self.batch_size
+
+    def run(self, cmd: list[str]) -> str:
+        """Runs an ffmpeg command of the form ffmpeg <global options> -i <input> <output options> <output>."""
+        future: Future[str] = Future()
+        with self._lock:
+            self._pending.append((cmd, future))
+            batch = self._take_batch() if len(self._pending) >= self.batch_size else None
+
+        if batch is None:
+            try:
+                return future.result(timeout=self.max_wait)
+            except FutureTimeoutError:
+                with self._lock:
+                    # Another thread might have taken our command in the meantime.
+                    batch = self._take_batch() if any(f is future for _, f in self._pending) else []
+
+        if batch:
+            self._run_batch(batch)
+        return future.result()
+
+    def _take_batch(self) -> list[tuple[list[str], Future[str]]]:
+        batch, self._pending = self._pending[: self.batch_size], self._pending[self.batch_size :]
+        return batch
+
+    def _run_batch(self, batch: list[tuple[list[str], Future[str]]]) -> None:
+        try:
+            if len(batch) > 1:
+                try:
+                    output = _run_ffmpeg(_batch_command([cmd for cmd, _ in batch]), self.runner, self.ffmpeg_log)
+                    for _, future in batch:
+                        future.set_result(output)
+                    return
+                except subprocess.CalledProcessError:
+                    logger.warning(f"Batch of {len(batch)} ffmpeg conversions failed, converting the files one by one")
+
+            for cmd, future in batch:
+                try:
+                    future.set_result(_run_ffmpeg(cmd, self.runner, self.ffmpeg_log))
+                except subprocess.CalledProcessError as e:
+                    future.set_exception(e)
+        except BaseException as e:
+            # Like ffmpeg missing, or a closed runner. The other threads of the batch wait for their futures, they
+            # fail with the same error instead of waiting forever.
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
 
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, should be one of {BACKENDS}")
+    return backend
+
+
+def worker_threads(jobs: int | None, batcher: FfmpegBatcher | None) -> int | None:
+    return jobs if batcher is None else batcher.worker_threads(jobs)
+
+
+# Bit depths of the soundfile subtypes we can convert.
+BIT_DEPTHS = {"PCM_S8": 8, "PCM_U8": 8, "PCM_16": 16, "PCM_24": 24, "PCM_32": 32, "FLOAT": 32, "DOUBLE": 64}
+
+
+def get_file_info(file_name: str, cache: ProbeCache | None = None) -> Tuple[Optional[int], Optional[int]]:
     try:
-        info = sf.info(file_name)
+        info = probe_file(file_name, cache=cache)
         sample_rate = info.samplerate
-        bit_depth = subtype_mapping[info.subtype]
+        bit_depth = BIT_DEPTHS[info.subtype]
         return sample_rate, bit_depth
     except Exception as e:
         logger.error(f"Could not get file info for {file_name}: {e}")
         return None, None
 
 
-def determine_target_sample_rate(sample_rate: int) -> int:
+def probe_file(file_name: str, cache: ProbeCache | None = None) -> ProbeResult:
+    """Reads the format of an audio file, from the probe cache if the file didn't change since it was cached."""
+    with metrics.timer("probe", file_name):
+        if cache is None:
+            return _probe_file(file_name)
+
+        stat = os.stat(file_name)
+        result = cache.get(file_name, stat=stat)
+        if result is None:
+            metrics.count("probe_cache_misses")
+            result = _probe_file(file_name)
+            cache.put(file_name, result, stat=stat)
+        return result
+
+
+def _probe_file(file_name: str) -> ProbeResult:
+    try:
+        header = header_probe.read_header(file_name)
+        return ProbeResult(
+            samplerate=header.sample_rate, subtype=header.subtype, channels=header.channels, frames=header.frames
+        )
+    except header_probe.UnsupportedHeader:
+        pass
+
+    # Anything we can't read the header of ourselves is probed by libsndfile.
+    info = sf.info(file_name)
+    return ProbeResult(samplerate=info.samplerate, subtype=info.subtype, channels=info.channels, frames=info.frames)
+
+
+def determine_target_sample_rate(sample_rate: int, profile: str = compatibility.PCM16_PROFILE) -> int:
     """
-    Rekordbox requires the sample rate to be 44.1 or 48 kHz. We divide the sample rate
-    by 2 or 4 in case the sample rate is too high, so we don't have any synchronisation
-    issues later.
+    The sample rate of the profile to convert to, 44.1 or 48 kHz for Rekordbox. We divide the sample rate by an
+    integer ratio where possible in case the sample rate is too high, so we don't have any synchronisation issues
+    later. Lower sample rates are upsampled, see compatibility.target_sample_rate.
     """
-    if sample_rate in [88200, 96000]:
-        target_sample_rate = sample_rate // 2
-    elif sample_rate == 192000:
-        target_sample_rate = 48000
-    elif sample_rate in [44100, 48000]:
-        target_sample_rate = sample_rate
-    else:
-        raise ValueError(f"Unknown sample rate {sample_rate}!")
+    return compatibility.target_sample_rate(sample_rate, compatibility.get_profile(profile).sample_rates)
 
-    return target_sample_rate
 
+def check_sample_rate_allowed(sample_rate: int | None, profile: str = compatibility.PCM16_PROFILE) -> bool:
+    return sample_rate in compatibility.get_profile(profile).sample_rates
 
-def check_sample_rate_allowed(sample_rate: int | None) -> bool:
-    if sample_rate in [44100, 48000]:
-        return True
-    else:
-        return False
 
+def check_bit_depth_allowed(bit_rate: int | None, profile: str = compatibility.PCM16_PROFILE) -> bool:
+    return bit_rate in compatibility.get_profile(profile).bit_depths
 
-def check_bit_depth_allowed(bit_rate: int | None) -> bool:
-    if bit_rate == 16:
-        return True
-    else:
-        return False
 
-
-def convert_aif_to_16bit(file_name: str, temp_location: str | None = None) -> bool:
-    """Converts a given AIFF file to 16-bit AIFF and changes sample rate if required."""
+def convert_aif_to_16bit(
+    file_name: str,
+    temp_location: str | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    conversion_journal: journal.ConversionJournal | None = None,
+    scratch: ScratchFolder | None = None,
+    profile: str = compatibility.PCM16_PROFILE,
+    runner: ffmpeg_runner.FfmpegRunner | None = None,
+    ffmpeg_log: TextIO | None = None,
+) -> bool:
+    """
+    Converts a given AIFF file to 16-bit AIFF and changes sample rate if required. If a journal is given, the
+    archive and conversion steps are recorded in it. With a scratch folder the file is converted there. The
+    profile decides which formats are skipped and what sample rate the conversion gets. ffmpeg runs on runner and
+    logs to ffmpeg_log, by default the current runner and the ffmpeg log.
+    """
     if temp_location is None:
         temp_location = file_name.rsplit(".", 1)[0] + "_temp.aiff"
 
-    # Rename the original file to temp_location
-    os.rename(file_name, temp_location)
-
-    sample_rate, bit_depth = get_file_info(temp_location)
+    sample_rate, bit_depth = get_file_info(file_name, cache=cache)
 
     if sample_rate is None or bit_depth is None:
-        logger.error(f"Couldn't determine sample rate or bit depth for {temp_location}")
+        logger.error(f"Couldn't determine sample rate or bit depth for {file_name}")
         return False
 
-    # If already 16-bit and either 44.1kHz or 48kHz, move back to the original name and return
-    if check_bit_depth_allowed(bit_depth) and check_sample_rate_allowed(sample_rate):
-        os.rename(temp_location, file_name)
+    # If already 16-bit and either 44.1kHz or 48kHz, there is nothing to convert
+    if check_bit_depth_allowed(bit_depth, profile) and check_sample_rate_allowed(sample_rate, profile):
         logger.warning(f"Skipped {file_name} as it's already in desired format.")
         return False
 
-    target_sample_rate = determine_target_sample_rate(sample_rate)
+    try:
+        target_sample_rate = determine_target_sample_rate(sample_rate, profile)
+    except ValueError as e:
+        logger.error(f"Could not determine target sample rate for {file_name}: {e}")
+        return False
 
-    cmd = [
-        "ffmpeg",
-        "-y",  # We overwrite if a file already exists
-        "-hide_banner",
-        "-i",
-        temp_location,
-        "-ar",
-        str(target_sample_rate),
-        "-sample_fmt",
-        "s16",
-        "-write_id3v2",
-        "1",
-        file_name,
-    ]
+    # Rename the original file to temp_location
+    # Moved instead of renamed, so the archive can be on another drive than the original.
+    with metrics.timer("archive", file_name):
+        metrics.count(f"archive_{archive.move_file(file_name, temp_location)}")
+    _record(conversion_journal, journal.ARCHIVED, file_name)
 
-    with open(FFMPEG_LOG_LOCATION, "a") as log_file:
-        try:
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                check=True,
-            )
-            # Log the captured output to your log file
-            log_file.write(result.stdout)
-            log_file.write("\n\n")
-            logger.info(
-                f"Converted {file_name} from {bit_depth} bit / {sample_rate}Hz to 16 bit / {target_sample_rate}Hz",
-            )
-            return True
-        except subprocess.CalledProcessError as e:
-            # Log the captured output to your log file
-            log_file.write(e.output)
-            log_file.write("\n\n")
-            os.rename(temp_location, file_name)  # Move the temp file back to original name if failed
-            logger.error(
-                f"Failed to convert {file_name} to 16-bit AIFF with target sample rate {target_sample_rate}Hz: :"
-                f" {e.output}",
-            )
-            return False
+    try:
+        _record(conversion_journal, journal.ENCODING, file_name)
+        encode_16bit(temp_location, file_name, target_sample_rate, backend, batcher, scratch, runner, ffmpeg_log)
+        _record(conversion_journal, journal.ENCODED, file_name, durable=True)
+        logger.info(
+            f"Converted {file_name} from {bit_depth} bit / {sample_rate}Hz to 16 bit / {target_sample_rate}Hz",
+        )
+        return True
+    except ConversionError as e:
+        archive.move_file(temp_location, file_name)  # Move the temp file back to original name if failed
+        _record(conversion_journal, journal.ROLLED_BACK, file_name)
+        logger.error(
+            f"Failed to convert {file_name} to 16-bit AIFF with target sample rate {target_sample_rate}Hz: :" f" {e}",
+        )
+        return False
 
 
-def convert_wav_to_16bit(file_name: str, temp_location: str | None = None) -> bool:
-    """Converts a given WAV file to 16-bit AIFF and changes sample rate if required."""
+def convert_wav_to_16bit(
+    file_name: str,
+    temp_location: str | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    conversion_journal: journal.ConversionJournal | None = None,
+    scratch: ScratchFolder | None = None,
+    profile: str = compatibility.PCM16_PROFILE,
+    runner: ffmpeg_runner.FfmpegRunner | None = None,
+    ffmpeg_log: TextIO | None = None,
+) -> bool:
+    """
+    Converts a given WAV file to 16-bit AIFF and changes sample rate if required. If a journal is given, the
+    archive and conversion steps are recorded in it. With a scratch folder the file is converted there. The
+    profile decides which formats are skipped and what sample rate the conversion gets. ffmpeg runs on runner and
+    logs to ffmpeg_log, by default the current runner and the ffmpeg log.
+    """
     if temp_location is None:
         temp_location = file_name.rsplit(".", 1)[0] + "_temp.wav"
 
-    # Rename the original file to temp_location
-    os.rename(file_name, temp_location)
-
-    sample_rate, bit_depth = get_file_info(temp_location)
+    sample_rate, bit_depth = get_file_info(file_name, cache=cache)
 
     if sample_rate is None or bit_depth is None:
-        logger.warning(f"Couldn't determine sample rate or bit depth for {temp_location}")
+        logger.warning(f"Couldn't determine sample rate or bit depth for {file_name}")
         return False
 
-    # If already 16-bit and either 44.1kHz or 48kHz, move back to the original name and return
-    if check_bit_depth_allowed(bit_depth) and check_sample_rate_allowed(sample_rate):
-        os.rename(temp_location, file_name)
+    # If already 16-bit and either 44.1kHz or 48kHz, there is nothing to convert
+    if check_bit_depth_allowed(bit_depth, profile) and check_sample_rate_allowed(sample_rate, profile):
         logger.warning(f"Skipped {file_name} as it's already in desired format.")
         return False
 
     try:
-        target_sample_rate = determine_target_sample_rate(sample_rate)
+        target_sample_rate = determine_target_sample_rate(sample_rate, profile)
     except ValueError as e:
         logger.error(f"Could not determine target sample rate for {file_name}: {e}")
         return False
 
-    cmd = [
-        "ffmpeg",
-        "-y",  # We overwrite if a file already exists
-        "-hide_banner",
-        "-i",
-        temp_location,
-        "-ar",
-        str(target_sample_rate),
-        "-sample_fmt",
-        "s16",
-        "-write_id3v2",
-        "1",
-        file_name,
-    ]
-
-    with open(FFMPEG_LOG_LOCATION, "a") as log_file:
-        try:
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                check=True,
-            )
-            log_file.write(result.stdout)
-            log_file.write("\n\n")
-            logger.info(
-                f"Converted {file_name} from {bit_depth} bit / {sample_rate}Hz to 16 bit / {target_sample_rate}Hz",
-            )
-            return True
-        except subprocess.CalledProcessError as e:
-            log_file.write(e.output)
-            log_file.write("\n\n")
+    # Rename the original file to temp_location
+    # Moved instead of renamed, so the archive can be on another drive than the original.
+    with metrics.timer("archive", file_name):
+        metrics.count(f"archive_{archive.move_file(file_name, temp_location)}")
+    _record(conversion_journal, journal.ARCHIVED, file_name)
 
-            os.rename(temp_location, file_name)  # Move the temp file back to original name if failed
-            logger.error(
-                f"Failed to convert {file_name} to 16-bit WAV with target sample rate {target_sample_rate}Hz: :"
-                f" {e.output}",
-            )
-            return False
+    try:
+        _record(conversion_journal, journal.ENCODING, file_name)
+        encode_16bit(temp_location, file_name, target_sample_rate, backend, batcher, scratch, runner, ffmpeg_log)
+        _record(conversion_journal, journal.ENCODED, file_name, durable=True)
+        logger.info(
+            f"Converted {file_name} from {bit_depth} bit / {sample_rate}Hz to 16 bit / {target_sample_rate}Hz",
+        )
+        return True
+    except ConversionError as e:
+        archive.move_file(temp_location, file_name)  # Move the temp file back to original name if failed
+        _record(conversion_journal, journal.ROLLED_BACK, file_name)
+        logger.error(
+            f"Failed to convert {file_name} to 16-bit WAV with target sample rate {target_sample_rate}Hz: :" f" {e}",
+        )
+        return False
 
 
-def convert_to_aiff(file_name: str, output_name: str | None = None) -> bool:
+def convert_to_aiff(
+    file_name: str,
+    output_name: str | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    scratch: ScratchFolder | None = None,
+    profile: str = compatibility.PCM16_PROFILE,
+    runner: ffmpeg_runner.FfmpegRunner | None = None,
+    ffmpeg_log: TextIO | None = None,
+) -> bool:
     if not Path(file_name).exists():
         logger.error(f"The file {file_name} does not exist!")
         return False
@@ -199,91 +322,234 @@ def convert_to_aiff(file_name: str, output_name: str | None = None) -> bool:
     if output_name is None:
         output_name = file_name.rsplit(".", 1)[0] + ".aiff"
 
-    sample_rate, bit_depth = get_file_info(file_name)
+    sample_rate, bit_depth = get_file_info(file_name, cache=cache)
 
     if sample_rate is None or bit_depth is None:
         logger.error(f"Couldn't determine sample rate or bit depth for {file_name}, will not convert")
         return False
 
     try:
-        target_sample_rate = determine_target_sample_rate(sample_rate)
+        target_sample_rate = determine_target_sample_rate(sample_rate, profile)
     except ValueError as e:
         logger.error(f"Could not determine target sample rate for {file_name}: {e}")
         return False
 
+    try:
+        encode_16bit(file_name, output_name, target_sample_rate, backend, batcher, scratch, runner, ffmpeg_log)
+        logger.info(
+            f"Converted {file_name} ({(sample_rate / 1000):.1f}kHz / {bit_depth} bit) to AIFF"
+            f" ({(target_sample_rate / 1000):.1f}kHz / 16 bit)",
+        )
+        return True
+    except ConversionError as e:
+        logger.error(f"Failed to convert {file_name} to AIFF: {e}")
+        return False
+
+
+def convert_aif_to_mp3_v0(file_name: str, batcher: FfmpegBatcher | None = None) -> bool:
+    output_name = file_name.rsplit(".", 1)[0] + ".mp3"
+
+    # Command to use ffmpeg to convert the file to v0 mp3
     cmd = [
         "ffmpeg",
         "-y",  # We overwrite if a file already exists
         "-hide_banner",
         "-i",
         file_name,
-        "-ar",
-        str(target_sample_rate),
-        "-sample_fmt",
-        "s16",
+        "-q:a",
+        "0",  # This sets the quality to VBR V0
         "-write_id3v2",
         "1",
         output_name,
     ]
 
-    with open(FFMPEG_LOG_LOCATION, "a") as log_file:
-        try:
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                check=True,
-            )
-            log_file.write(result.stdout)
-            log_file.write("\n\n")
-
-            logger.info(
-                f"Converted {file_name} ({(sample_rate / 1000):.1f}kHz / {bit_depth} bit) to AIFF"
-                f" ({(target_sample_rate / 1000):.1f}kHz / 16 bit)",
-            )
-            return True
-        except subprocess.CalledProcessError as e:
-            log_file.write(e.output)
-            log_file.write("\n\n")
-            logger.error(f"Failed to convert {file_name} to AIFF: {e.output}")
-            return False
+    try:
+        with metrics.timer("ffmpeg", file_name):
+            _run_ffmpeg(cmd) if batcher is None else batcher.run(cmd)
+        metrics.add_file_bytes(file_name)
+        logger.info(f"Converted {file_name} to mp3")
+        return True
+    except subprocess.CalledProcessError as e:
+        metrics.count("failed_conversions")
+        logger.error(f"Failed to convert {file_name} to mp3: {e.output}")
+        return False
 
 
-def convert_aif_to_mp3_v0(file_name: str) -> bool:
-    output_name = file_name.rsplit(".", 1)[0] + ".mp3"
+def encode_16bit(
+    input_name: str | Path,
+    output_name: str | Path,
+    target_sample_rate: int,
+    backend: str = DEFAULT_BACKEND,
+    batcher: FfmpegBatcher | None = None,
+    scratch: ScratchFolder | None = None,
+    runner: ffmpeg_runner.FfmpegRunner | None = None,
+    ffmpeg_log: TextIO | None = None,
+) -> None:
+    """
+    Converts input_name to 16 bit with the given sample rate, in the container of the extension of output_name.
+    With a scratch folder input_name is copied there first, and the conversion is renamed into place once it is
+    copied back completely. Raises ConversionError on failure.
+    """
+    if scratch is not None:
+        _encode_16bit_in_scratch(
+            input_name, output_name, target_sample_rate, backend, batcher, scratch, runner, ffmpeg_log
+        )
+        return
 
-    # Command to use ffmpeg to convert the file to v0 mp3
     cmd = [
         "ffmpeg",
         "-y",  # We overwrite if a file already exists
         "-hide_banner",
         "-i",
-        file_name,
-        "-q:a",
-        "0",  # This sets the quality to VBR V0
+        str(input_name),
+        "-ar",
+        str(target_sample_rate),
+        "-sample_fmt",
+        "s16",
         "-write_id3v2",
         "1",
-        output_name,
+        str(output_name),
     ]
+    _run_conversion(cmd, input_name, output_name, target_sample_rate, backend, batcher, runner, ffmpeg_log)
+
 
-    with open(FFMPEG_LOG_LOCATION, "a") as log_file:
+def estimate_16bit_size(file_name: str | Path, target_sample_rate: int, cache: ProbeCache | None = None) -> int:
+    """
+    Estimates the size of the conversion of file_name to 16 bit at target_sample_rate from its header: the resampled
+    audio, plus the tags and cover art of the input, which are copied along.
+    """
+    file_size = os.path.getsize(file_name)
+    try:
+        info = probe_file(str(file_name), cache=cache)
+    except Exception as e:
+        logger.warning(f"Could not probe {file_name}, assuming its conversion is as large as the file: {e}")
+        return file_size
+    output_frames = -(-info.frames * target_sample_rate // info.samplerate)
+    # Without the audio only the header and the tags of a WAV / AIFF are left. The audio of a FLAC is compressed, so
+    # its tags are not estimated.
+    input_audio_bytes = info.frames * info.channels * BIT_DEPTHS.get(info.subtype, 16) // 8
+    return output_frames * info.channels * 2 + max(file_size - input_audio_bytes, 0) + _OUTPUT_HEADER_BYTES
+
+
+def _encode_16bit_in_scratch(
+    input_name: str | Path,
+    output_name: str | Path,
+    target_sample_rate: int,
+    backend: str,
+    batcher: FfmpegBatcher | None,
+    scratch: ScratchFolder,
+    runner: ffmpeg_runner.FfmpegRunner | None,
+    ffmpeg_log: TextIO | None,
+) -> None:
+    # The copy of the input plus the conversion, which is larger than the input when it is upsampled.
+    workspace_bytes = os.path.getsize(input_name) + estimate_16bit_size(input_name, target_sample_rate)
+    with scratch.workspace(workspace_bytes) as workspace:
         try:
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                check=True,
-            )
-            # Log the captured output to your log file
-            log_file.write(result.stdout)
-            log_file.write("\n\n")
-            logger.info(f"Converted {file_name} to mp3")
-            return True
+            with metrics.timer("stage_in", output_name):
+                local_input = stage_in(input_name, workspace)
+        except OSError as e:
+            raise ConversionError(f"Could not copy {input_name} to the scratch folder: {e}") from e
+
+        local_output = workspace / f"output{Path(output_name).suffix}"
+        encode_16bit(
+            local_input, local_output, target_sample_rate, backend, batcher, runner=runner, ffmpeg_log=ffmpeg_log
+        )
+
+        try:
+            with metrics.timer("write_back", output_name):
+                write_back(local_output, output_name)
+        except OSError as e:
+            raise ConversionError(f"Could not write the conversion back to {output_name}: {e}") from e
+
+
+def _run_conversion(
+    cmd: list[str],
+    input_name: str,
+    output_name: str,
+    target_sample_rate: int,
+    backend: str,
+    batcher: FfmpegBatcher | None = None,
+    runner: ffmpeg_runner.FfmpegRunner | None = None,
+    ffmpeg_log: TextIO | None = None,
+) -> None:
+    """Runs a conversion to 16 bit with the given backend, raises ConversionError on failure."""
+    if backend == "ffmpeg":
+        try:
+            with metrics.timer("ffmpeg", output_name):
+                _run_ffmpeg(cmd, runner, ffmpeg_log) if batcher is None else batcher.run(cmd)
         except subprocess.CalledProcessError as e:
-            # Log the captured output to your log file
-            log_file.write(e.output)
+            metrics.count("failed_conversions")
+            raise ConversionError(e.output) from e
+    elif backend == "numpy":
+        try:
+            with metrics.timer("numpy", output_name):
+                numpy_backend.convert_file(input_name, output_name, target_sample_rate)
+        except numpy_backend.UnsupportedRatio:
+            # Resampling by other ratios than 1, 2 or 4, like 22.05 kHz to 44.1 kHz, is left to ffmpeg.
+            _run_conversion(cmd, input_name, output_name, target_sample_rate, "ffmpeg", batcher, runner, ffmpeg_log)
+            return
+        except (sf.LibsndfileError, RuntimeError, ValueError, OSError, mutagen.MutagenError) as e:
+            metrics.count("failed_conversions")
+            raise ConversionError(str(e)) from e
+    else:
+        # Raised as a ConversionError, so the caller moves the original file back in place.
+        raise ConversionError(f"Unknown backend {backend}, should be one of {BACKENDS}")
+    metrics.add_file_bytes(input_name)
+
+
+def _record(
+    conversion_journal: journal.ConversionJournal | None, state: str, file_name: str, durable: bool = False
+) -> None:
+    if conversion_journal is not None:
+        conversion_journal.record(state, file_name, durable=durable)
+
+
+def _run_ffmpeg(
+    cmd: list[str], runner: ffmpeg_runner.FfmpegRunner | None = None, ffmpeg_log: TextIO | None = None
+) -> str:
+    """
+    Runs an ffmpeg command and appends its output to the ffmpeg log, raises CalledProcessError on failure. Without
+    runner the current runner is used, without ffmpeg_log the log is opened for this output.
+    """
+    return_code, output = (runner or ffmpeg_runner.current_runner()).run(cmd)
+    _write_ffmpeg_log(output, ffmpeg_log)
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd, output=output)
+    return output
+
+
+def _batch_command(cmds: list[list[str]]) -> list[str]:
+    """Combines single file ffmpeg commands into one command, the global options of the first command are used."""
+    global_options = cmds[0][1 : cmds[0].index("-i")]
+    inputs: list[str] = []
+    outputs: list[str] = []
+    for index, cmd in enumerate(cmds):
+        input_position = cmd.index("-i")
+        inputs += ["-i", cmd[input_position + 1]]
+        # Without explicit maps every output would get the streams and tags of the first input. The cover art is
+        # kept for containers that can store it, like ffmpeg does for a single output.
+        stream_maps = ["-map", f"{index}:a:0"]
+        if Path(cmd[-1]).suffix.lower() != ".wav":
+            stream_maps += ["-map", f"{index}:v?"]
+        outputs += [
+            *stream_maps,
+            "-map_metadata",
+            str(index),
+            "-map_chapters",
+            str(index),
+            *cmd[input_position + 2 : -1],
+            cmd[-1],
+        ]
+    return ["ffmpeg", *global_options, *inputs, *outputs]
+
+
+def _write_ffmpeg_log(output: str, ffmpeg_log: TextIO | None = None) -> None:
+    with _FFMPEG_LOG_LOCK:
+        if ffmpeg_log is not None:
+            ffmpeg_log.write(output)
+            ffmpeg_log.write("\n\n")
+            ffmpeg_log.flush()
+            return
+        with open(FFMPEG_LOG_LOCATION, "a") as log_file:
+            log_file.write(output)
             log_file.write("\n\n")
-            logger.error(f"Failed to convert {file_name} to mp3: {e.output}")
-            return False
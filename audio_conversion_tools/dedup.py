@@ -0,0 +1,84 @@
+"""
+Finds files with the same content, so the same track in a promo folder, a crate and a label pack is converted once
+and the result is cloned to the other locations.
+
+Files are fingerprinted cheaply by their size and a BLAKE2 hash of a few sampled chunks. Only when two fingerprints
+match the whole files are hashed, to be sure they are the same.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from audio_conversion_tools.archive import file_hash
+
+# Size and number of the chunks that are hashed for a fingerprint, spread evenly over the file.
+SAMPLE_SIZE = 2**16
+NUM_SAMPLES = 4
+
+
+def fingerprint(file_name: str | Path) -> tuple[int, bytes]:
+    """Size of the file and a hash of NUM_SAMPLES chunks of it, files that are small enough are hashed completely."""
+    sample_hash = hashlib.blake2b(digest_size=16)
+    with open(file_name, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size <= SAMPLE_SIZE * NUM_SAMPLES:
+            sample_hash.update(file.read())
+        else:
+            for i in range(NUM_SAMPLES):
+                file.seek((size - SAMPLE_SIZE) * i // (NUM_SAMPLES - 1))
+                sample_hash.update(file.read(SAMPLE_SIZE))
+    return size, sample_hash.digest()
+
+
+def same_content(file_name: str | Path, other_file_name: str | Path) -> bool:
+    return file_hash(file_name) == file_hash(other_file_name)
+
+
+class ContentClaim:
+    """
+    The conversion of one piece of content. The first file with the content converts it, the other files wait for
+    the result and clone it.
+    """
+
+    def __init__(self, source: str | Path):
+        self.source = Path(source)
+        self._done = threading.Event()
+        self._output: Path | None = None
+        self._content_location: Path | None = None
+
+    def finish(self, output: str | Path | None, content_location: str | Path | None = None) -> None:
+        """
+        Sets the converted file, or None if the conversion failed. content_location is where the original content
+        is after the conversion, if it was moved, like to the archive.
+        """
+        self._output = None if output is None else Path(output)
+        self._content_location = Path(content_location or self.source)
+        self._done.set()
+
+    def wait(self) -> tuple[Path | None, Path]:
+        """Waits for the conversion, returns the converted file and the location of the original content."""
+        self._done.wait()
+        return self._output, self._content_location
+
+
+class ContentIndex:
+    """Maps fingerprints to the conversions of their content, can be shared between threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._claims: dict[tuple[int, bytes], ContentClaim] = {}
+
+    def claim(self, file_name: str | Path) -> tuple[ContentClaim, bool]:
+        """
+        Returns the claim of the content of file_name, and whether the caller claimed it first and has to convert it
+        and finish the claim. Others have to check with same_content that the content really is the same.
+        """
+        key = fingerprint(file_name)
+        with self._lock:
+            claim = self._claims.get(key)
+            if claim is not None:
+                return claim, False
+            claim = self._claims[key] = ContentClaim(file_name)
+            return claim, True
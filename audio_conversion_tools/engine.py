@@ -0,0 +1,94 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, TypeVar
+
+from audio_conversion_tools import ffmpeg_runner
+from audio_conversion_tools.logging import logger
+
+T = TypeVar("T")
+
+
+@dataclass
+class JobResult:
+    item: Any
+    success: bool
+    duration: float
+    error: str | None = None
+
+
+@dataclass
+class ConversionSummary:
+    results: list[JobResult] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> list[JobResult]:
+        return [result for result in self.results if result.success]
+
+    @property
+    def failed(self) -> list[JobResult]:
+        return [result for result in self.results if not result.success]
+
+    @property
+    def total_duration(self) -> float:
+        return sum(result.duration for result in self.results)
+
+    def log(self, description: str = "files") -> None:
+        logger.info(
+            f"Succesfully converted {len(self.succeeded)} of {len(self.results)} {description} "
+            f"({self.total_duration:.1f}s of conversion time)"
+        )
+        for result in self.failed:
+            if result.error is not None:
+                logger.error(f"Conversion of {result.item} raised an error: {result.error}")
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def run_jobs(fn: Callable[[T], bool], items: Iterable[T], jobs: int | None = None) -> ConversionSummary:
+    """
+    Runs fn over all items using a pool of worker threads and aggregates the results.
+
+    The conversions themselves run in ffmpeg subprocesses, so threads are enough to keep all cores busy. Items are
+    consumed lazily and at most 2 * jobs conversions are in flight at once, which means `items` can be a generator
+    that is still producing work while the first conversions run.
+    """
+    jobs = jobs or default_jobs()
+    if jobs < 1:
+        raise ValueError(f"Number of jobs should be at least 1, got {jobs}")
+
+    summary = ConversionSummary()
+    max_in_flight = 2 * jobs
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        in_flight: set[Future[JobResult]] = set()
+        try:
+            for item in items:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    summary.results.extend(future.result() for future in done)
+                in_flight.add(executor.submit(run_job, fn, item))
+
+            for future in in_flight:
+                summary.results.append(future.result())
+        except KeyboardInterrupt:
+            # Killing ffmpeg makes the running conversions fail, which moves their original files back in place.
+            logger.warning("Interrupted, cancelling the running conversions...")
+            executor.shutdown(wait=False, cancel_futures=True)
+            ffmpeg_runner.cancel_all()
+            raise
+
+    return summary
+
+
+def run_job(fn: Callable[[T], bool], item: T) -> JobResult:
+    """Runs fn on a single item, an exception fails the item instead of being raised."""
+    start = time.perf_counter()
+    try:
+        success = bool(fn(item))
+        return JobResult(item=item, success=success, duration=time.perf_counter() - start)
+    except Exception as e:
+        return JobResult(item=item, success=False, duration=time.perf_counter() - start, error=str(e))
@@ -0,0 +1,214 @@
+"""
+Runs ffmpeg processes on an asyncio event loop in a background thread.
+
+Conversions call `FfmpegRunner.run` from their worker threads like they would call subprocess.run, but the processes
+get a wall clock timeout, their progress is reported while they run, only the tail of their output is kept in
+memory, and all running processes can be killed at once when the run is cancelled.
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+from collections import deque
+from typing import Iterator
+
+from audio_conversion_tools.logging import logger
+
+# Only the last lines of the ffmpeg output end up in the ffmpeg log, the rest is progress and stream info.
+MAX_OUTPUT_LINES = 200
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+# Return code of processes that were killed, like subprocess reports a SIGKILL.
+KILLED_RETURN_CODE = -9
+
+_current_runner: "FfmpegRunner | None" = None
+# The runner current_runner created when no runner was opened.
+_default_runner: "FfmpegRunner | None" = None
+_CURRENT_RUNNER_LOCK = threading.Lock()
+
+
+class Progress:
+    """Counts finished ffmpeg processes and the seconds of audio they wrote."""
+
+    def __init__(self) -> None:
+        self.start_time = time.perf_counter()
+        self.finished = 0
+        self.failed = 0
+        self.running = 0
+        self.finished_audio_seconds = 0.0
+        # Seconds of audio written so far by every running process.
+        self.running_audio_seconds: dict[int, float] = {}
+
+    @property
+    def audio_seconds(self) -> float:
+        return self.finished_audio_seconds + sum(self.running_audio_seconds.values())
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        return (
+            f"{self.finished} ffmpeg runs finished ({self.failed} failed), {self.running} running,"
+            f" {self.finished / elapsed:.1f} files/s, {self.audio_seconds / elapsed:.0f}x realtime"
+        )
+
+
+class FfmpegRunner:
+    def __init__(
+        self,
+        timeout: float | None = None,
+        max_processes: int | None = None,
+        progress_interval: float | None = DEFAULT_PROGRESS_INTERVAL,
+    ):
+        self.timeout = timeout
+        self.progress = Progress()
+        self._cancelled = False
+        self._processes: set[asyncio.subprocess.Process] = set()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ffmpeg-runner", daemon=True)
+        self._thread.start()
+        self._semaphore = asyncio.run_coroutine_threadsafe(_make_semaphore(max_processes), self._loop).result()
+        self._reporter = (
+            asyncio.run_coroutine_threadsafe(self._report(progress_interval), self._loop) if progress_interval else None
+        )
+
+    def run(self, cmd: list[str]) -> tuple[int, str]:
+        """Runs an ffmpeg command and returns its return code and the tail of its output."""
+        return asyncio.run_coroutine_threadsafe(self._run(cmd), self._loop).result()
+
+    def cancel(self) -> None:
+        """Kills all running processes, and makes the processes that did not start yet fail immediately."""
+        self._cancelled = True
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._kill_all)
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        if self._reporter is not None:
+            self._reporter.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "FfmpegRunner":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    async def _run(self, cmd: list[str]) -> tuple[int, str]:
+        async with self._semaphore:
+            if self._cancelled:
+                return KILLED_RETURN_CODE, "Cancelled before ffmpeg started"
+
+            process = await asyncio.create_subprocess_exec(
+                cmd[0],
+                "-progress",
+                "pipe:1",
+                "-nostats",
+                *cmd[1:],
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            self._processes.add(process)
+            self.progress.running += 1
+            self.progress.running_audio_seconds[process.pid] = 0.0
+            output: deque[str] = deque(maxlen=MAX_OUTPUT_LINES)
+
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        self._read_progress(process),
+                        self._read_output(process, output),
+                        process.wait(),
+                    ),
+                    self.timeout,
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                output.append(f"Killed ffmpeg after a timeout of {self.timeout}s")
+            finally:
+                self._processes.discard(process)
+                self.progress.running -= 1
+                self.progress.finished += 1
+                self.progress.finished_audio_seconds += self.progress.running_audio_seconds.pop(process.pid)
+
+            if self._cancelled and process.returncode != 0:
+                output.append("Cancelled")
+            if process.returncode != 0:
+                self.progress.failed += 1
+            return process.returncode, "\n".join(output)
+
+    async def _read_progress(self, process: asyncio.subprocess.Process) -> None:
+        # -progress writes blocks of key=value lines, out_time_us is the position in the output.
+        async for line in process.stdout:
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            if key == "out_time_us" and value.isdigit():
+                self.progress.running_audio_seconds[process.pid] = int(value) / 1e6
+
+    async def _read_output(self, process: asyncio.subprocess.Process, output: deque[str]) -> None:
+        async for line in process.stderr:
+            output.append(line.decode(errors="replace").rstrip())
+
+    def _kill_all(self) -> None:
+        for process in self._processes:
+            if process.returncode is None:
+                process.kill()
+
+    async def _report(self, interval: float) -> None:
+        last_finished = -1
+        while True:
+            await asyncio.sleep(interval)
+            if self.progress.running or self.progress.finished != last_finished:
+                last_finished = self.progress.finished
+                logger.info(self.progress.summary())
+
+
+async def _make_semaphore(max_processes: int | None) -> asyncio.Semaphore | contextlib.nullcontext:
+    # The semaphore is created on the loop thread, asyncio primitives belong to the loop that creates them.
+    return asyncio.Semaphore(max_processes) if max_processes else contextlib.nullcontext()
+
+
+def current_runner() -> FfmpegRunner:
+    """Returns the runner opened with open_ffmpeg_runner, or a default runner without timeout."""
+    global _current_runner, _default_runner
+    with _CURRENT_RUNNER_LOCK:
+        if _current_runner is None:
+            _current_runner = _default_runner = FfmpegRunner(progress_interval=None)
+        return _current_runner
+
+
+@contextlib.contextmanager
+def open_ffmpeg_runner(
+    timeout: float | None = None,
+    max_processes: int | None = None,
+    progress_interval: float | None = DEFAULT_PROGRESS_INTERVAL,
+) -> Iterator[FfmpegRunner]:
+    """Runs all ffmpeg conversions within the block on a new runner."""
+    global _current_runner
+    previous_runner = _current_runner
+    with FfmpegRunner(timeout, max_processes, progress_interval) as runner:
+        _current_runner = runner
+        try:
+            yield runner
+        finally:
+            _current_runner = previous_runner
+    if runner.progress.finished:
+        logger.info(runner.progress.summary())
+
+
+def cancel_all() -> None:
+    """
+    Kills the ffmpeg processes of the current runner, used when a run is interrupted. The default runner stays
+    cancelled for the conversions that were in flight, the conversions after them get a new one.
+    """
+    global _current_runner, _default_runner
+    with _CURRENT_RUNNER_LOCK:
+        runner = _current_runner
+        if runner is not None and runner is _default_runner:
+            _current_runner = _default_runner = None
+    if runner is not None:
+        runner.cancel()
@@ -0,0 +1,83 @@
+"""
+Make-style freshness checks for the folder CLIs, so running them again over a folder only converts the new files.
+
+The manifest, a sidecar file in the converted folder, stores the size and modification time of every source at the
+time it was converted, and optionally its hash, so a source that was replaced by another file with an older
+modification time is converted again, and a source that was only touched is not. A target that is not in the
+manifest is up to date when it is newer than its source.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from audio_conversion_tools.archive import file_hash
+from audio_conversion_tools.logging import logger
+
+MANIFEST_NAME = ".conversion_manifest.json"
+
+
+class Manifest:
+    """The sources converted in a folder, stored in MANIFEST_NAME. Can be shared between threads."""
+
+    def __init__(self, folder: str | Path, hash_sources: bool = False):
+        self.folder = Path(folder)
+        self.location = self.folder / MANIFEST_NAME
+        self.hash_sources = hash_sources
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+
+        if self.location.exists():
+            try:
+                with open(self.location) as manifest_file:
+                    self._entries = json.load(manifest_file)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Could not read {self.location}, will only compare modification times: {e}")
+
+    def is_fresh(self, source: str | Path, target: str | Path) -> bool:
+        """Whether target was converted from the current version of source."""
+        try:
+            source_stat = os.stat(source)
+            target_stat = os.stat(target)
+        except FileNotFoundError:
+            return False
+        if target_stat.st_size == 0:
+            return False
+
+        entry = self._entries.get(self._key(source))
+        if entry is None or entry["target"] != self._key(target):
+            return target_stat.st_mtime_ns >= source_stat.st_mtime_ns
+        if entry["size"] == source_stat.st_size and entry["mtime_ns"] == source_stat.st_mtime_ns:
+            return True
+        # The source changed on disk, with a hash we can tell whether its content changed too, even when the source
+        # is newer than the target now.
+        if not self.hash_sources or entry.get("hash") is None or entry["size"] != source_stat.st_size:
+            return False
+        if file_hash(source).hex() != entry["hash"]:
+            return False
+        self.add(source, target)
+        return True
+
+    def add(self, source: str | Path, target: str | Path) -> None:
+        source_stat = os.stat(source)
+        entry = {
+            "target": self._key(target),
+            "size": source_stat.st_size,
+            "mtime_ns": source_stat.st_mtime_ns,
+            "hash": file_hash(source).hex() if self.hash_sources else None,
+        }
+        with self._lock:
+            self._entries[self._key(source)] = entry
+
+    def save(self) -> None:
+        with self._lock:
+            entries = dict(self._entries)
+        temp_location = self.location.with_name(f"{MANIFEST_NAME}.tmp")
+        with open(temp_location, "w") as manifest_file:
+            json.dump(entries, manifest_file)
+        os.replace(temp_location, self.location)
+
+    def _key(self, file_name: str | Path) -> str:
+        # Relative, so the folder can be moved without converting everything again.
+        return os.path.relpath(os.path.abspath(file_name), self.folder.absolute())
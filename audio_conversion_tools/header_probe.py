@@ -0,0 +1,203 @@
+"""
+Reads the format of WAV / RF64, AIFF / AIFC and FLAC files from their headers, without libsndfile. Only the chunk
+headers are read, so probing a file costs about one read of a few KB.
+
+Subtypes are named like soundfile names them, so the results can be used interchangeably with sf.info.
+"""
+
+import struct
+from pathlib import Path
+
+# The file is read through a buffer of this size, chunks that start further in the file cost an extra read.
+HEADER_BUFFER_SIZE = 4096
+
+# (sample format, bits per sample) -> soundfile subtype
+_SUBTYPES = {
+    ("uint", 8): "PCM_U8",
+    ("int", 8): "PCM_S8",
+    ("int", 16): "PCM_16",
+    ("int", 24): "PCM_24",
+    ("int", 32): "PCM_32",
+    ("float", 32): "FLOAT",
+    ("float", 64): "DOUBLE",
+    ("alaw", 8): "ALAW",
+    ("ulaw", 8): "ULAW",
+}
+
+_WAVE_FORMATS = {0x0001: "int", 0x0003: "float", 0x0006: "alaw", 0x0007: "ulaw"}
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_AIFC_COMPRESSIONS = {
+    b"NONE": "int",
+    b"twos": "int",
+    b"sowt": "int",
+    b"fl32": "float",
+    b"FL32": "float",
+    b"fl64": "float",
+    b"FL64": "float",
+    b"alaw": "alaw",
+    b"ALAW": "alaw",
+    b"ulaw": "ulaw",
+    b"ULAW": "ulaw",
+}
+
+
+class UnsupportedHeader(ValueError):
+    """The file is not a WAV, AIFF or FLAC file we can read the header of."""
+
+
+class HeaderInfo:
+    __slots__ = ("sample_rate", "bit_depth", "sample_format", "channels", "frames", "subtype")
+
+    def __init__(self, sample_rate: int, bit_depth: int, sample_format: str, channels: int, frames: int):
+        self.sample_rate = sample_rate
+        self.bit_depth = bit_depth
+        self.sample_format = sample_format
+        self.channels = channels
+        self.frames = frames
+        try:
+            self.subtype = _SUBTYPES[(sample_format, bit_depth)]
+        except KeyError:
+            raise UnsupportedHeader(f"Unsupported sample format: {bit_depth} bit {sample_format}") from None
+
+    def __repr__(self) -> str:
+        return (
+            f"HeaderInfo(sample_rate={self.sample_rate}, bit_depth={self.bit_depth},"
+            f" sample_format={self.sample_format!r}, channels={self.channels}, frames={self.frames})"
+        )
+
+
+def read_header(file_name: str | Path) -> HeaderInfo:
+    """Reads the format of a WAV, AIFF or FLAC file, raises UnsupportedHeader for anything else."""
+    with open(file_name, "rb", buffering=HEADER_BUFFER_SIZE) as f:
+        magic = f.read(12)
+        if magic[:4] in (b"RIFF", b"RF64") and magic[8:12] == b"WAVE":
+            return _read_wave(f, rf64=magic[:4] == b"RF64")
+        if magic[:4] == b"FORM" and magic[8:12] in (b"AIFF", b"AIFC"):
+            return _read_aiff(f)
+        if magic[:4] == b"fLaC":
+            f.seek(4)
+            return _read_flac(f)
+        if magic[:3] == b"ID3":
+            # FLACs are sometimes written with an ID3 tag in front of them.
+            flags, size = magic[5], _syncsafe(magic[6:10])
+            f.seek(10 + size + (10 if flags & 0x10 else 0))
+            if f.read(4) == b"fLaC":
+                return _read_flac(f)
+
+    raise UnsupportedHeader(f"Unknown file format: {file_name}")
+
+
+def _read_wave(f, rf64: bool) -> HeaderInfo:
+    fmt = None
+    data_size = None
+    rf64_data_size = None
+
+    for chunk_id, chunk_size, offset in _iter_chunks(f, 12, "<"):
+        if chunk_id == b"ds64":
+            f.seek(offset)
+            _, rf64_data_size = struct.unpack("<QQ", f.read(16))
+        elif chunk_id == b"fmt ":
+            f.seek(offset)
+            fmt = f.read(min(chunk_size, 40))
+        elif chunk_id == b"data":
+            data_size = rf64_data_size if rf64 and chunk_size == 0xFFFFFFFF else chunk_size
+            # Writers that couldn't seek back leave the size of the data chunk unset.
+            data_size = min(data_size, _file_size(f) - offset)
+            break
+
+    if fmt is None or data_size is None or len(fmt) < 16:
+        raise UnsupportedHeader("WAV file without fmt or data chunk")
+
+    format_tag, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == _WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 26:
+            raise UnsupportedHeader("WAVE_FORMAT_EXTENSIBLE without sub format")
+        # The first two bytes of the sub format GUID are the actual format tag.
+        (format_tag,) = struct.unpack("<H", fmt[24:26])
+    if format_tag not in _WAVE_FORMATS or block_align == 0:
+        raise UnsupportedHeader(f"Unsupported WAV format {format_tag:#06x}")
+
+    sample_format = _WAVE_FORMATS[format_tag]
+    if sample_format == "int" and bits_per_sample == 8:
+        sample_format = "uint"
+    return HeaderInfo(sample_rate, bits_per_sample, sample_format, channels, data_size // block_align)
+
+
+def _read_aiff(f) -> HeaderInfo:
+    for chunk_id, chunk_size, offset in _iter_chunks(f, 12, ">"):
+        if chunk_id == b"COMM":
+            f.seek(offset)
+            comm = f.read(min(chunk_size, 22))
+            break
+    else:
+        raise UnsupportedHeader("AIFF file without COMM chunk")
+
+    if len(comm) < 18:
+        raise UnsupportedHeader("Truncated COMM chunk")
+    channels, frames, bits_per_sample = struct.unpack(">hIh", comm[:8])
+    sample_rate = _extended_to_int(comm[8:18])
+
+    # Plain AIFF has no compression type and is always big endian PCM.
+    compression = comm[18:22] if len(comm) >= 22 else b"NONE"
+    if compression not in _AIFC_COMPRESSIONS:
+        raise UnsupportedHeader(f"Unsupported AIFC compression {compression!r}")
+    sample_format = _AIFC_COMPRESSIONS[compression]
+    if sample_format == "float":
+        bits_per_sample = 64 if compression in (b"fl64", b"FL64") else 32
+    elif sample_format in ("alaw", "ulaw"):
+        bits_per_sample = 8
+    return HeaderInfo(sample_rate, bits_per_sample, sample_format, channels, frames)
+
+
+def _read_flac(f) -> HeaderInfo:
+    block_header = f.read(4)
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0:
+        raise UnsupportedHeader("FLAC file without STREAMINFO")
+
+    streaminfo = f.read(34)
+    if len(streaminfo) < 18:
+        raise UnsupportedHeader("Truncated STREAMINFO")
+    # 20 bits sample rate, 3 bits channels - 1, 5 bits bits per sample - 1 and 36 bits total samples.
+    (packed,) = struct.unpack(">Q", streaminfo[10:18])
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits_per_sample = ((packed >> 36) & 0x1F) + 1
+    frames = packed & 0xFFFFFFFFF
+    if frames == 0:
+        raise UnsupportedHeader("FLAC file with unknown length")
+    return HeaderInfo(sample_rate, bits_per_sample, "int", channels, frames)
+
+
+def _iter_chunks(f, offset: int, byte_order: str):
+    """Yields (chunk id, chunk size, offset of the chunk data) of the IFF style chunks starting at offset."""
+    while True:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        chunk_id, chunk_size = struct.unpack(f"{byte_order}4sI", header)
+        yield chunk_id, chunk_size, offset + 8
+        # Chunks are padded to an even number of bytes.
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+
+def _extended_to_int(data: bytes) -> int:
+    """Converts an 80 bit IEEE 754 extended precision float, as used for the AIFF sample rate."""
+    exponent, mantissa = struct.unpack(">HQ", data)
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0
+    return sign * round(mantissa * 2.0 ** (exponent - 16383 - 63))
+
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _file_size(f) -> int:
+    position = f.tell()
+    size = f.seek(0, 2)
+    f.seek(position)
+    return size
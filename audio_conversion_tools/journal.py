@@ -0,0 +1,151 @@
+"""
+Write-ahead journal of the in-place conversions, so a run that crashed can be finished or rolled back.
+
+Every conversion goes through the states planned -> archived -> encoding -> encoded -> committed, or ends in rolled
+back. A state is appended to the journal before the step it announces, so after a crash the last state of a file
+tells what may have happened to it. Writes of all conversion threads are fsync-ed together by a flusher thread, and
+only the records that have to be on disk before the next step wait for the fsync.
+"""
+
+import contextlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterator
+
+JOURNAL_NAME = "journal.jsonl"
+
+PLANNED = "planned"
+ARCHIVED = "archived"
+ENCODING = "encoding"
+ENCODED = "encoded"
+COMMITTED = "committed"
+ROLLED_BACK = "rolled_back"
+
+# States after which nothing is left to finish or roll back.
+FINAL_STATES = (COMMITTED, ROLLED_BACK)
+
+# Seconds the flusher waits for more records before it fsyncs the ones it has, records that have to be on disk before
+# a conversion can continue are fsync-ed right away.
+DEFAULT_FLUSH_INTERVAL = 0.05
+
+
+class ConversionJournal:
+    """Appends state transitions to journal.jsonl, can be shared between threads."""
+
+    def __init__(self, location: str | Path, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.location = Path(location)
+        self.flush_interval = flush_interval
+
+        self._file = open(self.location, "a")
+        self._condition = threading.Condition()
+        self._pending: list[str] = []
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        self._durable_waiters = 0
+        self._error: OSError | None = None
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    def record(self, state: str, file_location: str | Path, durable: bool = False, **details: object) -> None:
+        """
+        Appends a state of file_location. With durable the call only returns once the record is fsync-ed, which is
+        needed before a step that can't be detected afterwards, like moving the original into the archive.
+        """
+        line = json.dumps({"state": state, "file": str(file_location), **details}, default=str)
+        with self._condition:
+            if self._closed:
+                raise ValueError("Journal is closed")
+            self._pending.append(line)
+            self._written += 1
+            sequence_number = self._written
+            self._condition.notify_all()
+            if durable:
+                self._durable_waiters += 1
+                self._condition.notify_all()
+                while self._synced < sequence_number and self._error is None:
+                    self._condition.wait()
+                self._durable_waiters -= 1
+            if self._error is not None:
+                raise self._error
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+    def __enter__(self) -> "ConversionJournal":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+                # Gives the other conversion threads the chance to add their records to this fsync, unless a
+                # conversion is waiting for it.
+                self._condition.wait_for(lambda: self._durable_waiters or self._closed, timeout=self.flush_interval)
+
+            with self._condition:
+                lines, self._pending = self._pending, []
+                sequence_number = self._written
+            try:
+                self._file.write("".join(f"{line}\n" for line in lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._synced = sequence_number
+                self._condition.notify_all()
+
+
+@contextlib.contextmanager
+def open_journal(folder: str | Path) -> Iterator[ConversionJournal]:
+    """Opens the journal in folder, which is removed again when the block finishes without unfinished conversions."""
+    location = Path(folder) / JOURNAL_NAME
+    with ConversionJournal(location) as conversion_journal:
+        yield conversion_journal
+    if not unfinished(location):
+        location.unlink()
+
+
+def read_journal(location: str | Path) -> dict[str, dict]:
+    """
+    Returns the last state of every file in the journal, with the details of all its records merged. A record that
+    was cut off by the crash is ignored.
+    """
+    files: dict[str, dict] = {}
+    for record in _read_records(location):
+        files.setdefault(record["file"], {}).update(record)
+    return files
+
+
+def unfinished(location: str | Path) -> dict[str, dict]:
+    """The files of which the conversion was still in flight when the journal was last written."""
+    return {file: record for file, record in read_journal(location).items() if record["state"] not in FINAL_STATES}
+
+
+def _read_records(location: str | Path) -> Iterator[dict]:
+    if not Path(location).exists():
+        return
+    with open(location) as journal_file:
+        for line in journal_file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
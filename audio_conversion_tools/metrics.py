@@ -0,0 +1,184 @@
+"""
+Timers and counters around the stages of a run, reported as JSON at the end of the run.
+
+The stages call the module level `timer` and `count` functions, which only record anything within an
+`open_metrics` block, so code that runs without a report does not pay for the bookkeeping.
+"""
+
+import contextlib
+import cProfile
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator, TypeVar
+
+import numpy as np
+
+from audio_conversion_tools.logging import logger
+
+T = TypeVar("T")
+
+DEFAULT_SLOWEST = 10
+PERCENTILES = [50, 90, 99]
+# Number of allocation sites in the tracemalloc report.
+_TRACEMALLOC_TOP = 50
+
+_current_metrics: "Metrics | None" = None
+
+
+class Metrics:
+    """Durations per stage and per file, counters and bytes processed. Can be shared between threads."""
+
+    def __init__(self) -> None:
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._durations: dict[str, list[float]] = defaultdict(list)
+        self._item_durations: dict[str, float] = defaultdict(float)
+        self._counters: dict[str, int] = defaultdict(int)
+        self.bytes_processed = 0
+
+    def record(self, stage: str, duration: float, item: object = None) -> None:
+        with self._lock:
+            self._durations[stage].append(duration)
+            if item is not None:
+                self._item_durations[str(item)] += duration
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def add_bytes(self, n: int) -> None:
+        with self._lock:
+            self.bytes_processed += n
+
+    def report(self, slowest: int = DEFAULT_SLOWEST) -> dict:
+        with self._lock:
+            stages = {stage: _stage_report(durations) for stage, durations in self._durations.items()}
+            slowest_items = sorted(self._item_durations.items(), key=lambda item: item[1], reverse=True)[:slowest]
+            return {
+                "wall_seconds": time.perf_counter() - self.start_time,
+                "bytes_processed": self.bytes_processed,
+                "stages": stages,
+                "counters": dict(self._counters),
+                "slowest_files": [{"file": item, "seconds": seconds} for item, seconds in slowest_items],
+            }
+
+    def write_report(self, report_location: str | Path, slowest: int = DEFAULT_SLOWEST) -> None:
+        with open(report_location, "w") as report_file:
+            json.dump(self.report(slowest), report_file, indent=2)
+        logger.info(f"Wrote run report to {report_location}")
+
+
+def _stage_report(durations: list[float]) -> dict:
+    values = np.array(durations)
+    return {
+        "count": len(values),
+        "total_seconds": float(values.sum()),
+        **{f"p{p}_seconds": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES), strict=True)},
+        "max_seconds": float(values.max()),
+    }
+
+
+@contextlib.contextmanager
+def timer(stage: str, item: object = None) -> Iterator[None]:
+    """Times the block as one occurrence of stage, the time is also added to the total of item if given."""
+    metrics = _current_metrics
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record(stage, time.perf_counter() - start, item)
+
+
+def timed_iter(stage: str, items: Iterable[T]) -> Iterator[T]:
+    """Yields the items, timing every step of the iterator as stage, for readers that are consumed lazily."""
+    iterator = iter(items)
+    while True:
+        with timer(stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def count(name: str, n: int = 1) -> None:
+    if _current_metrics is not None:
+        _current_metrics.count(name, n)
+
+
+def add_file_bytes(file_name: str | Path) -> None:
+    """Adds the size of a file to the bytes processed, only stats the file when metrics are recorded."""
+    if _current_metrics is not None:
+        _current_metrics.add_bytes(Path(file_name).stat().st_size)
+
+
+@contextlib.contextmanager
+def open_metrics(report_location: str | Path | None = None) -> Iterator[Metrics]:
+    """Records the metrics of the block, and writes the report to report_location if given."""
+    global _current_metrics
+    previous_metrics = _current_metrics
+    metrics = _current_metrics = Metrics()
+    try:
+        yield metrics
+    finally:
+        _current_metrics = previous_metrics
+        if report_location is not None:
+            metrics.write_report(report_location)
+
+
+@contextlib.contextmanager
+def profile(output_directory: str | Path | None) -> Iterator[None]:
+    """
+    Runs the block under cProfile and tracemalloc, and writes profile.prof and tracemalloc.txt to output_directory.
+    The threads started within the block, like the conversion workers, get a profiler of their own, their stats are
+    merged with the ones of the calling thread. Does nothing if output_directory is None.
+    """
+    if output_directory is None:
+        yield
+        return
+
+    output_directory = Path(output_directory)
+    profiler = cProfile.Profile()
+    thread_profilers: list[cProfile.Profile] = []
+    thread_profilers_lock = threading.Lock()
+
+    def profile_thread(*args: object) -> None:
+        # Called on the first event of every new thread, the profiler replaces it as the profile function.
+        thread_profiler = cProfile.Profile()
+        with thread_profilers_lock:
+            thread_profilers.append(thread_profiler)
+        thread_profiler.enable()
+
+    tracemalloc.start()
+    threading.setprofile(profile_thread)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = pstats.Stats(profiler)
+        with thread_profilers_lock:
+            for thread_profiler in thread_profilers:
+                thread_profiler.create_stats()
+                if thread_profiler.stats:
+                    stats.add(thread_profiler)
+        stats.dump_stats(output_directory / "profile.prof")
+        with open(output_directory / "tracemalloc.txt", "w") as tracemalloc_file:
+            tracemalloc_file.write(f"Peak traced memory: {peak / 2**20:.1f} MiB\n\n")
+            for statistic in snapshot.statistics("lineno")[:_TRACEMALLOC_TOP]:
+                tracemalloc_file.write(f"{statistic}\n")
+        logger.info(f"Wrote profile.prof and tracemalloc.txt to {output_directory}")
@@ -0,0 +1,206 @@
+"""
+In-process conversion backend for WAV / AIFF / FLAC to 16 bit, which avoids starting an ffmpeg process per file. Files
+are streamed in blocks, so memory use does not depend on the length of the file.
+
+Only the integer ratios picked by `determine_target_sample_rate` (1:1, 2:1 and 4:1) are supported, which means the
+resampling is a plain decimation: a linear phase low-pass FIR filter evaluated in polyphase form, so only the output
+samples we keep are computed.
+"""
+
+from pathlib import Path
+
+import mutagen
+import numpy as np
+import soundfile as sf
+from mutagen.id3 import ID3
+
+# Number of filter taps per polyphase branch, the filter has TAPS_PER_PHASE * factor + 1 taps in total.
+TAPS_PER_PHASE = 128
+# Cutoff relative to the Nyquist frequency of the output, leaves ~1 kHz of transition band at 44.1 / 48 kHz.
+CUTOFF = 0.95
+KAISER_BETA = 9.0
+
+DEFAULT_DITHER_SEED = 0
+
+# Files are converted in blocks of this many frames, lowered when the blocks don't fit in DEFAULT_MAX_MEMORY bytes.
+DEFAULT_BLOCK_SIZE = 2**16
+MIN_BLOCK_SIZE = 2**10
+DEFAULT_MAX_MEMORY = 64 * 2**20
+
+
+class UnsupportedRatio(ValueError): ...
+
+
+def design_decimation_filter(factor: int) -> np.ndarray:
+    """Kaiser windowed sinc low-pass filter for decimating by `factor`, normalised to unity gain at DC."""
+    num_taps = TAPS_PER_PHASE * factor + 1
+    cutoff = CUTOFF / (2 * factor)  # in cycles per input sample
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, KAISER_BETA)
+    return taps / taps.sum()
+
+
+def decimate(samples: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Low-pass filters and decimates samples of shape (frames, channels) by an integer factor in one go.
+
+    The filter delay is compensated, so output sample n lines up with input sample n * factor and the output has
+    ceil(frames / factor) samples, like ffmpeg produces.
+    """
+    decimator = StreamingDecimator(factor, samples.shape[1])
+    return np.concatenate([decimator.process(samples), decimator.flush()])
+
+
+class StreamingDecimator:
+    """
+    Decimates a stream of blocks, keeping the filter history between blocks.
+
+    Every output sample is computed with the same sequence of multiply-adds regardless of where the block boundaries
+    are, so the result is bit-identical to decimating the whole signal at once.
+    """
+
+    def __init__(self, factor: int, num_channels: int):
+        self.factor = factor
+        self.num_channels = num_channels
+        self._input_frames = 0
+        self._output_frames = 0
+
+        taps = design_decimation_filter(factor) if factor > 1 else np.ones(1)
+        # Polyphase decomposition: taps[q * factor + p] is tap q of branch p, and branch p only sees the input
+        # samples at positions m * factor + p.
+        self._taps_per_phase = -(-len(taps) // factor)
+        phase_taps = np.zeros(self._taps_per_phase * factor)
+        phase_taps[: len(taps)] = taps
+        self._phase_taps = phase_taps.reshape(self._taps_per_phase, factor)
+
+        # Start with half a filter length of silence, which compensates the delay of the linear phase filter.
+        self._pending = np.zeros(((len(taps) - 1) // 2, num_channels))
+
+    @property
+    def history_frames(self) -> int:
+        """Number of input frames that are kept between blocks."""
+        return self._taps_per_phase * self.factor
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        self._input_frames += len(block)
+        buffer = np.concatenate([self._pending, block]) if len(self._pending) else block
+        output = self._filter(buffer)
+        self._output_frames += len(output)
+        return output
+
+    def flush(self) -> np.ndarray:
+        """Returns the remaining output samples, by running the filter over trailing silence."""
+        remaining_frames = -(-self._input_frames // self.factor) - self._output_frames
+        buffer = np.concatenate([self._pending, np.zeros((self.history_frames, self.num_channels))])
+        output = self._filter(buffer)[:remaining_frames]
+        self._output_frames += len(output)
+        return output
+
+    def _filter(self, buffer: np.ndarray) -> np.ndarray:
+        num_output_frames = (len(buffer) - self.history_frames) // self.factor + 1
+        if num_output_frames <= 0:
+            self._pending = buffer.copy()
+            return np.zeros((0, self.num_channels))
+
+        num_rows = num_output_frames + self._taps_per_phase - 1
+        phases = buffer[: num_rows * self.factor].reshape(num_rows, self.factor, self.num_channels)
+
+        output = np.zeros((num_output_frames, self.num_channels))
+        for phase in range(self.factor):
+            for tap in range(self._taps_per_phase):
+                output += self._phase_taps[tap, phase] * phases[tap : tap + num_output_frames, phase]
+
+        self._pending = buffer[num_output_frames * self.factor :].copy()
+        return output
+
+
+def quantize_to_16bit(samples: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Quantizes float samples in [-1, 1) to 16 bit with triangular (TPDF) dither of +-1 LSB.
+
+    The dither for each frame is drawn in order, so quantizing block by block gives the same result as quantizing
+    everything at once with the same generator.
+    """
+    uniform = rng.random((*samples.shape, 2))
+    dither = uniform[..., 0] - uniform[..., 1]
+    quantized = np.rint(samples * 32768 + dither)
+    return np.clip(quantized, -32768, 32767).astype(np.int16)
+
+
+def convert_file(
+    input_name: str | Path,
+    output_name: str | Path,
+    target_sample_rate: int,
+    seed: int = DEFAULT_DITHER_SEED,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    max_memory: int = DEFAULT_MAX_MEMORY,
+) -> None:
+    """
+    Converts input_name to a 16 bit WAV or AIFF (based on the extension of output_name) at target_sample_rate.
+
+    The file is streamed in blocks of block_size frames, the block size is lowered if the buffers needed for a
+    block would not fit in max_memory bytes.
+    """
+    with sf.SoundFile(input_name) as input_file:
+        sample_rate = input_file.samplerate
+        num_channels = input_file.channels
+
+        if sample_rate % target_sample_rate != 0 or sample_rate // target_sample_rate not in (1, 2, 4):
+            raise UnsupportedRatio(
+                f"Can not convert {sample_rate}Hz to {target_sample_rate}Hz with an integer ratio of 1, 2 or 4"
+            )
+
+        decimator = StreamingDecimator(sample_rate // target_sample_rate, num_channels)
+        block_size = _fit_block_size(block_size, num_channels, decimator.history_frames, max_memory)
+        rng = np.random.default_rng(seed)
+
+        with sf.SoundFile(
+            output_name,
+            "w",
+            samplerate=target_sample_rate,
+            channels=num_channels,
+            subtype="PCM_16",
+            format=_output_format(output_name),
+        ) as output_file:
+            for block in input_file.blocks(blocksize=block_size, dtype="float64", always_2d=True):
+                output_file.write(quantize_to_16bit(decimator.process(block), rng))
+            output_file.write(quantize_to_16bit(decimator.flush(), rng))
+
+    _copy_tags(input_name, output_name)
+
+
+def estimate_memory(block_size: int, num_channels: int, history_frames: int) -> int:
+    """Upper bound of the bytes allocated while converting one block."""
+    buffer_frames = block_size + history_frames
+    # The block read from file, the block plus filter history, the filter output and the dither / quantized samples.
+    return 8 * num_channels * (block_size + 2 * buffer_frames + 4 * block_size)
+
+
+def _fit_block_size(block_size: int, num_channels: int, history_frames: int, max_memory: int) -> int:
+    while block_size > MIN_BLOCK_SIZE and estimate_memory(block_size, num_channels, history_frames) > max_memory:
+        block_size //= 2
+
+    if estimate_memory(block_size, num_channels, history_frames) > max_memory:
+        raise ValueError(f"Can not convert within a memory limit of {max_memory} bytes")
+
+    return block_size
+
+
+def _output_format(file_name: str | Path) -> str:
+    return "AIFF" if Path(file_name).suffix.lower() in (".aif", ".aiff") else "WAV"
+
+
+def _copy_tags(source: str | Path, destination: str | Path) -> None:
+    """Copies the ID3 tags of the source file, like ffmpeg does with -write_id3v2."""
+    source_file = mutagen.File(source)
+    if source_file is None or not isinstance(source_file.tags, ID3) or not source_file.tags:
+        return
+
+    destination_file = mutagen.File(destination)
+    if destination_file is None:
+        return
+    if destination_file.tags is None:
+        destination_file.add_tags()
+    for frame in source_file.tags.values():
+        destination_file.tags.add(frame)
+    destination_file.save()
@@ -0,0 +1,173 @@
+"""
+Runs conversions as a pipeline of stages with bounded queues in between, so reading the next files from a slow disk,
+encoding and writing back the results overlap instead of taking turns for every file.
+
+Every stage has its own worker threads, I/O stages typically get a few and the encode stage one per CPU. The queues
+between the stages are bounded, so a fast stage blocks when the next stage can't keep up, and a byte budget limits
+the scratch space taken by the files that are in flight.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from audio_conversion_tools import ffmpeg_runner, metrics
+from audio_conversion_tools.engine import ConversionSummary, JobResult
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.scratch import DEFAULT_SCRATCH_BUDGET
+
+DEFAULT_IO_JOBS = 4
+DEFAULT_QUEUE_SIZE = 4
+
+# Size of the reads when reading a file ahead into the page cache.
+READ_AHEAD_CHUNK_SIZE = 2**20
+
+_DONE = object()
+
+
+@dataclass
+class PipelineConfig:
+    """Settings of a pipelined run, the number of encoders is the usual number of jobs."""
+
+    io_jobs: int = DEFAULT_IO_JOBS
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    scratch_budget: int = DEFAULT_SCRATCH_BUDGET
+
+
+@dataclass
+class Stage:
+    """
+    A step of the pipeline. fn gets the value returned by the previous stage and returns the value for the next one,
+    or a bool to finish the item early, True when it succeeded and False when it failed. The last stage returns
+    whether the item succeeded.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int
+    queue_size: int = DEFAULT_QUEUE_SIZE
+
+
+@dataclass
+class _Job:
+    item: Any
+    value: Any
+    start: float = field(default_factory=time.perf_counter)
+
+
+def run_pipeline(items: Iterable[Any], stages: list[Stage]) -> ConversionSummary:
+    """
+    Runs every item through the stages and aggregates the results. Like run_jobs the items are consumed lazily, the
+    first stage only takes a new item when there is room in its queue.
+
+    Stages handle their own failures, an exception raised by a stage fails the item without running the next stages.
+    When the run is interrupted the items that did not start yet are dropped, the others finish or fail in the
+    stages they are in, so they can clean up after themselves.
+    """
+    if not stages:
+        raise ValueError("A pipeline needs at least one stage")
+    for stage in stages:
+        if stage.workers < 1:
+            raise ValueError(f"Number of workers of stage {stage.name} should be at least 1, got {stage.workers}")
+
+    summary = ConversionSummary()
+    summary_lock = threading.Lock()
+    cancelled = threading.Event()
+    queues: list[queue.Queue] = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    running_workers = [stage.workers for stage in stages]
+
+    def finish(job: _Job, success: bool, error: str | None = None) -> None:
+        with summary_lock:
+            summary.results.append(JobResult(job.item, success, time.perf_counter() - job.start, error))
+
+    def work(index: int) -> None:
+        stage = stages[index]
+        last_stage = index == len(stages) - 1
+        while True:
+            job = queues[index].get()
+            if job is _DONE:
+                break
+            if index == 0:
+                if cancelled.is_set():
+                    continue
+                job.start = time.perf_counter()
+
+            try:
+                with metrics.timer(f"pipeline_{stage.name}"):
+                    value = stage.fn(job.value)
+            except Exception as e:
+                finish(job, False, str(e))
+                continue
+
+            if last_stage or isinstance(value, bool) or value is None:
+                finish(job, bool(value))
+            else:
+                job.value = value
+                queues[index + 1].put(job)
+
+        with summary_lock:
+            running_workers[index] -= 1
+            stage_done = running_workers[index] == 0
+        # The last worker of a stage stops the next stage, once everything it put in the queue is taken.
+        if stage_done and not last_stage:
+            for _ in range(stages[index + 1].workers):
+                queues[index + 1].put(_DONE)
+
+    threads = [
+        threading.Thread(target=work, args=(index,), name=f"pipeline-{stage.name}-{worker}")
+        for index, stage in enumerate(stages)
+        for worker in range(stage.workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in items:
+            queues[0].put(_Job(item, item))
+    except KeyboardInterrupt:
+        # Killing ffmpeg makes the running conversions fail, which moves their original files back in place.
+        logger.warning("Interrupted, cancelling the running conversions...")
+        cancelled.set()
+        ffmpeg_runner.cancel_all()
+        raise
+    finally:
+        for _ in range(stages[0].workers):
+            queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    return summary
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool of worker processes for in-process encoders, which would otherwise hold the GIL. The workers are spawned
+    instead of forked, a fork would copy the threads and locks of the run in an unknown state.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_ignore_interrupts,
+    )
+
+
+def _ignore_interrupts() -> None:
+    # The parent handles ctrl+c, the workers finish their current file so it can be cleaned up.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def read_ahead(file_name: str | Path) -> None:
+    """Reads the file into the page cache, so the encoder reads it from memory instead of from a slow disk."""
+    buffer = bytearray(READ_AHEAD_CHUNK_SIZE)
+    with open(file_name, "rb", buffering=0) as file:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while file.readinto(buffer):
+            pass
@@ -0,0 +1,332 @@
+"""
+Conversion plans: the probing and classification of a run, written to a JSON Lines file so it can be inspected and
+executed later, possibly split over several machines or processes with --shard. The first line of a plan is a header
+with the device profile the plan was made for, so it is executed for the same device.
+"""
+
+import json
+import zlib
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from audio_conversion_tools import journal
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE, PCM16_PROFILE
+from audio_conversion_tools.convert_audio import (
+    BIT_DEPTHS,
+    DEFAULT_BACKEND,
+    FfmpegBatcher,
+    check_bit_depth_allowed,
+    check_sample_rate_allowed,
+    convert_aif_to_16bit,
+    convert_aif_to_mp3_v0,
+    convert_to_aiff,
+    determine_target_sample_rate,
+    probe_file,
+    worker_threads,
+)
+from audio_conversion_tools.engine import ConversionSummary, run_jobs
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.probe_cache import ProbeCache
+from audio_conversion_tools.rekordbox.classify import CollectionClassification, classify_tracks
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.convert_audio import convert_files, convert_flacs
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+from audio_conversion_tools.utils import find_files
+
+# Actions of the rekordbox flow, which archive the original, and of the folder CLIs.
+REKORDBOX_CONVERT = "rekordbox_convert"
+REKORDBOX_FLAC = "rekordbox_flac"
+AIFF_TO_16BIT = "aiff_to_16bit"
+LOSSLESS_TO_AIFF = "lossless_to_aiff"
+LOSSLESS_TO_V0 = "lossless_to_v0"
+
+FOLDER_ACTIONS = [AIFF_TO_16BIT, LOSSLESS_TO_AIFF, LOSSLESS_TO_V0]
+
+# Extensions of the input files and the output format of every folder action.
+_FOLDER_TARGETS = {
+    AIFF_TO_16BIT: ([".aif", ".aiff"], "aiff"),
+    LOSSLESS_TO_AIFF: ([".wav", ".flac"], "aiff"),
+    LOSSLESS_TO_V0: ([".aif", ".aiff", ".wav", ".flac"], "mp3"),
+}
+
+# Rough ffmpeg throughput in seconds of audio per second, used to estimate the cost of a conversion.
+_REALTIME_FACTORS = {"aiff": 300.0, "wav": 300.0, "mp3": 60.0}
+# Average bit rate of a V0 mp3 in bits per second.
+_V0_BIT_RATE = 245_000
+# Size of the header of an uncompressed output file.
+_HEADER_BYTES = 54
+
+
+@dataclass
+class PlanHeader:
+    profile: str
+
+
+@dataclass
+class PlanEntry:
+    source: str
+    action: str
+    output: str
+    target_format: str
+    target_sample_rate: int | None
+    source_sample_rate: int
+    source_bit_depth: int | None
+    estimated_output_bytes: int
+    estimated_cost_seconds: float
+    archive_folder: str | None = None
+
+
+def write_plan(entries: Iterable[PlanEntry], plan_location: str | Path, header: PlanHeader | None = None) -> int:
+    num_entries = 0
+    with open(plan_location, "w") as plan_file:
+        if header is not None:
+            plan_file.write(json.dumps({"header": asdict(header)}) + "\n")
+        for entry in entries:
+            plan_file.write(json.dumps(asdict(entry)) + "\n")
+            num_entries += 1
+    return num_entries
+
+
+def read_plan(plan_location: str | Path) -> Iterator[PlanEntry]:
+    with open(plan_location) as plan_file:
+        for line in plan_file:
+            if line.strip():
+                record = json.loads(line)
+                if "header" not in record:
+                    yield PlanEntry(**record)
+
+
+def read_plan_header(plan_location: str | Path) -> PlanHeader | None:
+    """The header of the plan, or None for plans written without one."""
+    with open(plan_location) as plan_file:
+        for line in plan_file:
+            if line.strip():
+                record = json.loads(line)
+                return PlanHeader(**record["header"]) if "header" in record else None
+    return None
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parses a shard like 0/4 into (index, number of shards), shards are numbered from 0."""
+    try:
+        index, num_shards = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard should look like i/N, got {shard}") from None
+
+    if not 0 <= index < num_shards:
+        raise ValueError(f"Shard index should be between 0 and {num_shards - 1}, got {index}")
+    return index, num_shards
+
+
+def in_shard(entry: PlanEntry, index: int, num_shards: int) -> bool:
+    # A hash of the path instead of the position in the plan, so a file stays in the same shard when the plan changes.
+    return zlib.crc32(_shard_key(entry).encode()) % num_shards == index
+
+
+def _shard_key(entry: PlanEntry) -> str:
+    # Rekordbox originals are archived by file name only, so /A/x.wav and /B/x.wav claim the same archive location.
+    # They go to the same shard, where the archive lock makes sure only one of them is archived.
+    if entry.action == REKORDBOX_CONVERT:
+        return f"{entry.archive_folder}/{Path(entry.source).name}"
+    if entry.action == REKORDBOX_FLAC:
+        return entry.output
+    return entry.source
+
+
+def plan_rekordbox(
+    tracks: Iterable,
+    archive_folder: str | Path,
+    cache: ProbeCache | None = None,
+    profile: str = DEFAULT_PROFILE,
+) -> Iterator[PlanEntry]:
+    """Plans the conversion of the tracks and FLACs in a Rekordbox collection that are unplayable on the device."""
+    archive_folder = Path(archive_folder)
+    ledger = ConversionLedger(archive_folder)
+    classification = CollectionClassification(profile=profile)
+
+    for track in classify_tracks(tracks, classification):
+        source = Path(f"/{track.Location}").absolute()
+        if source in ledger:
+            continue
+        target_format = "wav" if track.Kind.lower()[:3] == "wav" else "aiff"
+        entry = _plan_entry(
+            source, REKORDBOX_CONVERT, source, target_format, cache, profile, archive_folder=archive_folder
+        )
+        if entry is not None:
+            yield entry
+
+    classification.log()
+
+    for track in classification.flac_files:
+        source = Path(f"/{track.Location}").absolute()
+        output = archive_folder / "converted_flacs" / source.with_suffix(".aiff").name
+        entry = _plan_entry(source, REKORDBOX_FLAC, output, "aiff", cache, profile, archive_folder=archive_folder)
+        if entry is not None:
+            yield entry
+
+
+def plan_folder(
+    root_directory: str | Path,
+    action: str,
+    recursive: bool = False,
+    cache: ProbeCache | None = None,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+    profile: str = PCM16_PROFILE,
+) -> Iterator[PlanEntry]:
+    """Plans the conversion of a folder, like the convert-aiff-to-16bit / convert-lossless-to-* CLIs would do it."""
+    if action not in _FOLDER_TARGETS:
+        raise ValueError(f"Unknown action {action}, should be one of {FOLDER_ACTIONS}")
+    extensions, target_format = _FOLDER_TARGETS[action]
+
+    for file_name in find_files(
+        root_directory, extensions=extensions, recursive=recursive, include=include, exclude=exclude
+    ):
+        source = Path(file_name).absolute()
+        output = source if action == AIFF_TO_16BIT else source.with_suffix(f".{target_format}")
+        entry = _plan_entry(source, action, output, target_format, cache, profile)
+        if entry is None:
+            continue
+        if (
+            action == AIFF_TO_16BIT
+            and check_bit_depth_allowed(entry.source_bit_depth, profile)
+            and check_sample_rate_allowed(entry.source_sample_rate, profile)
+        ):
+            continue
+        yield entry
+
+
+def execute_plan(
+    entries: Iterable[PlanEntry],
+    jobs: int | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    delete_originals: bool = False,
+    batcher: FfmpegBatcher | None = None,
+    profile: str | None = None,
+) -> ConversionSummary:
+    """
+    Executes the entries of a plan for the device profile in its header. Rekordbox entries go through the rekordbox
+    flow, so originals are archived, logged in converted.csv and every step is recorded in the journal of the archive
+    folder. With delete_originals the originals of folder entries are deleted after conversion. Without a profile
+    the defaults of the rekordbox flow and the folder CLIs are used.
+    """
+    rekordbox_entries: dict[tuple[str, str], list[TrackRecord]] = defaultdict(list)
+    folder_entries = []
+    for entry in entries:
+        if entry.action in (REKORDBOX_CONVERT, REKORDBOX_FLAC):
+            kind = {"wav": "WAV File", "aiff": "AIFF File"}[entry.target_format]
+            if entry.action == REKORDBOX_FLAC:
+                kind = "FLAC File"
+            track = TrackRecord(
+                Location=entry.source.lstrip("/"),
+                Kind=kind,
+                SampleRate=entry.source_sample_rate,
+                BitRate=0,
+                BitDepth=entry.source_bit_depth,
+            )
+            rekordbox_entries[(entry.action, entry.archive_folder)].append(track)
+        else:
+            folder_entries.append(entry)
+
+    rekordbox_profile = profile or DEFAULT_PROFILE
+    for (action, archive_folder), tracks in rekordbox_entries.items():
+        (Path(archive_folder) / "converted_flacs").mkdir(exist_ok=True, parents=True)
+        options = {"jobs": jobs, "backend": backend, "cache": cache, "batcher": batcher, "profile": rekordbox_profile}
+        if action == REKORDBOX_CONVERT:
+            with journal.open_journal(archive_folder) as conversion_journal:
+                if journal.unfinished(conversion_journal.location):
+                    logger.warning(
+                        f"An earlier run crashed while converting into {archive_folder}, run"
+                        " rekordbox-convert-unplayable-files with --resume to finish or roll back its conversions."
+                    )
+                convert_files(tracks, Path(archive_folder), conversion_journal=conversion_journal, **options)
+        else:
+            convert_flacs(tracks, Path(archive_folder), **options)
+
+    folder_profile = profile or PCM16_PROFILE
+    summary = run_jobs(
+        lambda entry: _execute_folder_entry(entry, backend, cache, delete_originals, batcher, folder_profile),
+        folder_entries,
+        jobs=worker_threads(jobs, batcher),
+    )
+    if folder_entries:
+        summary.log()
+    return summary
+
+
+def _execute_folder_entry(
+    entry: PlanEntry,
+    backend: str,
+    cache: ProbeCache | None,
+    delete_originals: bool,
+    batcher: FfmpegBatcher | None,
+    profile: str,
+) -> bool:
+    options = {"backend": backend, "cache": cache, "batcher": batcher, "profile": profile}
+    if entry.action == AIFF_TO_16BIT:
+        temp_location = entry.source.rsplit(".", 1)[0] + "_temp.aiff"
+        if not convert_aif_to_16bit(entry.source, temp_location, **options):
+            return False
+        to_delete = temp_location
+    elif entry.action == LOSSLESS_TO_AIFF:
+        if not convert_to_aiff(entry.source, entry.output, **options):
+            return False
+        to_delete = entry.source
+    elif entry.action == LOSSLESS_TO_V0:
+        if not convert_aif_to_mp3_v0(entry.source, batcher=batcher):
+            return False
+        to_delete = entry.source
+    else:
+        raise ValueError(f"Unknown action {entry.action}")
+
+    if delete_originals:
+        Path(to_delete).unlink()
+        logger.info(f"Deleted {to_delete}")
+    return True
+
+
+def _plan_entry(
+    source: Path,
+    action: str,
+    output: Path,
+    target_format: str,
+    cache: ProbeCache | None,
+    profile: str,
+    archive_folder: Path | None = None,
+) -> PlanEntry | None:
+    try:
+        info = probe_file(str(source), cache=cache)
+    except Exception as e:
+        logger.error(f"Could not get file info for {source}, leaving it out of the plan: {e}")
+        return None
+
+    duration = info.frames / info.samplerate
+    source_bit_depth = BIT_DEPTHS.get(info.subtype)
+
+    if target_format == "mp3":
+        target_sample_rate = None
+        estimated_output_bytes = int(duration * _V0_BIT_RATE / 8)
+    else:
+        try:
+            target_sample_rate = determine_target_sample_rate(info.samplerate, profile)
+        except ValueError as e:
+            logger.error(f"Could not determine target sample rate for {source}, leaving it out of the plan: {e}")
+            return None
+        output_frames = -(-info.frames * target_sample_rate // info.samplerate)
+        estimated_output_bytes = output_frames * info.channels * 2 + _HEADER_BYTES
+
+    return PlanEntry(
+        source=str(source),
+        action=action,
+        output=str(output),
+        target_format=target_format,
+        target_sample_rate=target_sample_rate,
+        source_sample_rate=info.samplerate,
+        source_bit_depth=source_bit_depth,
+        estimated_output_bytes=estimated_output_bytes,
+        estimated_cost_seconds=round(duration / _REALTIME_FACTORS[target_format], 3),
+        archive_folder=None if archive_folder is None else str(archive_folder),
+    )
@@ -0,0 +1,162 @@
+import contextlib
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+DEFAULT_CACHE_LOCATION = Path(
+    os.environ.get(
+        "AUDIO_CONVERSION_TOOLS_PROBE_CACHE",
+        Path.home() / ".cache" / "audio_conversion_tools" / "probe_cache.sqlite",
+    )
+)
+DEFAULT_MAX_ENTRIES = 500_000
+
+# Seconds to wait for another process that is writing to the cache.
+_BUSY_TIMEOUT = 30
+# Cache hits only update the LRU order in memory, they are written in batches so reading the cache never holds the
+# write lock. A crash only loses the order of the last batch.
+_WRITE_USED_EVERY = 500
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    samplerate: int
+    subtype: str
+    channels: int
+    frames: int
+
+
+class ProbeCache:
+    """
+    On-disk cache of file probes, keyed by path and invalidated when the size or modification time of a file changes.
+
+    The cache holds at most max_entries probes, the least recently used ones are evicted first. It can be shared
+    between threads.
+    """
+
+    def __init__(self, location: str | Path = DEFAULT_CACHE_LOCATION, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.location = Path(location)
+        self.max_entries = max_entries
+        self.location.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.location, timeout=_BUSY_TIMEOUT, check_same_thread=False)
+        # With a write ahead log other processes, like a second CLI or a ConversionSession, can read while we write,
+        # and every write is a short transaction of its own.
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS probes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                samplerate INTEGER NOT NULL,
+                subtype TEXT NOT NULL,
+                channels INTEGER NOT NULL,
+                frames INTEGER NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used)")
+        self._connection.commit()
+        (self._num_entries,) = self._connection.execute("SELECT COUNT(*) FROM probes").fetchone()
+        # Last used ticks of the cache hits that are not written yet.
+        self._used: dict[str, int] = {}
+        # Logical clock for the LRU order, continues where the previous run left off.
+        (last_used,) = self._connection.execute("SELECT MAX(last_used) FROM probes").fetchone()
+        self._clock = last_used or 0
+
+    def get(self, path: str | Path, stat: os.stat_result | None = None) -> ProbeResult | None:
+        """Returns the cached probe of path, or None if it is not cached or the file changed since it was probed."""
+        stat = stat or os.stat(path)
+        key = str(Path(path).absolute())
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, samplerate, subtype, channels, frames FROM probes WHERE path = ?",
+                (key,),
+            ).fetchone()
+            if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+                return None
+
+            self._used[key] = self._tick()
+            if len(self._used) >= _WRITE_USED_EVERY:
+                with self._connection:
+                    self._write_used()
+        return ProbeResult(*row[2:])
+
+    def put(self, path: str | Path, result: ProbeResult, stat: os.stat_result | None = None) -> None:
+        stat = stat or os.stat(path)
+        key = str(Path(path).absolute())
+
+        with self._lock, self._connection:
+            self._write_used()
+            cursor = self._connection.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    result.samplerate,
+                    result.subtype,
+                    result.channels,
+                    result.frames,
+                    self._tick(),
+                ),
+            )
+            self._num_entries += cursor.rowcount
+            if self._num_entries > self.max_entries:
+                self._evict()
+
+    def close(self) -> None:
+        with self._lock:
+            with self._connection:
+                self._write_used()
+            self._connection.close()
+
+    def __enter__(self) -> "ProbeCache":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def _evict(self) -> None:
+        # Replaced entries are counted as inserts, so we recount before evicting anything.
+        (self._num_entries,) = self._connection.execute("SELECT COUNT(*) FROM probes").fetchone()
+        if self._num_entries <= self.max_entries:
+            return
+
+        # Evict a tenth of the entries at once, so we don't have to evict on every insert once the cache is full.
+        num_to_evict = self._num_entries - int(0.9 * self.max_entries)
+        self._connection.execute(
+            "DELETE FROM probes WHERE path IN (SELECT path FROM probes ORDER BY last_used LIMIT ?)",
+            (num_to_evict,),
+        )
+        (self._num_entries,) = self._connection.execute("SELECT COUNT(*) FROM probes").fetchone()
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def _write_used(self) -> None:
+        if self._used:
+            self._connection.executemany(
+                "UPDATE probes SET last_used = ? WHERE path = ?", [(tick, key) for key, tick in self._used.items()]
+            )
+            self._used.clear()
+
+
+@contextlib.contextmanager
+def open_probe_cache(enabled: bool = True) -> Iterator[ProbeCache | None]:
+    """Opens the default probe cache, or yields None if caching is disabled."""
+    if not enabled:
+        yield None
+        return
+
+    with ProbeCache() as cache:
+        yield cache
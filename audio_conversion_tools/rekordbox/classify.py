@@ -0,0 +1,73 @@
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+from audio_conversion_tools import metrics
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.rekordbox.track_table import TrackTable
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+
+# Tracks are classified in chunks, so conversions can start before the whole collection is read. A chunk is also
+# classified when reading it takes longer than DEFAULT_MAX_WAIT seconds, so a slow reader does not hold back the
+# first conversions.
+DEFAULT_CHUNK_SIZE = 1_000
+DEFAULT_MAX_WAIT = 0.5
+
+
+@dataclass
+class CollectionClassification:
+    """
+    Buckets and counts of a Rekordbox collection, filled while the tracks are being read. Which tracks are unplayable
+    depends on the device profile.
+    """
+
+    profile: str = DEFAULT_PROFILE
+    num_tracks: int = 0
+    num_lossless: int = 0
+    unplayable_files: list[TrackRecord] = field(default_factory=list)
+    flac_files: list[TrackRecord] = field(default_factory=list)
+
+    def add(self, table: TrackTable) -> list[TrackRecord]:
+        """Adds a chunk of the collection, returns its unplayable tracks."""
+        with metrics.timer("classify"):
+            unplayable_files = table.records(table.unplayable_mask)
+            flac_files = table.records(table.flac_mask)
+
+        self.num_tracks += len(table)
+        self.num_lossless += int(table.lossless_mask.sum())
+        self.unplayable_files.extend(unplayable_files)
+        self.flac_files.extend(flac_files)
+        return unplayable_files
+
+    def log(self) -> None:
+        logger.info(
+            f"Read Rekordbox collection, found {self.num_tracks} tracks in total of which {self.num_lossless} WAV / AIFF",
+        )
+        percentage_unplayable = (len(self.unplayable_files) / max(self.num_lossless, 1)) * 100
+        logger.info(f"Found {len(self.unplayable_files)} ({percentage_unplayable:.1f}%) unplayable WAV / AIFFs")
+
+
+def classify_tracks(
+    tracks: Iterable,
+    classification: CollectionClassification,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_wait: float = DEFAULT_MAX_WAIT,
+) -> Iterator[TrackRecord]:
+    """
+    Sorts the tracks into the convert, FLAC and skip buckets in a single pass.
+
+    The tracks are classified vectorized in chunks of at most chunk_size tracks, or of the tracks read in max_wait
+    seconds, and the unplayable WAV / AIFF tracks of a chunk are yielded as soon as it is classified, so conversions
+    can start while the rest of the collection is still being read.
+    """
+    chunk: list = []
+    chunk_start = time.monotonic()
+    for track in tracks:
+        chunk.append(track)
+        if len(chunk) >= chunk_size or time.monotonic() - chunk_start >= max_wait:
+            yield from classification.add(TrackTable.from_tracks(chunk, classification.profile))
+            chunk = []
+            chunk_start = time.monotonic()
+    if chunk:
+        yield from classification.add(TrackTable.from_tracks(chunk, classification.profile))
@@ -1,4 +1,6 @@
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE, PROFILES
+
 FILE_TYPES_TO_CONVERT = ["wav", "aif"]
-ALLOWED_SAMPLE_RATES = [44100, 48000]
+ALLOWED_SAMPLE_RATES = list(PROFILES[DEFAULT_PROFILE].sample_rates)
 ALLOWED_BIT_RATES = [1411, 1536, 2304]
-ALLOWED_BIT_DEPTHS = [16, 24]
+ALLOWED_BIT_DEPTHS = list(PROFILES[DEFAULT_PROFILE].bit_depths)
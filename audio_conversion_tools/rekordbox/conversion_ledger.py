@@ -0,0 +1,106 @@
+import csv
+import datetime
+import threading
+from pathlib import Path
+
+from loguru import logger
+
+from audio_conversion_tools import metrics
+
+CONVERTED_CSV_NAME = "converted.csv"
+REVERTED_CSV_NAME = "reverted.csv"
+
+_REVERTED_LOG_LOCK = threading.Lock()
+
+
+class ConversionLedger:
+    """
+    Index of the tracks converted into an archive folder, backed by converted.csv.
+
+    converted.csv is read once into a hash index, so tracks that were converted in an earlier run can be skipped
+    without touching the file system. Tracks restored by rekordbox-revert-conversion are logged in reverted.csv and
+    are no longer considered converted. The conversions can be read from another CSV than the converted.csv of the
+    archive folder, like a copy of it.
+    """
+
+    def __init__(self, archive_folder: str | Path, converted_csv_path: str | Path | None = None):
+        self.archive_folder = Path(archive_folder)
+        self.converted_csv_path = Path(converted_csv_path or self.archive_folder / CONVERTED_CSV_NAME)
+        self._lock = threading.Lock()
+        self._converted: dict[str, datetime.datetime] = {}
+        # Archive location of the latest conversion of every track.
+        self._archive_locations: dict[str, str] = {}
+
+        for converted_at, row in _read_rows(self.converted_csv_path):
+            self._converted[row[1]] = converted_at
+            self._archive_locations[row[1]] = row[2]
+
+        for reverted_at, row in _read_rows(self.archive_folder / REVERTED_CSV_NAME):
+            converted_at = self._converted.get(row[1])
+            if converted_at is not None and reverted_at >= converted_at:
+                del self._converted[row[1]]
+
+    def __contains__(self, file_location: str | Path) -> bool:
+        return str(file_location) in self._converted
+
+    def __len__(self) -> int:
+        return len(self._converted)
+
+    def archive_locations(self) -> dict[str, str]:
+        """The archive location of the original of every converted track, by the location of the track."""
+        return {file_location: self._archive_locations[file_location] for file_location in self._converted}
+
+    def add(
+        self,
+        file_location,
+        location_within_archive_folder,
+        input_sample_rate,
+        input_bit_depth,
+        output_sample_rate,
+        output_bit_depth,
+    ) -> None:
+        current_time = datetime.datetime.now()
+
+        with metrics.timer("ledger"), self._lock, open(self.converted_csv_path, "a", newline="") as f:
+            csv.writer(f).writerow(
+                [
+                    current_time,
+                    file_location,
+                    location_within_archive_folder,
+                    input_sample_rate,
+                    output_sample_rate,
+                    input_bit_depth,
+                    output_bit_depth,
+                ]
+            )
+            self._converted[str(file_location)] = current_time
+            self._archive_locations[str(file_location)] = str(location_within_archive_folder)
+
+    def revert(self, file_location: str | Path) -> None:
+        """Logs in reverted.csv that the original of the track is back in place, so it is no longer converted."""
+        with self._lock:
+            archive_location = self._archive_locations.get(str(file_location), "")
+            add_to_reverted_log(self.archive_folder, str(file_location), archive_location)
+            self._converted.pop(str(file_location), None)
+
+
+def add_to_reverted_log(archive_folder: str | Path, file_location: str, location_within_archive_folder: str) -> None:
+    with _REVERTED_LOG_LOCK, open(Path(archive_folder) / REVERTED_CSV_NAME, "a", newline="") as f:
+        csv.writer(f).writerow([datetime.datetime.now(), file_location, location_within_archive_folder])
+
+
+def _read_rows(csv_path: Path) -> list[tuple[datetime.datetime, list[str]]]:
+    """Reads the rows of a log with the time they were written, rows that can't be parsed are skipped."""
+    if not csv_path.exists():
+        return []
+
+    rows = []
+    with open(csv_path, newline="") as csvfile:
+        for line_number, row in enumerate(csv.reader(csvfile), start=1):
+            try:
+                if len(row) < 3:
+                    raise ValueError(f"expected at least 3 columns, got {len(row)}")
+                rows.append((datetime.datetime.fromisoformat(row[0]), row))
+            except ValueError as e:
+                logger.warning(f"Skipped malformed row {line_number} of {csv_path}: {e}")
+    return rows
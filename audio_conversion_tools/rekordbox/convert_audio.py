@@ -1,119 +1,677 @@
-import datetime
-import shutil
+import contextlib
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
 from loguru import logger
 from pyrekordbox import xml
 
+from audio_conversion_tools import journal, metrics
+from audio_conversion_tools.archive import copy_file, move_file
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE
 from audio_conversion_tools.convert_audio import (
+    DEFAULT_BACKEND,
+    FfmpegBatcher,
+    check_bit_depth_allowed,
+    check_sample_rate_allowed,
     convert_aif_to_16bit,
     convert_to_aiff,
     convert_wav_to_16bit,
     determine_target_sample_rate,
+    encode_16bit,
+    estimate_16bit_size,
     get_file_info,
+    worker_threads,
 )
+from audio_conversion_tools.dedup import ContentClaim, ContentIndex, same_content
+from audio_conversion_tools.engine import default_jobs, run_jobs
+from audio_conversion_tools.pipeline import PipelineConfig, Stage, process_pool, read_ahead, run_pipeline
+from audio_conversion_tools.probe_cache import ProbeCache
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.scratch import ScratchFolder, stage_in, write_back
 
 
 class ConversionError(Exception): ...
 
 
-def convert_files(unplayable_files: list[xml.Track], archive_folder: Path):
+# Details of a planned conversion in the journal that end up in converted.csv.
+_LEDGER_FIELDS = [
+    "location_within_archive_folder",
+    "input_sample_rate",
+    "input_bit_depth",
+    "output_sample_rate",
+    "output_bit_depth",
+]
+
+# Guards the set of archive locations claimed by conversions that are still running.
+_ARCHIVE_LOCK = threading.Lock()
+
+
+def convert_files(
+    unplayable_files: Iterable[xml.Track],
+    archive_folder: Path,
+    jobs: int | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    conversion_journal: journal.ConversionJournal | None = None,
+    dedup: bool = True,
+    pipeline: PipelineConfig | None = None,
+    scratch: ScratchFolder | None = None,
+    profile: str = DEFAULT_PROFILE,
+):
     """
-    Converts the files from samplerate s to samplerate s/2 and the bitrate to 16 bit.
+    Converts the files from samplerate s to samplerate s/2 and the bitrate to 16 bit. Files that are already in the
+    conversion ledger of the archive folder are skipped. With dedup files with the same content are converted once,
+    the other files get a copy of the result. With a pipeline config, archiving, encoding and writing back run in
+    separate stages, see _ConversionPipeline.
 
     Args:
-        unplayable_files (List[xml.Track]): list of unplayable tracks
+        unplayable_files (Iterable[xml.Track]): unplayable tracks
         archive_folder (Path): folder to move the archive tracks to
+        jobs (int | None): number of conversions to run in parallel, defaults to the number of CPUs
+        backend (str): conversion backend, "ffmpeg" or "numpy"
+        cache (ProbeCache | None): cache for the file probes
+        batcher (FfmpegBatcher | None): runs the ffmpeg conversions in batches if given
+        conversion_journal (ConversionJournal | None): journal to record the steps of every conversion in
+        dedup (bool): convert files with the same content only once
+        pipeline (PipelineConfig | None): run the conversions as a pipeline with these settings
+        scratch (ScratchFolder | None): local folder to copy the files to and convert them in
+        profile (str): device profile, decides which files are playable and the sample rate they are converted to
     """
-    succesful_conversions = 0
-    for file in unplayable_files:
-        file_location = Path(f"/{file.Location}").absolute()
+    reserved_archive_locations: set[Path] = set()
+    content_index = ContentIndex() if dedup else None
+    ledger = ConversionLedger(archive_folder)
+    num_already_converted = 0
 
-        if not file_location.exists():
-            logger.error(f"No file available at {file_location}, skipping conversion!")
-            continue
+    def not_yet_converted(files: Iterable[xml.Track]) -> Iterator[xml.Track]:
+        nonlocal num_already_converted
+        for file in files:
+            if _file_location(file) in ledger:
+                num_already_converted += 1
+            else:
+                yield file
+
+    if pipeline is None:
+        summary = run_jobs(
+            lambda file: _convert_file(
+                file,
+                archive_folder,
+                reserved_archive_locations,
+                ledger,
+                backend,
+                cache,
+                batcher,
+                conversion_journal,
+                content_index,
+                scratch,
+                profile,
+            ),
+            not_yet_converted(unplayable_files),
+            jobs=worker_threads(jobs, batcher),
+        )
+    else:
+        encoders = worker_threads(jobs, batcher) or default_jobs()
+        with contextlib.ExitStack() as stack:
+            # Without a scratch folder the originals are only read ahead, and encoded in the temporary folder of the
+            # system, often a tmpfs.
+            stage_inputs = scratch is not None
+            if scratch is None:
+                temporary_folder = stack.enter_context(tempfile.TemporaryDirectory(prefix="rekordbox-conversion-"))
+                scratch = ScratchFolder(temporary_folder, pipeline.scratch_budget)
+            # ffmpeg runs in its own processes already, the numpy backend needs processes to encode in parallel.
+            encoder_pool = stack.enter_context(process_pool(encoders)) if backend == "numpy" else None
+
+            conversion_pipeline = _ConversionPipeline(
+                archive_folder=archive_folder,
+                scratch=scratch,
+                stage_inputs=stage_inputs,
+                reserved_archive_locations=reserved_archive_locations,
+                ledger=ledger,
+                backend=backend,
+                cache=cache,
+                batcher=batcher,
+                conversion_journal=conversion_journal,
+                content_index=content_index,
+                encoder_pool=encoder_pool,
+                profile=profile,
+            )
+            summary = run_pipeline(
+                not_yet_converted(unplayable_files),
+                conversion_pipeline.stages(pipeline, encoders),
+            )
+    if num_already_converted:
+        logger.info(f"Skipped {num_already_converted} files which were converted in an earlier run")
+    summary.log()
+
+
+def _convert_file(
+    file: xml.Track,
+    archive_folder: Path,
+    reserved_archive_locations: set[Path],
+    ledger: ConversionLedger,
+    backend: str,
+    cache: ProbeCache | None,
+    batcher: FfmpegBatcher | None,
+    conversion_journal: journal.ConversionJournal | None = None,
+    content_index: ContentIndex | None = None,
+    scratch: ScratchFolder | None = None,
+    profile: str = DEFAULT_PROFILE,
+) -> bool:
+    file_location = _file_location(file)
 
-        input_sample_rate, input_bit_depth = get_file_info(file_location)
+    if not file_location.exists():
+        logger.error(f"No file available at {file_location}, skipping conversion!")
+        return False
 
-        output_bit_depth = 16
-        output_sample_rate = determine_target_sample_rate(input_sample_rate)
+    input_sample_rate, input_bit_depth = get_file_info(file_location, cache=cache)
+    if input_sample_rate is None:
+        logger.error(f"Couldn't determine sample rate for {file_location}")
+        return False
 
-        location_within_archive_folder = archive_folder / Path(file.Location).name
+    output_bit_depth = 16
+    output_sample_rate = determine_target_sample_rate(input_sample_rate, profile)
 
-        if location_within_archive_folder.exists():
-            logger.error(
-                f"File {Path(file_location).name} already exists in the archive, will not overwrite the archive. "
-                "Clear your archive manually if you want to confirm this file.",
+    location_within_archive_folder = archive_folder / Path(file.Location).name
+    if not _reserve_archive_location(location_within_archive_folder, reserved_archive_locations):
+        return False
+
+    conversion = {
+        "location_within_archive_folder": location_within_archive_folder,
+        "input_sample_rate": input_sample_rate,
+        "input_bit_depth": input_bit_depth,
+        "output_sample_rate": output_sample_rate,
+        "output_bit_depth": output_bit_depth,
+    }
+    if conversion_journal is not None:
+        # Has to be on disk before the original is moved, otherwise a crash could leave it in the archive unnoticed.
+        conversion_journal.record(journal.PLANNED, file_location, durable=True, **conversion)
+
+    def convert() -> bool:
+        if file.Kind.lower()[:3] == "wav":
+            return convert_wav_to_16bit(
+                file_name=file_location,
+                temp_location=location_within_archive_folder,
+                backend=backend,
+                cache=cache,
+                batcher=batcher,
+                conversion_journal=conversion_journal,
+                scratch=scratch,
+                profile=profile,
             )
-            continue
+        if file.Kind.lower()[:3] == "aif":
+            return convert_aif_to_16bit(
+                file_name=file_location,
+                temp_location=location_within_archive_folder,
+                backend=backend,
+                cache=cache,
+                batcher=batcher,
+                conversion_journal=conversion_journal,
+                scratch=scratch,
+                profile=profile,
+            )
+        return False
+
+    succesful_conversion = False
+    try:
+        if content_index is None:
+            succesful_conversion = convert()
+        else:
+            succesful_conversion = _convert_once(
+                file_location, location_within_archive_folder, content_index, convert, conversion_journal
+            )
+        # Encoded is on disk by now, so --resume never rolls back a conversion that is in the ledger.
+        if succesful_conversion:
+            ledger.add(file_location=file_location, **conversion)
+    except ConversionError:
+        logger.info(f"Error converting file {file.Location}")
 
+    if conversion_journal is not None:
+        conversion_journal.record(journal.COMMITTED if succesful_conversion else journal.ROLLED_BACK, file_location)
+    return succesful_conversion
+
+
+def _convert_once(
+    file_location: Path,
+    location_within_archive_folder: Path,
+    content_index: ContentIndex,
+    convert: Callable[[], bool],
+    conversion_journal: journal.ConversionJournal | None,
+) -> bool:
+    """Converts the file, unless a file with the same content was converted already, then its result is cloned."""
+    claim, first = content_index.claim(file_location)
+    if first:
         succesful_conversion = False
         try:
-            if file.Kind.lower()[:3] == "wav":
-                succesful_conversion = convert_wav_to_16bit(
-                    file_name=file_location,
-                    temp_location=location_within_archive_folder,
-                )
-            if file.Kind.lower()[:3] == "aif":
-                succesful_conversion = convert_aif_to_16bit(
-                    file_name=file_location,
-                    temp_location=location_within_archive_folder,
-                )
+            succesful_conversion = convert()
+        finally:
             if succesful_conversion:
-                add_to_conversion_db(
-                    archive_folder,
+                claim.finish(file_location, content_location=location_within_archive_folder)
+            else:
+                claim.finish(None)
+        return succesful_conversion
+
+    output, content_location = claim.wait()
+    if output is None or not same_content(file_location, content_location):
+        return convert()
+    return _clone_conversion(file_location, location_within_archive_folder, output, conversion_journal)
+
+
+def _clone_conversion(
+    file_location: Path,
+    location_within_archive_folder: Path,
+    output: Path,
+    conversion_journal: journal.ConversionJournal | None,
+) -> bool:
+    """Archives the original and copies the conversion of a file with the same content in its place."""
+    # The original is archived like any other conversion, only the conversion itself is replaced by a copy.
+    move_file(file_location, location_within_archive_folder)
+    _record(conversion_journal, journal.ARCHIVED, file_location)
+    try:
+        _record(conversion_journal, journal.ENCODING, file_location)
+        method = copy_file(output, file_location)
+        _record(conversion_journal, journal.ENCODED, file_location, durable=True)
+    except OSError as e:
+        Path(file_location).unlink(missing_ok=True)
+        move_file(location_within_archive_folder, file_location)
+        _record(conversion_journal, journal.ROLLED_BACK, file_location)
+        logger.error(f"Failed to copy the conversion of {output} to {file_location}: {e}")
+        return False
+
+    metrics.count("deduplicated")
+    logger.info(f"Copied the conversion of {output} to {file_location}, which has the same content ({method})")
+    return True
+
+
+def _reserve_archive_location(location_within_archive_folder: Path, reserved_archive_locations: set[Path]) -> bool:
+    # Two tracks with the same file name could be converted at the same time, so we claim the archive location
+    # before moving anything into it.
+    with _ARCHIVE_LOCK:
+        archive_location_taken = (
+            location_within_archive_folder in reserved_archive_locations or location_within_archive_folder.exists()
+        )
+        if not archive_location_taken:
+            reserved_archive_locations.add(location_within_archive_folder)
+
+    if archive_location_taken:
+        logger.error(
+            f"File {location_within_archive_folder.name} already exists in the archive, will not overwrite the archive. "
+            "Clear your archive manually if you want to confirm this file.",
+        )
+    return not archive_location_taken
+
+
+@dataclass
+class _StagedConversion:
+    file_location: Path
+    location_within_archive_folder: Path
+    conversion: dict
+    claim: ContentClaim | None = None
+    workspace: Path | None = None
+    scratch_bytes: int = 0
+    encoder_input: Path | None = None
+    encoder_output: Path | None = None
+
+
+class _ConversionPipeline:
+    """
+    The conversion of _convert_file in three stages. Archiving moves the original into the archive and reads it
+    ahead into the page cache, or copies it to the scratch folder with stage_inputs. Encoding writes the conversion to
+    the scratch folder and writing back copies it next to the original location and renames it into place. Archiving
+    and writing back are I/O and run in their own threads, so a slow library disk is busy while the CPUs encode. The
+    scratch space of the files in flight is limited by the budget of the scratch folder.
+    """
+
+    def __init__(
+        self,
+        archive_folder: Path,
+        scratch: ScratchFolder,
+        stage_inputs: bool,
+        reserved_archive_locations: set[Path],
+        ledger: ConversionLedger,
+        backend: str,
+        cache: ProbeCache | None,
+        batcher: FfmpegBatcher | None,
+        conversion_journal: journal.ConversionJournal | None,
+        content_index: ContentIndex | None,
+        encoder_pool: ProcessPoolExecutor | None,
+        profile: str = DEFAULT_PROFILE,
+    ):
+        self.archive_folder = archive_folder
+        self.scratch = scratch
+        self.stage_inputs = stage_inputs
+        self.reserved_archive_locations = reserved_archive_locations
+        self.ledger = ledger
+        self.backend = backend
+        self.cache = cache
+        self.batcher = batcher
+        self.conversion_journal = conversion_journal
+        self.content_index = content_index
+        self.encoder_pool = encoder_pool
+        self.profile = profile
+
+    def stages(self, config: PipelineConfig, encoders: int) -> list[Stage]:
+        return [
+            Stage("archive", self.archive, workers=config.io_jobs, queue_size=config.queue_size),
+            Stage("encode", self.encode, workers=encoders, queue_size=config.queue_size),
+            Stage("write_back", self.write_back, workers=config.io_jobs, queue_size=config.queue_size),
+        ]
+
+    def archive(self, file: xml.Track) -> _StagedConversion | bool:
+        file_location = _file_location(file)
+        if not file_location.exists():
+            logger.error(f"No file available at {file_location}, skipping conversion!")
+            return False
+        if file.Kind.lower()[:3] not in ["wav", "aif"]:
+            return False
+
+        input_sample_rate, input_bit_depth = get_file_info(file_location, cache=self.cache)
+        if input_sample_rate is None or input_bit_depth is None:
+            logger.error(f"Couldn't determine sample rate or bit depth for {file_location}")
+            return False
+        if check_bit_depth_allowed(input_bit_depth, self.profile) and check_sample_rate_allowed(
+            input_sample_rate, self.profile
+        ):
+            logger.warning(f"Skipped {file_location} as it's already in desired format.")
+            return False
+        try:
+            output_sample_rate = determine_target_sample_rate(input_sample_rate, self.profile)
+        except ValueError as e:
+            logger.error(f"Could not determine target sample rate for {file_location}: {e}")
+            return False
+
+        location_within_archive_folder = self.archive_folder / Path(file.Location).name
+        if not _reserve_archive_location(location_within_archive_folder, self.reserved_archive_locations):
+            return False
+
+        staged = _StagedConversion(
+            file_location=file_location,
+            location_within_archive_folder=location_within_archive_folder,
+            conversion={
+                "location_within_archive_folder": location_within_archive_folder,
+                "input_sample_rate": input_sample_rate,
+                "input_bit_depth": input_bit_depth,
+                "output_sample_rate": output_sample_rate,
+                "output_bit_depth": 16,
+            },
+        )
+        if self.conversion_journal is not None:
+            # Has to be on disk before the original is moved, otherwise a crash could leave it in the archive unnoticed.
+            self.conversion_journal.record(journal.PLANNED, file_location, durable=True, **staged.conversion)
+
+        if self.content_index is not None:
+            claim, first = self.content_index.claim(file_location)
+            if first:
+                staged.claim = claim
+            else:
+                # The file with the same content is further down the pipeline, so waiting for it can't block it.
+                output, content_location = claim.wait()
+                if output is not None and same_content(file_location, content_location):
+                    succesful_conversion = _clone_conversion(
+                        file_location, location_within_archive_folder, output, self.conversion_journal
+                    )
+                    self._finish(staged, succesful_conversion)
+                    return succesful_conversion
+
+        # The scratch space is reserved before anything is moved, the conversion is larger than the original when it
+        # is upsampled.
+        staged.scratch_bytes = estimate_16bit_size(file_location, output_sample_rate, cache=self.cache)
+        if self.stage_inputs:
+            staged.scratch_bytes += file_location.stat().st_size
+        try:
+            staged.workspace = self.scratch.reserve(staged.scratch_bytes)
+        except OSError as e:
+            logger.error(f"Could not reserve scratch space for {file_location}: {e}")
+            self._finish(staged, False)
+            return False
+        try:
+            with metrics.timer("archive", file_location):
+                metrics.count(f"archive_{move_file(file_location, location_within_archive_folder)}")
+        except OSError as e:
+            logger.error(f"Failed to archive {file_location}: {e}")
+            self._release(staged)
+            self._finish(staged, False)
+            return False
+        _record(self.conversion_journal, journal.ARCHIVED, file_location)
+
+        staged.encoder_input = location_within_archive_folder
+        try:
+            if self.stage_inputs:
+                with metrics.timer("stage_in", file_location):
+                    staged.encoder_input = stage_in(location_within_archive_folder, staged.workspace)
+            else:
+                with metrics.timer("read_ahead", file_location):
+                    read_ahead(location_within_archive_folder)
+        except OSError as e:
+            # The encoder reads the archived original instead, and will find out whether it can be read at all.
+            logger.warning(f"Could not read {location_within_archive_folder} ahead: {e}")
+        return staged
+
+    def encode(self, staged: _StagedConversion) -> _StagedConversion | bool:
+        encoder_output = staged.workspace / f"output{staged.file_location.suffix}"
+        output_sample_rate = staged.conversion["output_sample_rate"]
+        _record(self.conversion_journal, journal.ENCODING, staged.file_location)
+        try:
+            if self.encoder_pool is None:
+                encode_16bit(
+                    staged.encoder_input,
+                    encoder_output,
+                    output_sample_rate,
+                    self.backend,
+                    self.batcher,
+                )
+            else:
+                # Metrics are not recorded in the worker processes.
+                with metrics.timer(self.backend, staged.file_location):
+                    self.encoder_pool.submit(
+                        encode_16bit,
+                        staged.encoder_input,
+                        encoder_output,
+                        output_sample_rate,
+                        self.backend,
+                    ).result()
+                metrics.add_file_bytes(staged.encoder_input)
+        except Exception as e:
+            logger.error(f"Failed to convert {staged.file_location} to 16 bit / {output_sample_rate}Hz: {e}")
+            self._roll_back(staged)
+            return False
+        staged.encoder_output = encoder_output
+        return staged
+
+    def write_back(self, staged: _StagedConversion) -> bool:
+        try:
+            with metrics.timer("write_back", staged.file_location):
+                write_back(staged.encoder_output, staged.file_location)
+        except OSError as e:
+            logger.error(f"Failed to write the conversion of {staged.file_location} back: {e}")
+            self._roll_back(staged)
+            return False
+        self._release(staged)
+        _record(self.conversion_journal, journal.ENCODED, staged.file_location, durable=True)
+
+        conversion = staged.conversion
+        logger.info(
+            f"Converted {staged.file_location} from {conversion['input_bit_depth']} bit /"
+            f" {conversion['input_sample_rate']}Hz to 16 bit / {conversion['output_sample_rate']}Hz",
+        )
+        if staged.claim is not None:
+            staged.claim.finish(staged.file_location, content_location=staged.location_within_archive_folder)
+        self._finish(staged, True)
+        return True
+
+    def _roll_back(self, staged: _StagedConversion) -> None:
+        self._release(staged)
+        try:
+            staged.file_location.unlink(missing_ok=True)
+            move_file(staged.location_within_archive_folder, staged.file_location)
+        except OSError:
+            # The original stays in the archive, and the conversion in the journal for --resume.
+            if staged.claim is not None:
+                staged.claim.finish(None)
+            raise
+        self._finish(staged, False)
+
+    def _release(self, staged: _StagedConversion) -> None:
+        if staged.workspace is not None:
+            self.scratch.release(staged.workspace, staged.scratch_bytes)
+            staged.workspace = None
+
+    def _finish(self, staged: _StagedConversion, succesful_conversion: bool) -> None:
+        if staged.claim is not None and not succesful_conversion:
+            staged.claim.finish(None)
+        if succesful_conversion:
+            self.ledger.add(file_location=staged.file_location, **staged.conversion)
+        if self.conversion_journal is not None:
+            self.conversion_journal.record(
+                journal.COMMITTED if succesful_conversion else journal.ROLLED_BACK, staged.file_location
+            )
+
+
+def _record(
+    conversion_journal: journal.ConversionJournal | None, state: str, file_location: Path, durable: bool = False
+) -> None:
+    if conversion_journal is not None:
+        conversion_journal.record(state, file_location, durable=durable)
+
+
+def resume_conversions(
+    archive_folder: Path, ledger: ConversionLedger, conversion_journal: journal.ConversionJournal
+) -> None:
+    """
+    Finishes or rolls back the conversions that were in flight when an earlier run crashed, according to the last
+    state the journal in the archive folder has of them. Encoded files are committed to the ledger, the originals of
+    all others are moved back in place, after which they are converted again like any other track.
+    """
+    unfinished = journal.unfinished(conversion_journal.location)
+    if not unfinished:
+        logger.info("Found no unfinished conversions to resume")
+        return
+
+    num_committed = num_rolled_back = 0
+    for file_name, record in unfinished.items():
+        file_location = Path(file_name)
+        archive_location = Path(record["location_within_archive_folder"])
+
+        if record["state"] == journal.ENCODED and archive_location.exists() and file_location.exists():
+            # The row may have been written just before the crash.
+            if file_location not in ledger:
+                ledger.add(
                     file_location=file_location,
-                    location_within_archive_folder=location_within_archive_folder,
-                    input_sample_rate=input_sample_rate,
-                    input_bit_depth=input_bit_depth,
-                    output_sample_rate=output_sample_rate,
-                    output_bit_depth=output_bit_depth,
+                    **{key: record[key] for key in _LEDGER_FIELDS},
                 )
-                succesful_conversions += 1
-        except ConversionError:
-            logger.info(f"Error converting file {file.Location}")
+            conversion_journal.record(journal.COMMITTED, file_location)
+            num_committed += 1
+            continue
 
-    logger.info(f"Succesfully converted {succesful_conversions} of {len(unplayable_files)} files!")
+        if archive_location.exists() and file_location.exists() and record["state"] == journal.PLANNED:
+            # A copy to an archive on another drive was cut off, the original was not removed yet.
+            archive_location.unlink()
+        elif archive_location.exists():
+            # The original is in the archive, anything at its location is a partial conversion.
+            file_location.unlink(missing_ok=True)
+            move_file(archive_location, file_location)
+            if file_location in ledger:
+                # Journals of older versions didn't have encoded on disk before the ledger row was written.
+                ledger.revert(file_location)
+        elif not file_location.exists():
+            logger.error(f"Can't resume the conversion of {file_location}, it is neither in place nor in the archive")
+            continue
+
+        conversion_journal.record(journal.ROLLED_BACK, file_location)
+        num_rolled_back += 1
 
+    logger.info(f"Resumed the earlier run: committed {num_committed} and rolled back {num_rolled_back} conversions")
 
-def convert_flacs(flac_files: list[xml.Track], archive_folder: Path):
-    succesful_conversions = 0
-    for file in flac_files:
-        file_location = Path(f"/{file.Location}").absolute()
 
-        location_within_archive_folder = archive_folder / "converted_flacs" / Path(file.Location).name
+def convert_flacs(
+    flac_files: Iterable[xml.Track],
+    archive_folder: Path,
+    jobs: int | None = None,
+    backend: str = DEFAULT_BACKEND,
+    cache: ProbeCache | None = None,
+    batcher: FfmpegBatcher | None = None,
+    dedup: bool = True,
+    scratch: ScratchFolder | None = None,
+    profile: str = DEFAULT_PROFILE,
+):
+    """
+    Converts the FLACs to AIFF in the converted_flacs folder, FLACs with the same content are converted once. With a
+    scratch folder the FLACs are copied there and converted there. The profile decides the sample rate of the AIFFs.
+    """
+    content_index = ContentIndex() if dedup else None
+    summary = run_jobs(
+        lambda file: _convert_flac(file, archive_folder, backend, cache, batcher, content_index, scratch, profile),
+        flac_files,
+        jobs=worker_threads(jobs, batcher),
+    )
+    summary.log()
 
-        if convert_to_aiff(file_location, location_within_archive_folder):
-            succesful_conversions += 1
 
-    logger.info(f"Succesfully converted {succesful_conversions} of {len(flac_files)} files!")
+def _convert_flac(
+    file: xml.Track,
+    archive_folder: Path,
+    backend: str,
+    cache: ProbeCache | None,
+    batcher: FfmpegBatcher | None,
+    content_index: ContentIndex | None = None,
+    scratch: ScratchFolder | None = None,
+    profile: str = DEFAULT_PROFILE,
+) -> bool:
+    file_location = _file_location(file)
+
+    location_within_archive_folder = archive_folder / "converted_flacs" / Path(file.Location).with_suffix(".aiff").name
+
+    def convert() -> bool:
+        return convert_to_aiff(
+            file_location,
+            location_within_archive_folder,
+            backend=backend,
+            cache=cache,
+            batcher=batcher,
+            scratch=scratch,
+            profile=profile,
+        )
+
+    if content_index is None or not file_location.exists():
+        return convert()
+
+    claim, first = content_index.claim(file_location)
+    if first:
+        succesful_conversion = False
+        try:
+            succesful_conversion = convert()
+        finally:
+            claim.finish(location_within_archive_folder if succesful_conversion else None)
+        return succesful_conversion
+
+    output, content_location = claim.wait()
+    if output is None or not same_content(file_location, content_location):
+        return convert()
+    if output == location_within_archive_folder:
+        return True
+
+    try:
+        method = copy_file(output, location_within_archive_folder)
+    except OSError as e:
+        logger.error(f"Failed to copy the conversion of {output} to {location_within_archive_folder}: {e}")
+        return False
+    metrics.count("deduplicated")
+    logger.info(f"Copied {output} to {location_within_archive_folder}, {file_location} has the same content ({method})")
+    return True
 
 
 def archive_files(unplayable_files: list[xml.Track], archive_folder: Path):
     Path(archive_folder).mkdir(parents=True, exist_ok=True)
 
     for file in unplayable_files:
-        # Adding the / is important because unfortunately rekordbox saves the location without a leading /
-        shutil.copy(Path(f"/{file.Location}").absolute(), archive_folder / Path(file.Location).name)
-        logger.info(f"Moved {file.Location} to {archive_folder / Path(file.Location).name}")
-
-
-def add_to_conversion_db(
-    archive_folder,
-    file_location,
-    location_within_archive_folder,
-    input_sample_rate,
-    input_bit_depth,
-    output_sample_rate,
-    output_bit_depth,
-):
-    current_time = datetime.datetime.now()
-
-    with open(Path(archive_folder) / "converted.csv", "a") as f:
-        f.write(
-            f"{current_time},{file_location},{location_within_archive_folder},{input_sample_rate},{output_sample_rate},{input_bit_depth},{output_bit_depth}\n",
-        )
+        # Reflinked where the file system supports it, otherwise copied in the kernel.
+        method = copy_file(_file_location(file), archive_folder / Path(file.Location).name)
+        logger.info(f"Archived {file.Location} to {archive_folder / Path(file.Location).name} ({method})")
 
 
-def _calculate_bit_depth(file) -> int:
-    return int(round(1000 * file.BitRate / (file.SampleRate * 2)))
+def _file_location(file: xml.Track) -> Path:
+    # Adding the / is important because unfortunately rekordbox saves the location without a leading /
+    return Path(f"/{file.Location}").absolute()
@@ -0,0 +1,71 @@
+from typing import Iterator
+
+from pyrekordbox import Rekordbox6Database
+from pyrekordbox.db6 import tables
+from sqlalchemy import and_, func, or_
+
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE, get_profile
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+
+# Values of DjmdContent.FileType, mapped to the Kind Rekordbox uses in its XML export.
+FLAC_FILE_TYPE = 5
+WAV_FILE_TYPE = 11
+AIFF_FILE_TYPE = 12
+FILE_TYPE_KINDS = {FLAC_FILE_TYPE: "FLAC File", WAV_FILE_TYPE: "WAV File", AIFF_FILE_TYPE: "AIFF File"}
+
+
+def iter_database_tracks(db: Rekordbox6Database, profile: str = DEFAULT_PROFILE) -> Iterator[TrackRecord]:
+    """
+    Reads the tracks that might need converting on the players of the device profile straight from the Rekordbox
+    master.db.
+
+    Only the columns we need are queried, and the filtering on file type, sample rate and bit depth happens in SQL, so
+    playable tracks never leave the database.
+    """
+    device_profile = get_profile(profile)
+    content = tables.DjmdContent
+    query = (
+        db.query(content.FolderPath, content.FileType, content.SampleRate, content.BitDepth, content.BitRate)
+        .filter(_not_deleted())
+        .filter(
+            or_(
+                content.FileType == FLAC_FILE_TYPE,
+                and_(
+                    content.FileType.in_([WAV_FILE_TYPE, AIFF_FILE_TYPE]),
+                    or_(
+                        content.SampleRate.not_in(device_profile.sample_rates),
+                        content.BitDepth.not_in(device_profile.bit_depths),
+                    ),
+                ),
+            )
+        )
+    )
+
+    for folder_path, file_type, sample_rate, bit_depth, bit_rate in query.yield_per(1000):
+        yield TrackRecord(
+            # Like in the XML export, locations don't start with a /
+            Location=folder_path.lstrip("/"),
+            Kind=FILE_TYPE_KINDS[file_type],
+            SampleRate=int(sample_rate or 0),
+            BitRate=int(bit_rate or 0),
+            BitDepth=bit_depth,
+        )
+
+
+def count_database_tracks(db: Rekordbox6Database) -> tuple[int, int]:
+    """Returns the number of tracks in the collection, and how many of these are WAV / AIFF."""
+    content = tables.DjmdContent
+    num_tracks, num_lossless = (
+        db.query(
+            func.count(content.ID),
+            func.count(content.ID).filter(content.FileType.in_([WAV_FILE_TYPE, AIFF_FILE_TYPE])),
+        )
+        .filter(_not_deleted())
+        .one()
+    )
+    return num_tracks, num_lossless
+
+
+def _not_deleted():
+    content = tables.DjmdContent
+    return or_(content.rb_local_deleted.is_(None), content.rb_local_deleted == 0)
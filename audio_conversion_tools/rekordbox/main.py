@@ -3,11 +3,37 @@ from pathlib import Path
 import typer
 from loguru import logger
 from pyrekordbox import Rekordbox6Database
-from pyrekordbox.xml import RekordboxXml
 
-from audio_conversion_tools.rekordbox.constants import ALLOWED_BIT_DEPTHS, ALLOWED_SAMPLE_RATES, FILE_TYPES_TO_CONVERT
-from audio_conversion_tools.rekordbox.convert_audio import _calculate_bit_depth, convert_files, convert_flacs
+from audio_conversion_tools.compatibility import DEFAULT_PROFILE, PROFILES, get_profile
+from audio_conversion_tools.convert_audio import BACKENDS, DEFAULT_BACKEND, FfmpegBatcher, check_backend
+from audio_conversion_tools.ffmpeg_runner import open_ffmpeg_runner
+from audio_conversion_tools.journal import open_journal, unfinished
+from audio_conversion_tools.metrics import open_metrics, profile, timed_iter
+from audio_conversion_tools.pipeline import DEFAULT_IO_JOBS, DEFAULT_QUEUE_SIZE, PipelineConfig
+from audio_conversion_tools.probe_cache import open_probe_cache
+from audio_conversion_tools.rekordbox.classify import CollectionClassification, classify_tracks
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.convert_audio import convert_files, convert_flacs, resume_conversions
 from audio_conversion_tools.rekordbox.create_m3u_playlist import create_m3u_playlist
+from audio_conversion_tools.rekordbox.db_reader import count_database_tracks, iter_database_tracks
+from audio_conversion_tools.rekordbox.xml_reader import iter_tracks
+from audio_conversion_tools.scratch import DEFAULT_SCRATCH_BUDGET, ScratchFolder
+
+RUN_REPORT_NAME = "run_report.json"
+
+
+def validate_backend(backend: str) -> str:
+    try:
+        return check_backend(backend)
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from None
+
+
+def validate_device(device: str) -> str:
+    try:
+        return get_profile(device).name
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from None
 
 
 def convert_rekordbox_audio(
@@ -17,52 +43,188 @@ def convert_rekordbox_audio(
         help="XML file to use in case Rekordbox 6 database does not work.",
     ),
     lower_bitrate: bool = typer.Option(False, "--lower-bitrate", "-l", help="Lower the bitrate to 16 bit."),
+    jobs: int = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        help="Number of conversions to run in parallel, defaults to the number of CPUs.",
+    ),
+    backend: str = typer.Option(
+        DEFAULT_BACKEND,
+        "--backend",
+        help=f"Conversion backend, one of {BACKENDS}. The numpy backend converts in-process instead of using ffmpeg.",
+        callback=validate_backend,
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Don't use the probe cache, probe every file again."),
+    timeout: float = typer.Option(
+        None,
+        "--timeout",
+        help="Kill ffmpeg when converting a single file takes longer than this many seconds.",
+    ),
+    batch_size: int = typer.Option(
+        1,
+        "--batch-size",
+        help="Number of files to convert per ffmpeg process, batching saves the ffmpeg startup for short files.",
+    ),
+    rekordbox_db_location: str = typer.Option(
+        None,
+        "--rekordbox-db",
+        help="Rekordbox 6 master.db to read when no XML is given, found automatically by default.",
+    ),
+    profile_run: bool = typer.Option(
+        False,
+        "--profile",
+        help="Profile the run with cProfile and tracemalloc, the results are written to the archive folder.",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Finish or roll back the conversions that were in flight when an earlier run crashed, then continue.",
+    ),
+    no_dedup: bool = typer.Option(
+        False,
+        "--no-dedup",
+        help="Convert every file, also when another file in the collection has the same content.",
+    ),
+    pipeline: bool = typer.Option(
+        False,
+        "--pipeline",
+        help="Archive, encode and write back the files in separate stages, so a slow library disk and the CPUs are"
+        " busy at the same time. Encodes to a local scratch folder.",
+    ),
+    io_jobs: int = typer.Option(
+        DEFAULT_IO_JOBS, "--io-jobs", help="With --pipeline, number of files to archive and write back in parallel."
+    ),
+    queue_depth: int = typer.Option(
+        DEFAULT_QUEUE_SIZE, "--queue-depth", help="With --pipeline, number of files waiting between two stages."
+    ),
+    scratch_budget: int = typer.Option(
+        DEFAULT_SCRATCH_BUDGET // 2**20,
+        "--scratch-budget",
+        help="With --pipeline or --scratch, MiB of scratch space the files that are being converted may take.",
+    ),
+    scratch: str = typer.Option(
+        None,
+        "--scratch",
+        help="Local folder to copy the files to and convert them in, for libraries on a network share.",
+    ),
+    device: str = typer.Option(
+        DEFAULT_PROFILE,
+        "--device",
+        help=f"Player to convert for, one of {list(PROFILES)}. Decides which files are playable and their target format.",
+        callback=validate_device,
+    ),
 ):
     (Path(archive_folder) / "converted_flacs").mkdir(exist_ok=True, parents=True)
 
     # Configure Loguru to write log messages to a file with timestamps
     logger.add(Path(archive_folder) / "example.log", format="{time} - {level} - {message}", level="INFO")
 
-    if not rekordbox_xml_location:
-        Rekordbox6Database()
-    else:
-        xml = RekordboxXml(rekordbox_xml_location)
-        tracks = xml.get_tracks()
-
-    lossless_files = [track for track in tracks if (any(x in track.Kind.lower() for x in FILE_TYPES_TO_CONVERT))]
-    logger.info(
-        f"Read Rekordbox collection, found {len(tracks)} tracks in total of which {len(lossless_files)} WAV / AIFF",
-    )
-
-    unplayable_files = [
-        track
-        for track in tracks
-        if (
-            (any(x in track.Kind.lower() for x in FILE_TYPES_TO_CONVERT))
-            and (
-                (int(track.SampleRate) not in ALLOWED_SAMPLE_RATES)
-                or (_calculate_bit_depth(track) not in ALLOWED_BIT_DEPTHS)
-            )
+    # The time spent per stage and the slowest files are written to run_report.json in the archive folder.
+    with open_metrics(Path(archive_folder) / RUN_REPORT_NAME), profile(archive_folder if profile_run else None):
+        _convert_rekordbox_audio(
+            archive_folder=archive_folder,
+            rekordbox_xml_location=rekordbox_xml_location,
+            jobs=jobs,
+            backend=backend,
+            no_cache=no_cache,
+            timeout=timeout,
+            batch_size=batch_size,
+            rekordbox_db_location=rekordbox_db_location,
+            resume=resume,
+            dedup=not no_dedup,
+            pipeline=PipelineConfig(io_jobs=io_jobs, queue_size=queue_depth, scratch_budget=scratch_budget * 2**20)
+            if pipeline
+            else None,
+            scratch=ScratchFolder(scratch, scratch_budget * 2**20) if scratch else None,
+            device=device,
         )
-    ]
-    percentage_unplayable = (len(unplayable_files) / len(lossless_files)) * 100
-    logger.info(f"Found {len(unplayable_files)} ({percentage_unplayable:.1f}%) unplayable WAV / AIFFs")
 
-    logger.info(f"Will archive original files to {Path(archive_folder).resolve()}")
-    logger.info("Starting the conversion process...")
 
-    # We convert all files to the closest playable format.
-    convert_files(unplayable_files, Path(archive_folder))
+def _convert_rekordbox_audio(
+    archive_folder: str,
+    rekordbox_xml_location: str | None,
+    jobs: int | None,
+    backend: str,
+    no_cache: bool,
+    timeout: float | None,
+    batch_size: int,
+    rekordbox_db_location: str | None,
+    resume: bool,
+    dedup: bool,
+    pipeline: PipelineConfig | None,
+    scratch: ScratchFolder | None,
+    device: str,
+) -> None:
+    db = None
+    if not rekordbox_xml_location:
+        db = Rekordbox6Database(path=rekordbox_db_location)
+        tracks = timed_iter("read_collection", iter_database_tracks(db, device))
+    else:
+        tracks = timed_iter("read_collection", iter_tracks(rekordbox_xml_location))
 
-    # We create an .m3u file containing all the unplayable files.
-    create_m3u_playlist(unplayable_files, Path(archive_folder) / "unplayable_files.m3u")
+    classification = CollectionClassification(profile=device)
+    batcher = FfmpegBatcher(batch_size) if batch_size > 1 else None
 
-    # We also convert all FLACs in Rekordbox.
-    flac_files = [track for track in tracks if track.Kind.lower()[:4] == "flac"]
+    logger.info(f"Will archive original files to {Path(archive_folder).resolve()}")
+    logger.info("Starting the conversion process while reading the Rekordbox collection...")
+
+    with (
+        open_probe_cache(enabled=not no_cache) as cache,
+        open_ffmpeg_runner(timeout=timeout),
+        open_journal(archive_folder) as conversion_journal,
+    ):
+        # Every step of every conversion is recorded in journal.jsonl in the archive folder, so a crashed run can be
+        # finished with --resume.
+        if resume:
+            resume_conversions(Path(archive_folder), ConversionLedger(archive_folder), conversion_journal)
+        elif unfinished(conversion_journal.location):
+            logger.warning(
+                "An earlier run crashed while converting, run again with --resume to finish or roll back its"
+                " conversions. Files that are still in the archive are skipped in this run."
+            )
 
-    logger.info(f"Additionally found {len(flac_files)} FLACs which are also unplayable on CDJs")
+        # We convert all files to the closest playable format, conversions start as soon as the first unplayable
+        # file is read from the collection.
+        convert_files(
+            classify_tracks(tracks, classification),
+            Path(archive_folder),
+            jobs=jobs,
+            backend=backend,
+            cache=cache,
+            batcher=batcher,
+            conversion_journal=conversion_journal,
+            dedup=dedup,
+            pipeline=pipeline,
+            scratch=scratch,
+            profile=device,
+        )
+        if db is not None:
+            # Playable tracks are already filtered out in the database query, so we count the collection separately.
+            classification.num_tracks, classification.num_lossless = count_database_tracks(db)
+            db.close()
+        classification.log()
+
+        # We create an .m3u file containing all the unplayable files.
+        create_m3u_playlist(classification.unplayable_files, Path(archive_folder) / "unplayable_files.m3u")
+
+        # We also convert all FLACs in Rekordbox.
+        flac_files = classification.flac_files
+
+        logger.info(f"Additionally found {len(flac_files)} FLACs which are also unplayable on {device}")
+
+        convert_flacs(
+            flac_files,
+            Path(archive_folder),
+            jobs=jobs,
+            backend=backend,
+            cache=cache,
+            batcher=batcher,
+            dedup=dedup,
+            scratch=scratch,
+            profile=device,
+        )
 
-    convert_flacs(flac_files, Path(archive_folder))
     logger.warning(
         f"The converted FLACs can be found in {Path(archive_folder) / 'converted_flacs'},"
         "but you have to add these to Rekordbox manually as the file type changed",
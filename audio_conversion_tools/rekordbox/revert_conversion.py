@@ -1,25 +1,148 @@
-import csv
-import os
-import shutil
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
 
 import typer
+from loguru import logger
+
+from audio_conversion_tools.archive import move_file, same_device
+from audio_conversion_tools.engine import ConversionSummary, JobResult, run_jobs
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger, add_to_reverted_log
+
+# Seconds between two progress reports of the moves between drives.
+PROGRESS_INTERVAL = 5.0
+
+
+class Restore(NamedTuple):
+    file_location: str
+    archive_location: str
+    size: int
+    same_device: bool
+
+
+def plan_restores(archive_folder: str | Path, converted_csv_path: str | Path | None = None) -> list[Restore]:
+    """
+    Lists the originals to move back from the archive: only the latest conversion of every track in
+    converted_csv_path (converted.csv of the archive folder by default), and not the tracks that were already
+    reverted. Originals that are missing from the archive are left out.
+    """
+    restores = []
+    ledger = ConversionLedger(archive_folder, converted_csv_path)
+    for file_location, archive_location in ledger.archive_locations().items():
+        archive_path = Path(archive_location)
+        if not archive_path.exists():
+            logger.warning(f"Original of {file_location} is not in the archive anymore at {archive_location}")
+            continue
+        restores.append(
+            Restore(
+                file_location=file_location,
+                archive_location=archive_location,
+                size=archive_path.stat().st_size,
+                same_device=Path(file_location).parent.exists() and same_device(archive_path, file_location),
+            )
+        )
+    return restores
+
+
+def restore_files(
+    archive_folder: str | Path,
+    restores: list[Restore],
+    jobs: int | None = None,
+    verify_contents: bool = False,
+) -> ConversionSummary:
+    """
+    Moves the originals back in place and logs them in reverted.csv. Originals on the same drive are renamed one
+    by one, the copies between drives run in parallel and are verified before the original leaves the archive.
+    """
+    summary = ConversionSummary()
+    renames = [restore for restore in restores if restore.same_device]
+    copies = [restore for restore in restores if not restore.same_device]
+
+    for restore in renames:
+        start = time.perf_counter()
+        success = _restore(archive_folder, restore, verify_contents)
+        summary.results.append(JobResult(restore.file_location, success, time.perf_counter() - start))
+    if renames:
+        logger.info(f"Renamed {sum(result.success for result in summary.results)} originals on the same drive")
+
+    progress = _Progress(len(copies), sum(restore.size for restore in copies))
+    copy_summary = run_jobs(
+        lambda restore: progress.done(restore, _restore(archive_folder, restore, verify_contents)),
+        copies,
+        jobs=jobs,
+    )
+    summary.results.extend(copy_summary.results)
+    return summary
+
+
+class _Progress:
+    def __init__(self, num_files: int, num_bytes: int):
+        self.num_files = num_files
+        self.num_bytes = num_bytes
+        self._lock = threading.Lock()
+        self._files_done = 0
+        self._bytes_done = 0
+        self._start = self._last_report = time.perf_counter()
+
+    def done(self, restore: Restore, success: bool) -> bool:
+        with self._lock:
+            self._files_done += 1
+            self._bytes_done += restore.size
+            now = time.perf_counter()
+            if now - self._last_report >= PROGRESS_INTERVAL or self._files_done == self.num_files:
+                self._last_report = now
+                logger.info(
+                    f"Copied {self._files_done} of {self.num_files} originals between drives"
+                    f" ({self._bytes_done / 2**30:.2f} of {self.num_bytes / 2**30:.2f} GiB,"
+                    f" {self._bytes_done / 2**20 / max(now - self._start, 1e-9):.0f} MiB/s)"
+                )
+        return success
+
+
+def _restore(archive_folder: str | Path, restore: Restore, verify_contents: bool) -> bool:
+    try:
+        move_file(restore.archive_location, restore.file_location, verify_contents=verify_contents)
+    except OSError as e:
+        logger.error(f"Could not restore {restore.file_location} from {restore.archive_location}: {e}")
+        return False
+    add_to_reverted_log(archive_folder, restore.file_location, restore.archive_location)
+    logger.info(f"Restored '{Path(restore.file_location).name}' from archive.")
+    return True
 
 
 def restore_files_from_csv(
     archive_csv_path: str = typer.Option(...),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only list what would be restored, don't move anything."),
+    jobs: int = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        help="Number of originals to copy back in parallel when the archive is on another drive.",
+    ),
+    verify: bool = typer.Option(
+        False,
+        "--verify",
+        help="Compare copies between drives by hash instead of by size before removing them from the archive.",
+    ),
 ):
-    with open(archive_csv_path, newline="") as csvfile:
-        csvreader = csv.reader(csvfile)
-        for row in csvreader:
-            if len(row) >= 2:
-                source_file = row[2]  # Get the source path (archive location)
-                destination_file = row[1]  # Get the destination path (original location)
-
-                # Check if the source file exists and is in the archive folder
-                if os.path.exists(source_file):
-                    # Move the file from the archive to the original location
-                    shutil.move(source_file, destination_file)
-                    print(f"Restored '{os.path.basename(destination_file)}' from archive.")
+    # reverted.csv is kept next to the CSV, so a run that was cut off can be continued.
+    archive_folder = Path(archive_csv_path).parent
+    restores = plan_restores(archive_folder, archive_csv_path)
+    num_renames = sum(restore.same_device for restore in restores)
+    logger.info(
+        f"Will restore {len(restores)} originals ({sum(restore.size for restore in restores) / 2**30:.2f} GiB):"
+        f" {num_renames} renames on the same drive and {len(restores) - num_renames} copies between drives"
+    )
+
+    if dry_run:
+        for restore in restores:
+            method = "rename" if restore.same_device else "copy"
+            logger.info(f"Would restore {restore.file_location} from {restore.archive_location} ({method})")
+        return
+
+    summary = restore_files(archive_folder, restores, jobs=jobs, verify_contents=verify)
+    logger.info(f"Restored {len(summary.succeeded)} of {len(summary.results)} originals from the archive")
 
 
 def main():
@@ -0,0 +1,107 @@
+from functools import cached_property
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from audio_conversion_tools.compatibility import (
+    ACTIONS,
+    CONTAINERS,
+    CONVERT,
+    DEFAULT_PROFILE,
+    TRANSCODE,
+    compatibility_table,
+    container_of_kind,
+)
+from audio_conversion_tools.rekordbox.constants import FILE_TYPES_TO_CONVERT
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+
+
+class TrackTable:
+    """
+    Columnar view of (part of) a Rekordbox collection, with the classification masks computed vectorized.
+
+    Kind is stored as a categorical, so the string checks on the file type only run once per distinct Kind instead of
+    once per track. What is playable is looked up in the compatibility table of the device profile.
+    """
+
+    def __init__(self, frame: pd.DataFrame, profile: str = DEFAULT_PROFILE):
+        self.frame = frame
+        self.profile = profile
+
+    @classmethod
+    def from_tracks(cls, tracks: Iterable, profile: str = DEFAULT_PROFILE) -> "TrackTable":
+        records = [track if isinstance(track, TrackRecord) else _to_record(track) for track in tracks]
+        frame = pd.DataFrame.from_records(records, columns=TrackRecord._fields)
+        return cls(
+            frame.astype(
+                {
+                    "Kind": "category",
+                    "SampleRate": np.int64,
+                    "BitRate": np.int64,
+                    "BitDepth": pd.Int64Dtype(),
+                }
+            ),
+            profile,
+        )
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @cached_property
+    def bit_depths(self) -> np.ndarray:
+        """Bit depth per track, from the database if known and otherwise derived from the bit rate."""
+        sample_rates = self.frame["SampleRate"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            derived = np.where(
+                sample_rates > 0, np.round(1000 * self.frame["BitRate"].to_numpy() / (sample_rates * 2)), 0
+            )
+        known = self.frame["BitDepth"].to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(np.isnan(known) | (known == 0), derived, known).astype(np.int64)
+
+    @cached_property
+    def lossless_mask(self) -> np.ndarray:
+        return self._kind_mask(lambda kind: any(x in kind for x in FILE_TYPES_TO_CONVERT))
+
+    @cached_property
+    def actions(self) -> np.ndarray:
+        """Action per track, as index in compatibility.ACTIONS."""
+        kinds = self.frame["Kind"].cat
+        category_containers = [container_of_kind(kind) for kind in kinds.categories]
+        category_codes = np.array(
+            [CONTAINERS.index(container) if container else len(CONTAINERS) for container in category_containers],
+            dtype=np.int64,
+        )
+        # Code -1 means a missing Kind, which is not a container we convert.
+        containers = np.append(category_codes, len(CONTAINERS))[kinds.codes.to_numpy()]
+        return compatibility_table(self.profile).actions(
+            containers, self.frame["SampleRate"].to_numpy(), self.bit_depths
+        )
+
+    @cached_property
+    def flac_mask(self) -> np.ndarray:
+        """FLACs the profile can't play."""
+        return self.actions == ACTIONS.index(TRANSCODE)
+
+    @cached_property
+    def unplayable_mask(self) -> np.ndarray:
+        """WAV / AIFFs the profile can't play."""
+        return self.actions == ACTIONS.index(CONVERT)
+
+    def records(self, mask: np.ndarray) -> list[TrackRecord]:
+        selected = self.frame[mask].astype({"Kind": object, "BitDepth": object})
+        selected["BitDepth"] = selected["BitDepth"].where(selected["BitDepth"].notna(), None)
+        return [TrackRecord(*row) for row in selected.itertuples(index=False, name=None)]
+
+    def _kind_mask(self, predicate) -> np.ndarray:
+        kinds = self.frame["Kind"].cat
+        category_mask = np.array([predicate(kind.lower()) for kind in kinds.categories], dtype=bool)
+        codes = kinds.codes.to_numpy()
+        # Code -1 means a missing Kind, which never matches.
+        return np.append(category_mask, False)[codes]
+
+
+def _to_record(track) -> TrackRecord:
+    return TrackRecord(
+        Location=track.Location, Kind=track.Kind, SampleRate=int(track.SampleRate), BitRate=track.BitRate
+    )
@@ -0,0 +1,49 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from pyrekordbox import xml
+
+
+class TrackRecord(NamedTuple):
+    """The attributes of a Rekordbox track we need for the conversion, named like the pyrekordbox Track attributes."""
+
+    Location: str
+    Kind: str
+    SampleRate: int
+    BitRate: int
+    # Only known when reading from the Rekordbox database, otherwise it is derived from the bit rate.
+    BitDepth: int | None = None
+
+
+def iter_tracks(rekordbox_xml_location: str | Path) -> Iterator[TrackRecord]:
+    """
+    Reads the tracks in the collection of a Rekordbox XML export one by one.
+
+    Unlike pyrekordbox.xml.RekordboxXml the export is never fully loaded in memory: every track element is discarded
+    as soon as it is parsed, and the playlists are skipped.
+    """
+    in_collection = False
+    collection = None
+
+    with open(rekordbox_xml_location, "rb") as xml_file:
+        for event, element in ET.iterparse(xml_file, events=("start", "end")):
+            if element.tag == "COLLECTION":
+                in_collection = event == "start"
+                collection = element
+            elif element.tag == "PLAYLISTS" and event == "start":
+                # The playlists only refer to the tracks in the collection by key.
+                return
+            elif in_collection and event == "end" and element.tag == "TRACK":
+                yield _to_record(element)
+                # Drops all tracks parsed so far, including this one.
+                collection.clear()
+
+
+def _to_record(element: ET.Element) -> TrackRecord:
+    return TrackRecord(
+        Location=xml.decode_path(element.get("Location", "")),
+        Kind=element.get("Kind", ""),
+        SampleRate=int(float(element.get("SampleRate") or 0)),
+        BitRate=int(element.get("BitRate") or 0),
+    )
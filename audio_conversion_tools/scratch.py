@@ -0,0 +1,95 @@
+"""
+Converts files in a local scratch folder, for libraries on SMB / NFS shares.
+
+ffmpeg reads and writes in small chunks, which is slow over the network. Instead the source is copied to the scratch
+folder in large sequential chunks, converted there, and the result is copied back next to its destination in one go
+and renamed into place, so the destination never contains a partially written file. A byte budget limits the space
+the files that are being converted take in the scratch folder, so a few multi-GB files don't fill up a tmpfs.
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterator
+
+from audio_conversion_tools.archive import copy_file
+
+DEFAULT_SCRATCH_BUDGET = 2 * 2**30
+
+# Prefix of the files written back next to their destination, before they are renamed into place.
+PARTIAL_PREFIX = ".partial_"
+
+
+class ByteBudget:
+    """Limits the number of bytes in use, like scratch space. Can be shared between threads."""
+
+    def __init__(self, max_bytes: int):
+        if max_bytes < 1:
+            raise ValueError(f"Byte budget should be at least 1 byte, got {max_bytes}")
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, num_bytes: int) -> None:
+        """Blocks until num_bytes fit in the budget."""
+        with self._condition:
+            # A file larger than the whole budget gets it for itself, instead of waiting forever.
+            self._condition.wait_for(lambda: self.in_use == 0 or self.in_use + num_bytes <= self.max_bytes)
+            self.in_use += num_bytes
+
+    def release(self, num_bytes: int) -> None:
+        with self._condition:
+            self.in_use -= num_bytes
+            self._condition.notify_all()
+
+
+class ScratchFolder:
+    """A local folder to convert files in, every conversion gets its own workspace within the byte budget."""
+
+    def __init__(self, folder: str | Path, budget: int = DEFAULT_SCRATCH_BUDGET):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.budget = ByteBudget(budget)
+
+    def reserve(self, num_bytes: int) -> Path:
+        """Blocks until num_bytes fit in the budget, and returns a new workspace folder."""
+        self.budget.acquire(num_bytes)
+        try:
+            return Path(tempfile.mkdtemp(prefix="conversion_", dir=self.folder))
+        except OSError:
+            self.budget.release(num_bytes)
+            raise
+
+    def release(self, workspace: Path, num_bytes: int) -> None:
+        shutil.rmtree(workspace, ignore_errors=True)
+        self.budget.release(num_bytes)
+
+    @contextlib.contextmanager
+    def workspace(self, num_bytes: int) -> Iterator[Path]:
+        workspace = self.reserve(num_bytes)
+        try:
+            yield workspace
+        finally:
+            self.release(workspace, num_bytes)
+
+
+def stage_in(source: str | Path, workspace: Path) -> Path:
+    """Copies source into the workspace, keeping its extension so the encoder recognizes the format."""
+    local_source = workspace / f"source{Path(source).suffix}"
+    copy_file(source, local_source)
+    return local_source
+
+
+def write_back(local_file: str | Path, destination: str | Path) -> None:
+    """Copies local_file next to destination and renames it into place."""
+    destination = Path(destination)
+    partial_location = destination.with_name(f"{PARTIAL_PREFIX}{destination.name}")
+    copy_file(local_file, partial_location)
+    try:
+        os.replace(partial_location, destination)
+    except OSError:
+        partial_location.unlink(missing_ok=True)
+        raise
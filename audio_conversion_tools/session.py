@@ -0,0 +1,197 @@
+"""
+Converts files from a long running process, like an ingest service, without starting a CLI for every folder.
+
+A ConversionSession opens the probe cache, the ffmpeg runner, the ffmpeg log and the worker threads once, and
+converts every file that is submitted to it for its device profile, until it is shut down. Files can be submitted
+one by one, or mapped over as a batch with a bounded number of files in flight. Nothing asks questions on the
+command line, what happens with the originals is decided by the flags of the session.
+"""
+
+import contextlib
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from audio_conversion_tools import compatibility
+from audio_conversion_tools.convert_audio import (
+    BIT_DEPTHS,
+    DEFAULT_BACKEND,
+    FFMPEG_LOG_LOCATION,
+    FfmpegBatcher,
+    check_backend,
+    convert_aif_to_16bit,
+    convert_to_aiff,
+    convert_wav_to_16bit,
+    probe_file,
+    worker_threads,
+)
+from audio_conversion_tools.engine import ConversionSummary, JobResult, default_jobs, run_job
+from audio_conversion_tools.ffmpeg_runner import FfmpegRunner
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.probe_cache import open_probe_cache
+from audio_conversion_tools.scratch import ScratchFolder
+
+# Subtypes of files with floating point samples.
+FLOAT_SUBTYPES = ["FLOAT", "DOUBLE"]
+
+
+class ConversionSession:
+    """
+    Converts WAV / AIFF files that are not playable on the device to 16 bit in place, and FLACs that are not playable
+    to AIFF next to them. The original of an in place conversion is kept next to the conversion with a _temp suffix,
+    unless delete_originals is set, which also deletes the FLACs that were converted.
+
+    Every session runs ffmpeg on its own runner and writes to its own handle of the ffmpeg log, so several sessions
+    can be open at the same time and closed in any order.
+    """
+
+    def __init__(
+        self,
+        jobs: int | None = None,
+        backend: str = DEFAULT_BACKEND,
+        profile: str = compatibility.PCM16_PROFILE,
+        cache: bool = True,
+        timeout: float | None = None,
+        batch_size: int = 1,
+        scratch: ScratchFolder | None = None,
+        delete_originals: bool = False,
+        ffmpeg_log: str | Path = FFMPEG_LOG_LOCATION,
+        log_file: str | Path | None = None,
+    ):
+        self.backend = check_backend(backend)
+        self.profile = compatibility.get_profile(profile).name
+        self.scratch = scratch
+        self.delete_originals = delete_originals
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._resources = contextlib.ExitStack()
+        try:
+            self.cache = self._resources.enter_context(open_probe_cache(enabled=cache))
+            self._runner = self._resources.enter_context(FfmpegRunner(timeout=timeout, progress_interval=None))
+            self._ffmpeg_log = self._resources.enter_context(open(ffmpeg_log, "a"))
+            self.batcher = (
+                FfmpegBatcher(batch_size, runner=self._runner, ffmpeg_log=self._ffmpeg_log) if batch_size > 1 else None
+            )
+            self.jobs = worker_threads(jobs, self.batcher) or default_jobs()
+            if log_file is not None:
+                sink = logger.add(log_file, format="{time} - {level} - {message}", level="INFO")
+                self._resources.callback(logger.remove, sink)
+            self._executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="conversion-session")
+        except BaseException:
+            self._resources.close()
+            raise
+
+    def submit(self, file_name: str | Path) -> Future[bool]:
+        """Starts converting the file, the future tells whether the file is playable on the device afterwards."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Can't submit files to a conversion session that was shut down")
+            return self._executor.submit(self.convert_file, os.fspath(file_name))
+
+    def map(self, file_names: Iterable[str | Path], max_in_flight: int | None = None) -> Iterator[JobResult]:
+        """
+        Converts the files and yields their results as they finish. Like run_jobs the files are consumed lazily, at
+        most max_in_flight (2 * jobs by default) conversions are submitted at once.
+        """
+        max_in_flight = max_in_flight or 2 * self.jobs
+        in_flight: set[Future[JobResult]] = set()
+        try:
+            for file_name in file_names:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from (future.result() for future in done)
+                in_flight.add(self._submit_job(file_name))
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        finally:
+            # A batch that is abandoned halfway doesn't keep converting in the background.
+            for future in in_flight:
+                future.cancel()
+
+    def run(self, file_names: Iterable[str | Path], description: str = "files") -> ConversionSummary:
+        """Converts a batch of files and logs the summary."""
+        summary = ConversionSummary(list(self.map(file_names)))
+        summary.log(description)
+        return summary
+
+    def convert_file(self, file_name: str) -> bool:
+        """Converts a single file in the calling thread, returns whether it is playable on the device afterwards."""
+        container = compatibility.container_of_file(file_name)
+        if container is None:
+            logger.warning(f"Skipped {file_name}, only WAV, AIFF and FLAC files are converted")
+            return False
+        if not Path(file_name).exists():
+            logger.error(f"The file {file_name} does not exist!")
+            return False
+
+        try:
+            info = probe_file(file_name, cache=self.cache)
+            bit_depth = BIT_DEPTHS[info.subtype]
+        except Exception as e:
+            logger.error(f"Could not get file info for {file_name}: {e}")
+            return False
+
+        sample_format = "float" if info.subtype in FLOAT_SUBTYPES else "int"
+        decision = compatibility.lookup(self.profile, container, info.samplerate, bit_depth, sample_format)
+        if decision.action == compatibility.KEEP:
+            logger.info(f"Skipped {file_name} as it's already playable on {self.profile}")
+            return True
+
+        if decision.action == compatibility.TRANSCODE:
+            if not convert_to_aiff(file_name, **self._conversion_options()):
+                return False
+            original = file_name
+        else:
+            original = f"{file_name.rsplit('.', 1)[0]}_temp{Path(file_name).suffix}"
+            convert = convert_wav_to_16bit if container == "wav" else convert_aif_to_16bit
+            if not convert(file_name, original, **self._conversion_options()):
+                return False
+
+        if self.delete_originals:
+            os.remove(original)
+            logger.info(f"Deleted {original}")
+        return True
+
+    def shutdown(self, cancel: bool = False) -> None:
+        """
+        Waits for the submitted conversions and closes the session. With cancel, the conversions that did not start
+        yet are dropped and the running ffmpeg processes are killed, which moves their originals back in place.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if cancel:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._runner.cancel()
+        # The running conversions finish or roll back before the runner and the log are closed.
+        self._executor.shutdown(wait=True)
+        self._resources.close()
+
+    def __enter__(self) -> "ConversionSession":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *args: object) -> None:
+        self.shutdown(cancel=exc_type is not None and issubclass(exc_type, KeyboardInterrupt))
+
+    def _submit_job(self, file_name: str | Path) -> Future[JobResult]:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Can't submit files to a conversion session that was shut down")
+            return self._executor.submit(run_job, self.convert_file, os.fspath(file_name))
+
+    def _conversion_options(self) -> dict:
+        return {
+            "backend": self.backend,
+            "cache": self.cache,
+            "batcher": self.batcher,
+            "scratch": self.scratch,
+            "profile": self.profile,
+            "runner": self._runner,
+            "ffmpeg_log": self._ffmpeg_log,
+        }
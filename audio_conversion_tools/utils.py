@@ -1,25 +1,130 @@
 import os
-import pathlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from typing import Iterable, Iterator, NamedTuple
 
+from audio_conversion_tools import metrics
+from audio_conversion_tools.logging import logger
 
-def find_files(root_directory, extensions: list[str], recursive: bool = False):
-    available_files = (
-        _find_files_recursively(root_directory, extensions=extensions)
-        if recursive
-        else [f for f in os.listdir() if _get_extension(f) in extensions]
-    )
+# Directories are listed concurrently, which mostly helps on network shares where every listing is a round trip.
+DEFAULT_SCAN_JOBS = 8
 
-    return available_files
 
+class ScannedFile(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
 
-def _find_files_recursively(root_directory, extensions: list[str]):
-    available_files = []
-    for root, _, files in os.walk(root_directory):
-        for filename in files:
-            if _get_extension(filename) in extensions:
-                available_files.append(os.path.join(root, filename))
-    return available_files
 
+def ask_yes_no(question: str) -> bool:
+    """Asks a y/n question on the command line, only the CLIs ask questions, the conversion functions take flags."""
+    answer = input(f"{question} y/n\n")
+    if answer not in ["y", "n"]:
+        raise ValueError("Answer should be y or n")
+    return answer == "y"
 
-def _get_extension(file_name):
-    return pathlib.Path(file_name).suffix.lower()
+
+def confirm_recursive() -> None:
+    input("Recursive mode enabled, will process subdirectories, if you are sure, press any key to continue.")
+
+
+def find_files(
+    root_directory,
+    extensions: list[str],
+    recursive: bool = False,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+) -> Iterator[str]:
+    """Yields the paths of the files in root_directory with one of the given extensions, see scan_files."""
+    # Only the paths are needed, so the files are not stat-ed, which is a syscall per file on Linux and macOS.
+    for entry in _iter_entries(root_directory, extensions, recursive, include, exclude, DEFAULT_SCAN_JOBS, stat=False):
+        yield entry.path
+
+
+def scan_files(
+    root_directory,
+    extensions: list[str],
+    recursive: bool = False,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+    jobs: int = DEFAULT_SCAN_JOBS,
+) -> Iterator[ScannedFile]:
+    """
+    Yields the files in root_directory with one of the given extensions, together with their size and modification
+    time, as soon as the directory they are in has been listed.
+
+    With include only file names matching one of the glob patterns are yielded, files and directories with a name
+    matching one of the exclude patterns are skipped. Subdirectories are listed concurrently in recursive mode.
+    """
+    for entry in _iter_entries(root_directory, extensions, recursive, include, exclude, jobs, stat=True):
+        # Stat-ed while listing the directory, the DirEntry caches the result.
+        stat = entry.stat()
+        yield ScannedFile(entry.path, stat.st_size, stat.st_mtime_ns)
+
+
+def _iter_entries(
+    root_directory,
+    extensions: list[str],
+    recursive: bool,
+    include: Iterable[str] | None,
+    exclude: Iterable[str] | None,
+    jobs: int,
+    stat: bool,
+) -> Iterator[os.DirEntry]:
+    extensions = tuple(extension.lower() for extension in extensions)
+    include = list(include or [])
+    exclude = list(exclude or [])
+
+    def scan(directory: str) -> tuple[list[os.DirEntry], list[str]]:
+        return _scan_directory(directory, extensions, include, exclude, stat)
+
+    if not recursive:
+        yield from scan(os.fspath(root_directory))[0]
+        return
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        pending = {executor.submit(scan, os.fspath(root_directory))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirectories = future.result()
+                pending.update(executor.submit(scan, subdirectory) for subdirectory in subdirectories)
+                yield from files
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _scan_directory(
+    directory: str,
+    extensions: tuple[str, ...],
+    include: list[str],
+    exclude: list[str],
+    stat: bool,
+) -> tuple[list[os.DirEntry], list[str]]:
+    files = []
+    subdirectories = []
+
+    try:
+        with metrics.timer("scan"), os.scandir(directory) as entries:
+            for entry in entries:
+                if any(fnmatch(entry.name, pattern) for pattern in exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif (
+                        entry.is_file()
+                        and entry.name.lower().endswith(extensions)
+                        and (not include or any(fnmatch(entry.name, pattern) for pattern in include))
+                    ):
+                        if stat:
+                            # Comes for free from the directory listing on Windows, and is cached by the DirEntry.
+                            entry.stat()
+                        files.append(entry)
+                except OSError as e:
+                    logger.warning(f"Skipped {entry.path}: {e}")
+    except OSError as e:
+        logger.warning(f"Could not list {directory}: {e}")
+
+    return files, subdirectories
@@ -0,0 +1,216 @@
+"""
+Watches folders for new and changed audio files, so they can be converted as soon as they arrive.
+
+On Linux the folders are watched with inotify, on other systems, or when inotify is not available, they are scanned
+every poll interval. Downloads are written in parts, so a file is only yielded once its size and modification time
+did not change for the settle time, and a file is only yielded again when it changed after that.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from fnmatch import fnmatch
+from typing import Iterable, Iterator
+
+from audio_conversion_tools.logging import logger
+from audio_conversion_tools.utils import scan_files
+
+DEFAULT_SETTLE_TIME = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+# inotify event masks, from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class InotifyUnavailable(OSError): ...
+
+
+class Inotify:
+    """Minimal inotify bindings through ctypes, only available on Linux."""
+
+    def __init__(self) -> None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise InotifyUnavailable(f"inotify is not available: {e}") from e
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise InotifyUnavailable(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        # Watch descriptors to the directories they watch.
+        self.directories: dict[int, str] = {}
+
+    def add_watch(self, directory: str) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Could not watch {directory}: {os.strerror(errno)}")
+        self.directories[wd] = directory
+
+    def read(self, timeout: float | None) -> list[tuple[str, int]]:
+        """Waits at most timeout seconds for events, returns the paths they are about with their masks."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+            directory = self.directories.get(wd)
+            if mask & IN_Q_OVERFLOW:
+                events.append(("", mask))
+            elif directory is not None:
+                events.append((os.path.join(directory, name) if name else directory, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def watch_files(
+    folders: Iterable[str],
+    extensions: list[str],
+    recursive: bool = False,
+    exclude: Iterable[str] | None = None,
+    settle_time: float = DEFAULT_SETTLE_TIME,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    use_inotify: bool = True,
+    stop: threading.Event | None = None,
+) -> Iterator[str]:
+    """
+    Yields the files in the folders with one of the extensions, the files that are in the folders already first, and
+    then every file that is added or changed, once it settled. Runs until stop is set, or forever.
+
+    Files and directories with a name matching one of the exclude patterns are skipped, like for scan_files.
+    """
+    folders = [os.fspath(folder) for folder in folders]
+    extensions = [extension.lower() for extension in extensions]
+    exclude = list(exclude or [])
+    stop = stop or threading.Event()
+
+    inotify = None
+    if use_inotify:
+        try:
+            inotify = Inotify()
+        except InotifyUnavailable as e:
+            logger.warning(f"{e}, scanning the folders every {poll_interval}s instead")
+
+    def scan() -> Iterator[str]:
+        for folder in folders:
+            for file in scan_files(folder, extensions, recursive=recursive, exclude=exclude):
+                yield file.path
+
+    def watch_directories(root: str) -> None:
+        # The new directory might contain files already, like a folder that was moved in.
+        for directory, subdirectories, _ in os.walk(root) if recursive else [(root, [], [])]:
+            subdirectories[:] = [name for name in subdirectories if not _excluded(name, exclude)]
+            try:
+                inotify.add_watch(directory)
+            except OSError as e:
+                logger.warning(str(e))
+
+    # Files that might be yielded once they settled, with their last stat and since when they have it.
+    pending: dict[str, tuple[tuple[int, int], float]] = {}
+    # The stat of every file when it was yielded.
+    yielded: dict[str, tuple[int, int]] = {}
+
+    def check(path: str, now: float) -> None:
+        name = os.path.basename(path)
+        if not name.lower().endswith(tuple(extensions)) or _excluded(name, exclude):
+            return
+        key = _stat_key(path)
+        if key is None or yielded.get(path) == key:
+            pending.pop(path, None)
+            return
+        if path not in pending or pending[path][0] != key:
+            pending[path] = (key, now)
+
+    try:
+        if inotify is not None:
+            for folder in folders:
+                watch_directories(folder)
+        for path in scan():
+            check(path, time.monotonic())
+        last_scan = time.monotonic()
+
+        while not stop.is_set():
+            now = time.monotonic()
+            for path, (_, since) in list(pending.items()):
+                if now - since < settle_time:
+                    continue
+                # The stat changes while the file is written, then it starts settling again.
+                check(path, now)
+                if path in pending and pending[path][1] == since:
+                    del pending[path]
+                    yielded[path] = _stat_key(path)
+                    yield path
+
+            now = time.monotonic()
+            next_settled = min((since + settle_time for _, since in pending.values()), default=None)
+            if inotify is None:
+                wait_until = last_scan + poll_interval
+                if next_settled is not None:
+                    wait_until = min(wait_until, next_settled)
+                stop.wait(max(wait_until - now, 0.0))
+                if time.monotonic() - last_scan >= poll_interval:
+                    for path in scan():
+                        check(path, time.monotonic())
+                    last_scan = time.monotonic()
+                continue
+
+            # Checked every poll interval at least, so stop is noticed.
+            timeout = poll_interval if next_settled is None else max(min(next_settled - now, poll_interval), 0.0)
+            for path, mask in inotify.read(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("Missed file events, scanning the folders again")
+                    for scanned_path in scan():
+                        check(scanned_path, time.monotonic())
+                elif mask & IN_ISDIR:
+                    new_directory = mask & (IN_CREATE | IN_MOVED_TO)
+                    if recursive and new_directory and not _excluded(os.path.basename(path), exclude):
+                        watch_directories(path)
+                        for scanned in scan_files(path, extensions, recursive=recursive, exclude=exclude):
+                            check(scanned.path, time.monotonic())
+                elif not mask & IN_DELETE_SELF:
+                    check(path, time.monotonic())
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+
+def _excluded(name: str, exclude: list[str]) -> bool:
+    return any(fnmatch(name, pattern) for pattern in exclude)
+
+
+def _stat_key(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
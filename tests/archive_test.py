@@ -0,0 +1,90 @@
+import errno
+import os
+import shutil
+
+import pytest
+import soundfile as sf
+
+from audio_conversion_tools import archive
+from audio_conversion_tools.archive import COPIED, HARDLINKED, RENAMED, ArchiveError, copy_file, move_file
+from audio_conversion_tools.convert_audio import convert_wav_to_16bit
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """Makes every rename fail like it does between file systems."""
+
+    def rename(source, destination):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "rename", rename)
+
+
+@pytest.fixture
+def no_reflinks(monkeypatch):
+    monkeypatch.setattr(archive, "_reflink", lambda source, destination: False)
+
+
+def test_move_renames_within_a_file_system(tmp_path):
+    (tmp_path / "a.wav").write_bytes(b"audio")
+
+    assert move_file(tmp_path / "a.wav", tmp_path / "b.wav") == RENAMED
+    assert not (tmp_path / "a.wav").exists()
+    assert (tmp_path / "b.wav").read_bytes() == b"audio"
+
+
+def test_move_copies_across_file_systems(tmp_path, cross_device, no_reflinks):
+    content = os.urandom(3 * 2**20 + 17)
+    (tmp_path / "a.wav").write_bytes(content)
+
+    assert move_file(tmp_path / "a.wav", tmp_path / "b.wav", verify_contents=True) == COPIED
+    assert not (tmp_path / "a.wav").exists()
+    assert (tmp_path / "b.wav").read_bytes() == content
+
+
+def test_move_copies_without_kernel_copies(tmp_path, cross_device, no_reflinks, monkeypatch):
+    # Like on macOS, which has no copy_file_range and only sends files to sockets.
+    def sendfile(*args):
+        raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.setattr(os, "sendfile", sendfile)
+    content = os.urandom(2**20 + 17)
+    (tmp_path / "a.wav").write_bytes(content)
+
+    assert move_file(tmp_path / "a.wav", tmp_path / "b.wav", verify_contents=True) == COPIED
+    assert (tmp_path / "b.wav").read_bytes() == content
+
+
+def test_copy_hardlinks_only_when_allowed(tmp_path, no_reflinks):
+    (tmp_path / "a.wav").write_bytes(b"audio")
+
+    assert copy_file(tmp_path / "a.wav", tmp_path / "b.wav") == COPIED
+    assert not os.path.samefile(tmp_path / "a.wav", tmp_path / "b.wav")
+    assert copy_file(tmp_path / "a.wav", tmp_path / "c.wav", allow_hardlink=True) == HARDLINKED
+    assert os.path.samefile(tmp_path / "a.wav", tmp_path / "c.wav")
+
+
+def test_failed_verification_removes_the_copy(tmp_path, cross_device, no_reflinks, monkeypatch):
+    (tmp_path / "a.wav").write_bytes(b"audio")
+    monkeypatch.setattr(archive, "_stream_copy", lambda source, destination: open(destination, "wb").close())
+
+    with pytest.raises(ArchiveError):
+        move_file(tmp_path / "a.wav", tmp_path / "b.wav")
+
+    assert (tmp_path / "a.wav").read_bytes() == b"audio"
+    assert not (tmp_path / "b.wav").exists()
+
+
+def test_conversion_archives_across_file_systems(tmp_path, cross_device):
+    file_name = tmp_path / "silence.wav"
+    archive_location = tmp_path / "archive" / "silence.wav"
+    archive_location.parent.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+
+    assert convert_wav_to_16bit(str(file_name), str(archive_location))
+
+    assert sf.info(str(file_name)).subtype == "PCM_16"
+    assert sf.info(str(archive_location)).samplerate == 88200
@@ -0,0 +1,42 @@
+import json
+
+import soundfile as sf
+
+from audio_conversion_tools.bench import compare, make_corpus, make_rekordbox_xml, run_benchmarks, write_results
+from audio_conversion_tools.rekordbox.xml_reader import iter_tracks
+
+
+def test_make_corpus_mixes_formats(tmp_path):
+    files = make_corpus(tmp_path, num_files=40, duration=0.01)
+
+    infos = [sf.info(str(file_name)) for file_name in files]
+    assert {file_name.suffix for file_name in files} == {".wav", ".aiff", ".flac"}
+    assert {info.samplerate for info in infos} == {44100, 48000, 88200, 96000, 192000}
+    assert {info.subtype for info in infos} == {"PCM_16", "PCM_24", "PCM_32"}
+
+
+def test_make_rekordbox_xml(tmp_path):
+    make_rekordbox_xml(tmp_path / "rekordbox.xml", num_tracks=100)
+
+    tracks = list(iter_tracks(tmp_path / "rekordbox.xml"))
+    assert len(tracks) == 100
+    assert tracks[0].Location.startswith("Music/Synthetic/Track 0.")
+
+
+def test_run_benchmarks_writes_comparable_json(tmp_path):
+    results = run_benchmarks(num_files=3, collection_sizes=[100], duration=0.01, work_directory=tmp_path)
+    write_results(results, tmp_path / "bench.json")
+
+    with open(tmp_path / "bench.json") as results_file:
+        baseline = json.load(results_file)
+    assert results["convert"]["numpy"]["failed"] == 0
+    assert results["convert"]["ffmpeg"]["failed"] == 0
+    assert results["classify"]["100"]["tracks"] == 100
+    assert compare(results, baseline) == {
+        "probe.probes_per_second": 1.0,
+        "classify.100.tracks_per_second": 1.0,
+        "convert.ffmpeg.files_per_second": 1.0,
+        "convert.ffmpeg.realtime_factor": 1.0,
+        "convert.numpy.files_per_second": 1.0,
+        "convert.numpy.realtime_factor": 1.0,
+    }
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_conversion_tools import compatibility
+from audio_conversion_tools.compatibility import (
+    CONTAINERS,
+    CONVERT,
+    KEEP,
+    SKIP,
+    TRANSCODE,
+    Decision,
+    compatibility_table,
+    lookup,
+)
+from audio_conversion_tools.convert_audio import convert_wav_to_16bit, get_file_info
+from audio_conversion_tools.rekordbox.track_table import TrackTable
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+
+
+@pytest.mark.parametrize(
+    "profile, sample_rate, target_sample_rate",
+    [
+        ("cdj-2000", 44100, 44100),
+        ("cdj-2000", 96000, 48000),
+        ("cdj-2000", 176400, 44100),
+        ("cdj-2000", 192000, 48000),
+        ("cdj-2000", 352800, 44100),
+        ("cdj-2000", 32000, 48000),
+        ("cdj-2000", 22050, 44100),
+        ("cdj-3000", 192000, 96000),
+        ("cdj-3000", 176400, 88200),
+    ],
+)
+def test_every_sample_rate_has_a_target(profile, sample_rate, target_sample_rate):
+    assert lookup(profile, "wav", sample_rate, 32).sample_rate == target_sample_rate
+
+
+def test_decisions_per_profile():
+    assert lookup("cdj-2000", "aiff", 44100, 24) == Decision(KEEP, "aiff", 44100, 24)
+    assert lookup("16bit", "aiff", 44100, 24) == Decision(CONVERT, "aiff", 44100, 16)
+    assert lookup("cdj-2000", "wav", 44100, 32, "float") == Decision(CONVERT, "wav", 44100, 16)
+    assert lookup("cdj-2000", "flac", 44100, 16) == Decision(TRANSCODE, "aiff", 44100, 16)
+    assert lookup("cdj-2000nxs2", "flac", 44100, 16) == Decision(KEEP, "flac", 44100, 16)
+    assert lookup("cdj-2000nxs2", "flac", 96000, 24) == Decision(TRANSCODE, "aiff", 48000, 16)
+    assert lookup("cdj-2000", None, 96000, 24) == Decision(SKIP)
+
+    with pytest.raises(ValueError):
+        lookup("cdj-1000", "wav", 44100, 16)
+
+
+def test_vectorized_actions_match_the_decisions():
+    table = compatibility_table("cdj-2000")
+    rng = np.random.default_rng(0)
+    containers = rng.integers(0, len(CONTAINERS) + 1, 1000)
+    sample_rates = rng.choice([0, 12345, *compatibility.SAMPLE_RATES], 1000)
+    bit_depths = rng.choice([0, 20, *compatibility.BIT_DEPTHS], 1000)
+
+    actions = table.actions(containers, sample_rates, bit_depths)
+
+    for container, sample_rate, bit_depth, code in zip(containers, sample_rates, bit_depths, actions, strict=False):
+        container_name = CONTAINERS[container] if container < len(CONTAINERS) else None
+        # Unknown sample rates, like 0 when Rekordbox didn't analyze the file, are converted.
+        expected = compatibility.action(table.profile, container_name, int(sample_rate), int(bit_depth))
+        assert compatibility.ACTIONS[code] == expected
+
+
+def test_track_table_uses_the_profile():
+    tracks = [
+        TrackRecord("a.flac", "FLAC File", 44100, 1000, BitDepth=16),
+        TrackRecord("b.wav", "WAV File", 96000, 4608, BitDepth=24),
+        TrackRecord("c.aiff", "AIFF File", 44100, 2117, BitDepth=24),
+    ]
+
+    cdj_2000 = TrackTable.from_tracks(tracks)
+    cdj_3000 = TrackTable.from_tracks(tracks, "cdj-3000")
+    pcm16 = TrackTable.from_tracks(tracks, "16bit")
+
+    assert cdj_2000.flac_mask.tolist() == [True, False, False]
+    assert cdj_2000.unplayable_mask.tolist() == [False, True, False]
+    assert cdj_3000.flac_mask.tolist() == [False, False, False]
+    assert cdj_3000.unplayable_mask.tolist() == [False, False, False]
+    assert pcm16.unplayable_mask.tolist() == [False, True, True]
+
+
+@pytest.mark.parametrize("backend", ["ffmpeg", "numpy"])
+def test_upsampling_low_sample_rates(tmp_path, backend):
+    # The numpy backend only decimates, it leaves upsampling to ffmpeg.
+    file_name = tmp_path / "low.wav"
+    sf.write(file_name, np.zeros((2205, 2)), 22050, subtype="PCM_24")
+
+    assert convert_wav_to_16bit(file_name, tmp_path / "original.wav", backend=backend)
+
+    assert get_file_info(file_name) == (44100, 16)
@@ -0,0 +1,58 @@
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger, add_to_reverted_log
+from audio_conversion_tools.rekordbox.convert_audio import convert_files
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def _track(file_name: Path) -> SimpleNamespace:
+    # Rekordbox stores locations without the leading /
+    return SimpleNamespace(Location=str(file_name.absolute())[1:], Kind="WAV File")
+
+
+def test_converted_files_are_skipped_in_the_next_run(tmp_path, monkeypatch):
+    file_name = tmp_path / "library" / "silence.wav"
+    file_name.parent.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+
+    convert_files([_track(file_name)], archive_folder, jobs=1)
+    ledger = ConversionLedger(archive_folder)
+    assert file_name.absolute() in ledger
+    assert (archive_folder / "silence.wav").exists()
+
+    def fail_probe(*args, **kwargs):
+        raise AssertionError("Converted files should be skipped before probing")
+
+    monkeypatch.setattr("audio_conversion_tools.rekordbox.convert_audio.get_file_info", fail_probe)
+    convert_files([_track(file_name)], archive_folder, jobs=1)
+
+
+def test_reverted_files_are_removed_from_the_ledger(tmp_path):
+    ledger = ConversionLedger(tmp_path)
+    ledger.add("/music/a.wav", tmp_path / "a.wav", 96000, 24, 48000, 16)
+    ledger.add("/music/b.wav", tmp_path / "b.wav", 96000, 24, 48000, 16)
+
+    add_to_reverted_log(tmp_path, "/music/a.wav", str(tmp_path / "a.wav"))
+
+    ledger = ConversionLedger(tmp_path)
+    assert "/music/a.wav" not in ledger
+    assert "/music/b.wav" in ledger
+    assert len(ledger) == 1
+
+
+def test_malformed_rows_are_skipped(tmp_path):
+    ledger = ConversionLedger(tmp_path)
+    ledger.add("/music/a.wav", tmp_path / "a.wav", 96000, 24, 48000, 16)
+    with open(tmp_path / "converted.csv", "a") as f:
+        f.write("not a timestamp,/music/b.wav,/archive/b.wav\n")
+        f.write("2024-01-01 00:00:00,/music/c.wav\n")
+
+    ledger = ConversionLedger(tmp_path)
+
+    assert "/music/a.wav" in ledger
+    assert len(ledger) == 1
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+from pyrekordbox import Rekordbox6Database
+
+from audio_conversion_tools.rekordbox.classify import CollectionClassification, classify_tracks
+from audio_conversion_tools.rekordbox.db_reader import count_database_tracks, iter_database_tracks
+
+# FolderPath, FileType, SampleRate, BitDepth, BitRate, rb_local_deleted
+TRACKS = [
+    ("/Music/Label/Hi res.wav", 11, 96000, 24, 4608, 0),
+    ("/Music/Label/Playable.aiff", 12, 44100, 16, 1411, 0),
+    ("/Music/Label/32 bit.aiff", 12, 44100, 32, 2822, 0),
+    ("/Music/Label/Deleted.wav", 11, 96000, 24, 4608, 1),
+    ("/Music/Label/Flac.flac", 5, 44100, 16, 1000, 0),
+    ("/Music/Label/Mp3.mp3", 1, 44100, 0, 320, 0),
+]
+
+
+@pytest.fixture
+def rekordbox_db(tmp_path):
+    # An unencrypted database with only the columns of djmdContent that we read.
+    location = tmp_path / "master.db"
+    with sqlite3.connect(location) as connection:
+        connection.execute(
+            "CREATE TABLE djmdContent (ID VARCHAR(255) PRIMARY KEY, FolderPath VARCHAR(255), FileType INTEGER, "
+            "SampleRate INTEGER, BitDepth INTEGER, BitRate INTEGER, rb_local_deleted INTEGER)"
+        )
+        connection.executemany(
+            "INSERT INTO djmdContent VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(str(i), *track) for i, track in enumerate(TRACKS)],
+        )
+
+    db = Rekordbox6Database(path=location, unlock=False)
+    yield db
+    db.close()
+
+
+def test_iter_database_tracks(rekordbox_db):
+    tracks = list(iter_database_tracks(rekordbox_db))
+
+    assert sorted(track.Location for track in tracks) == [
+        "Music/Label/32 bit.aiff",
+        "Music/Label/Flac.flac",
+        "Music/Label/Hi res.wav",
+    ]
+    assert count_database_tracks(rekordbox_db) == (5, 3)
+
+    classification = CollectionClassification()
+    to_convert = list(classify_tracks(tracks, classification))
+    assert sorted(track.Location for track in to_convert) == ["Music/Label/32 bit.aiff", "Music/Label/Hi res.wav"]
+    assert [track.Location for track in classification.flac_files] == ["Music/Label/Flac.flac"]
@@ -0,0 +1,55 @@
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import soundfile as sf
+
+from audio_conversion_tools.dedup import SAMPLE_SIZE, ContentIndex, fingerprint, same_content
+from audio_conversion_tools.ffmpeg_runner import FfmpegRunner
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.convert_audio import convert_files
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def _track(file_name: Path) -> SimpleNamespace:
+    # Rekordbox stores locations without the leading /
+    return SimpleNamespace(Location=str(file_name.absolute())[1:], Kind="WAV File")
+
+
+def test_fingerprint_samples_and_full_hash_confirms(tmp_path):
+    content = bytearray(20 * SAMPLE_SIZE)
+    (tmp_path / "a.wav").write_bytes(content)
+    # Differs between the sampled chunks only.
+    content[2 * SAMPLE_SIZE + 1] = 1
+    (tmp_path / "b.wav").write_bytes(content)
+
+    assert fingerprint(tmp_path / "a.wav") == fingerprint(tmp_path / "b.wav")
+    assert not same_content(tmp_path / "a.wav", tmp_path / "b.wav")
+
+    index = ContentIndex()
+    claim, first = index.claim(tmp_path / "a.wav")
+    assert first
+    assert index.claim(tmp_path / "b.wav") == (claim, False)
+
+
+def test_same_content_is_converted_once(tmp_path, monkeypatch):
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+    files = [tmp_path / "promo" / "track.wav", tmp_path / "crate" / "track copy.wav", tmp_path / "label" / "other.wav"]
+    for file_name in files:
+        file_name.parent.mkdir()
+        shutil.copy(TEST_WAV_LOCATION, file_name)
+    commands = []
+    run = FfmpegRunner.run
+    monkeypatch.setattr(FfmpegRunner, "run", lambda self, cmd: commands.append(cmd) or run(self, cmd))
+
+    convert_files([_track(file_name) for file_name in files], archive_folder, jobs=3)
+
+    assert len(commands) == 1
+    ledger = ConversionLedger(archive_folder)
+    for file_name in files:
+        assert file_name.absolute() in ledger
+        assert sf.info(str(file_name)).subtype == "PCM_16"
+        assert same_content(archive_folder / file_name.name, TEST_WAV_LOCATION)
+    assert same_content(files[0], files[1])
@@ -0,0 +1,37 @@
+import threading
+
+from audio_conversion_tools.engine import run_jobs
+
+
+def test_run_jobs_aggregates_results():
+    def convert(item):
+        if item == 3:
+            raise ValueError("corrupt file")
+        return item % 2 == 0
+
+    summary = run_jobs(convert, range(6), jobs=3)
+
+    assert sorted(result.item for result in summary.succeeded) == [0, 2, 4]
+    assert sorted(result.item for result in summary.failed) == [1, 3, 5]
+    assert [result.error for result in summary.failed if result.item == 3] == ["corrupt file"]
+
+
+def test_run_jobs_limits_concurrency():
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def convert(_):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        threading.Event().wait(0.01)
+        with lock:
+            running -= 1
+        return True
+
+    summary = run_jobs(convert, range(20), jobs=2)
+
+    assert len(summary.succeeded) == 20
+    assert max_running <= 2
@@ -0,0 +1,102 @@
+import shutil
+import threading
+
+import soundfile as sf
+
+from audio_conversion_tools import convert_audio, ffmpeg_runner
+from audio_conversion_tools.convert_audio import FfmpegBatcher, convert_to_aiff, worker_threads
+from audio_conversion_tools.engine import run_jobs
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def _count_ffmpeg_processes(monkeypatch) -> list[list[str]]:
+    commands = []
+    run = ffmpeg_runner.FfmpegRunner.run
+
+    def counting_run(self, cmd):
+        commands.append(cmd)
+        return run(self, cmd)
+
+    monkeypatch.setattr(ffmpeg_runner.FfmpegRunner, "run", counting_run)
+    return commands
+
+
+def _copy_inputs(tmp_path, num_files):
+    file_names = [tmp_path / f"silence_{i}.wav" for i in range(num_files)]
+    for file_name in file_names:
+        shutil.copy(TEST_WAV_LOCATION, file_name)
+    return file_names
+
+
+def test_batch_converts_files_in_one_process(tmp_path, monkeypatch):
+    file_names = _copy_inputs(tmp_path, 4)
+    commands = _count_ffmpeg_processes(monkeypatch)
+    batcher = FfmpegBatcher(batch_size=4, max_wait=5)
+
+    summary = run_jobs(
+        lambda file_name: convert_to_aiff(str(file_name), batcher=batcher),
+        file_names,
+        jobs=worker_threads(1, batcher),
+    )
+
+    assert len(summary.succeeded) == 4
+    assert len(commands) == 1
+    for file_name in file_names:
+        info = sf.info(file_name.with_suffix(".aiff"))
+        assert (info.samplerate, info.subtype, info.frames) == (44100, "PCM_16", 4410)
+
+
+def test_failed_batch_is_retried_per_file(tmp_path, monkeypatch):
+    file_names = _copy_inputs(tmp_path, 3)
+    output_names = [str(file_name.with_suffix(".aiff")) for file_name in file_names]
+    output_names[1] = str(tmp_path / "missing_folder" / "silence_1.aiff")
+    commands = _count_ffmpeg_processes(monkeypatch)
+    batcher = FfmpegBatcher(batch_size=3, max_wait=5)
+
+    summary = run_jobs(
+        lambda i: convert_to_aiff(str(file_names[i]), output_names[i], batcher=batcher),
+        range(3),
+        jobs=worker_threads(1, batcher),
+    )
+
+    assert sorted(result.item for result in summary.succeeded) == [0, 2]
+    assert [result.item for result in summary.failed] == [1]
+    # One batch, then every file on its own.
+    assert len(commands) == 4
+
+
+def test_partial_batch_runs_after_max_wait(tmp_path, monkeypatch):
+    (file_name,) = _copy_inputs(tmp_path, 1)
+    commands = _count_ffmpeg_processes(monkeypatch)
+
+    assert convert_to_aiff(str(file_name), batcher=FfmpegBatcher(batch_size=8, max_wait=0.01))
+    assert len(commands) == 1
+
+
+def test_batch_errors_fail_every_file(tmp_path, monkeypatch):
+    file_names = _copy_inputs(tmp_path, 3)
+
+    def missing_ffmpeg(cmd, runner=None, ffmpeg_log=None):
+        raise FileNotFoundError("ffmpeg")
+
+    monkeypatch.setattr(convert_audio, "_run_ffmpeg", missing_ffmpeg)
+    batcher = FfmpegBatcher(batch_size=3, max_wait=5)
+    summaries = []
+
+    def run():
+        summaries.append(
+            run_jobs(
+                lambda file_name: convert_to_aiff(str(file_name), batcher=batcher),
+                file_names,
+                jobs=worker_threads(1, batcher),
+            )
+        )
+
+    # The threads that didn't run the batch would wait for their results forever.
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert len(summaries[0].failed) == 3
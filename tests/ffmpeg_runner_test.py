@@ -0,0 +1,103 @@
+import shutil
+import threading
+import time
+
+import pytest
+
+from audio_conversion_tools import ffmpeg_runner
+from audio_conversion_tools.convert_audio import convert_wav_to_16bit
+from audio_conversion_tools.engine import run_jobs
+from audio_conversion_tools.ffmpeg_runner import KILLED_RETURN_CODE, FfmpegRunner, open_ffmpeg_runner
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+# Generates silence forever, so it only stops when it is killed.
+ENDLESS_CMD = ["ffmpeg", "-hide_banner", "-f", "lavfi", "-i", "anullsrc", "-f", "null", "-"]
+
+
+def _wait_until_running(runner: FfmpegRunner, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while not runner.progress.running:
+        assert time.monotonic() < deadline, "ffmpeg did not start"
+        time.sleep(0.01)
+
+
+def test_progress_counts_audio_seconds():
+    with FfmpegRunner(progress_interval=None) as runner:
+        return_code, output = runner.run(
+            ["ffmpeg", "-hide_banner", "-f", "lavfi", "-i", "sine=duration=2", "-f", "null", "-"]
+        )
+
+    assert return_code == 0
+    assert runner.progress.finished == 1
+    assert runner.progress.failed == 0
+    assert runner.progress.audio_seconds == pytest.approx(2, abs=0.1)
+    assert "x realtime" in runner.progress.summary()
+
+
+def test_timeout_kills_ffmpeg():
+    with FfmpegRunner(timeout=0.5, progress_interval=None) as runner:
+        start = time.monotonic()
+        return_code, output = runner.run(ENDLESS_CMD)
+
+    assert time.monotonic() - start < 10
+    assert return_code != 0
+    assert "timeout" in output
+    assert runner.progress.failed == 1
+
+
+def test_cancel_kills_running_and_pending_processes():
+    with FfmpegRunner(max_processes=1, progress_interval=None) as runner:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(runner.run(ENDLESS_CMD))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        _wait_until_running(runner)
+
+        runner.cancel()
+        for thread in threads:
+            thread.join(timeout=10)
+
+    assert len(results) == 2
+    assert all(return_code != 0 for return_code, _ in results)
+    # The second process never started because of max_processes.
+    assert (KILLED_RETURN_CODE, "Cancelled before ffmpeg started") in results
+
+
+def test_interrupt_rolls_back_running_conversions(tmp_path, monkeypatch):
+    file_name = tmp_path / "silence.wav"
+    temp_location = tmp_path / "archive.wav"
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+
+    # The conversion hangs until it is cancelled.
+    run = FfmpegRunner.run
+    monkeypatch.setattr(FfmpegRunner, "run", lambda self, cmd: run(self, ENDLESS_CMD))
+
+    with open_ffmpeg_runner(progress_interval=None) as runner:
+
+        def items():
+            yield str(file_name)
+            _wait_until_running(runner)
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            run_jobs(lambda name: convert_wav_to_16bit(name, str(temp_location)), items(), jobs=1)
+
+    assert file_name.exists()
+    assert not temp_location.exists()
+    assert ffmpeg_runner.current_runner() is not runner
+
+
+def test_default_runner_is_replaced_after_cancel(tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg_runner, "_current_runner", None)
+    monkeypatch.setattr(ffmpeg_runner, "_default_runner", None)
+    file_name = tmp_path / "silence.wav"
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    default_runner = ffmpeg_runner.current_runner()
+
+    ffmpeg_runner.cancel_all()
+
+    assert default_runner.run(ENDLESS_CMD) == (KILLED_RETURN_CODE, "Cancelled before ffmpeg started")
+    assert ffmpeg_runner.current_runner() is not default_runner
+    assert convert_wav_to_16bit(str(file_name), str(tmp_path / "archive.wav"))
+    default_runner.close()
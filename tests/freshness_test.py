@@ -0,0 +1,81 @@
+import os
+
+from audio_conversion_tools.freshness import MANIFEST_NAME, Manifest
+
+
+def _write(file_name, content: bytes, mtime_ns: int) -> None:
+    file_name.write_bytes(content)
+    os.utime(file_name, ns=(mtime_ns, mtime_ns))
+
+
+def test_target_newer_than_source_is_fresh(tmp_path):
+    source, target = tmp_path / "track.wav", tmp_path / "track.aiff"
+    manifest = Manifest(tmp_path)
+    assert not manifest.is_fresh(source, target)
+
+    _write(source, b"source", 1_000_000_000)
+    assert not manifest.is_fresh(source, target)
+
+    _write(target, b"", 2_000_000_000)
+    assert not manifest.is_fresh(source, target)
+
+    _write(target, b"target", 2_000_000_000)
+    assert manifest.is_fresh(source, target)
+
+    _write(source, b"source", 3_000_000_000)
+    assert not manifest.is_fresh(source, target)
+
+
+def test_manifest_detects_replaced_source(tmp_path):
+    source, target = tmp_path / "track.wav", tmp_path / "track.aiff"
+    _write(source, b"source", 1_000_000_000)
+    _write(target, b"target", 2_000_000_000)
+
+    manifest = Manifest(tmp_path)
+    manifest.add(source, target)
+    manifest.save()
+    assert (tmp_path / MANIFEST_NAME).exists()
+
+    # Replaced by an older file, which the modification times alone don't catch.
+    _write(source, b"other source", 1_500_000_000)
+    assert not Manifest(tmp_path).is_fresh(source, target)
+
+
+def test_hash_skips_touched_source(tmp_path):
+    source, target = tmp_path / "track.wav", tmp_path / "track.aiff"
+    _write(source, b"source", 1_000_000_000)
+    _write(target, b"target", 3_000_000_000)
+
+    manifest = Manifest(tmp_path, hash_sources=True)
+    manifest.add(source, target)
+    manifest.save()
+
+    _write(source, b"source", 2_000_000_000)
+    assert not Manifest(tmp_path).is_fresh(source, target)
+    assert Manifest(tmp_path, hash_sources=True).is_fresh(source, target)
+
+    _write(source, b"sourcf", 2_000_000_000)
+    assert not Manifest(tmp_path, hash_sources=True).is_fresh(source, target)
+
+
+def test_hash_skips_source_touched_after_the_target(tmp_path):
+    source, target = tmp_path / "track.wav", tmp_path / "track.aiff"
+    _write(source, b"source", 1_000_000_000)
+    _write(target, b"target", 2_000_000_000)
+
+    manifest = Manifest(tmp_path, hash_sources=True)
+    manifest.add(source, target)
+    manifest.save()
+
+    _write(source, b"source", 3_000_000_000)
+    assert not Manifest(tmp_path).is_fresh(source, target)
+    assert Manifest(tmp_path, hash_sources=True).is_fresh(source, target)
+
+
+def test_corrupt_manifest_falls_back_to_modification_times(tmp_path):
+    (tmp_path / MANIFEST_NAME).write_text("{")
+    source, target = tmp_path / "track.wav", tmp_path / "track.aiff"
+    _write(source, b"source", 1_000_000_000)
+    _write(target, b"target", 2_000_000_000)
+
+    assert Manifest(tmp_path).is_fresh(source, target)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_conversion_tools.convert_audio import get_file_info, probe_file
+from audio_conversion_tools.header_probe import UnsupportedHeader, read_header
+
+FORMATS = [
+    ("wav", "WAV", "PCM_U8"),
+    ("wav", "WAV", "PCM_16"),
+    ("wav", "WAV", "PCM_24"),
+    ("wav", "WAV", "PCM_32"),
+    ("wav", "WAV", "FLOAT"),
+    ("wav", "WAV", "DOUBLE"),
+    ("wav", "WAVEX", "PCM_24"),
+    ("wav", "WAVEX", "FLOAT"),
+    ("wav", "RF64", "PCM_24"),
+    ("aiff", "AIFF", "PCM_S8"),
+    ("aiff", "AIFF", "PCM_16"),
+    ("aiff", "AIFF", "PCM_24"),
+    ("aiff", "AIFF", "PCM_32"),
+    ("aiff", "AIFF", "FLOAT"),
+    ("aiff", "AIFF", "DOUBLE"),
+    ("flac", "FLAC", "PCM_S8"),
+    ("flac", "FLAC", "PCM_16"),
+    ("flac", "FLAC", "PCM_24"),
+]
+
+
+@pytest.mark.parametrize("extension,file_format,subtype", FORMATS)
+@pytest.mark.parametrize("sample_rate", [44100, 96000, 176400])
+def test_read_header_matches_soundfile(tmp_path, extension, file_format, subtype, sample_rate):
+    file_name = tmp_path / f"test.{extension}"
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, (1001, 2))
+    sf.write(file_name, samples, sample_rate, format=file_format, subtype=subtype)
+
+    header = read_header(file_name)
+    info = sf.info(file_name)
+
+    assert (header.sample_rate, header.subtype, header.channels, header.frames) == (
+        info.samplerate,
+        info.subtype,
+        info.channels,
+        info.frames,
+    )
+
+
+def test_get_file_info_handles_float_and_8_bit(tmp_path):
+    samples = np.zeros((100, 1))
+    sf.write(tmp_path / "float.wav", samples, 48000, subtype="FLOAT")
+    sf.write(tmp_path / "8bit.wav", samples, 44100, subtype="PCM_U8")
+
+    assert get_file_info(str(tmp_path / "float.wav")) == (48000, 32)
+    assert get_file_info(str(tmp_path / "8bit.wav")) == (44100, 8)
+
+
+def test_unknown_containers_fall_back_to_soundfile(tmp_path):
+    file_name = tmp_path / "test.w64"
+    sf.write(file_name, np.zeros((100, 2)), 48000, format="W64", subtype="PCM_24")
+
+    with pytest.raises(UnsupportedHeader):
+        read_header(file_name)
+    assert probe_file(str(file_name)).subtype == "PCM_24"
@@ -0,0 +1,137 @@
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+from audio_conversion_tools import journal
+from audio_conversion_tools.journal import JOURNAL_NAME, ConversionJournal, open_journal, read_journal, unfinished
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.convert_audio import convert_files, resume_conversions
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def _track(file_name: Path) -> SimpleNamespace:
+    # Rekordbox stores locations without the leading /
+    return SimpleNamespace(Location=str(file_name.absolute())[1:], Kind="WAV File")
+
+
+def _planned(conversion_journal: ConversionJournal, file_name: Path, archive_location: Path, state: str) -> None:
+    conversion_journal.record(
+        journal.PLANNED,
+        file_name,
+        location_within_archive_folder=archive_location,
+        input_sample_rate=88200,
+        input_bit_depth=24,
+        output_sample_rate=44100,
+        output_bit_depth=16,
+    )
+    if state != journal.PLANNED:
+        conversion_journal.record(state, file_name)
+
+
+def test_durable_records_are_on_disk(tmp_path):
+    with ConversionJournal(tmp_path / JOURNAL_NAME, flush_interval=60) as conversion_journal:
+        conversion_journal.record(journal.PLANNED, "/music/a.wav", durable=True, input_sample_rate=96000)
+        assert read_journal(tmp_path / JOURNAL_NAME) == {
+            "/music/a.wav": {"state": journal.PLANNED, "file": "/music/a.wav", "input_sample_rate": 96000}
+        }
+        conversion_journal.record(journal.ARCHIVED, "/music/a.wav")
+
+    # A record cut off by a crash is ignored.
+    with open(tmp_path / JOURNAL_NAME, "a") as journal_file:
+        journal_file.write('{"state": "committed", "fi')
+    assert read_journal(tmp_path / JOURNAL_NAME)["/music/a.wav"]["state"] == journal.ARCHIVED
+
+
+def test_conversion_records_every_state(tmp_path, monkeypatch):
+    file_name = tmp_path / "library" / "silence.wav"
+    file_name.parent.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+    states = []
+    record = ConversionJournal.record
+    monkeypatch.setattr(
+        ConversionJournal,
+        "record",
+        lambda self, state, *args, **kwargs: states.append(state) or record(self, state, *args, **kwargs),
+    )
+
+    with open_journal(archive_folder) as conversion_journal:
+        convert_files([_track(file_name)], archive_folder, jobs=1, conversion_journal=conversion_journal)
+
+    assert states == [journal.PLANNED, journal.ARCHIVED, journal.ENCODING, journal.ENCODED, journal.COMMITTED]
+    # Nothing was left unfinished, so the journal is removed.
+    assert not (archive_folder / JOURNAL_NAME).exists()
+
+
+def test_resume_finishes_or_rolls_back(tmp_path):
+    library = tmp_path / "library"
+    archive_folder = tmp_path / "archive"
+    library.mkdir()
+    archive_folder.mkdir()
+    for name in ["encoding.wav", "encoded.wav", "copying.wav"]:
+        shutil.copy(TEST_WAV_LOCATION, archive_folder / name)
+    # Partial and complete conversions, and the original of a copy to the archive that was cut off.
+    (library / "encoding.wav").write_bytes(b"partial")
+    (library / "encoded.wav").write_bytes(b"converted")
+    shutil.copy(TEST_WAV_LOCATION, library / "copying.wav")
+
+    with ConversionJournal(archive_folder / JOURNAL_NAME) as conversion_journal:
+        _planned(conversion_journal, library / "encoding.wav", archive_folder / "encoding.wav", journal.ENCODING)
+        _planned(conversion_journal, library / "encoded.wav", archive_folder / "encoded.wav", journal.ENCODED)
+        _planned(conversion_journal, library / "copying.wav", archive_folder / "copying.wav", journal.PLANNED)
+
+    with ConversionJournal(archive_folder / JOURNAL_NAME) as conversion_journal:
+        resume_conversions(archive_folder, ConversionLedger(archive_folder), conversion_journal)
+
+    original = Path(TEST_WAV_LOCATION).read_bytes()
+    assert (library / "encoding.wav").read_bytes() == original
+    assert not (archive_folder / "encoding.wav").exists()
+    assert (library / "encoded.wav").read_bytes() == b"converted"
+    assert library / "encoded.wav" in ConversionLedger(archive_folder)
+    assert (library / "copying.wav").read_bytes() == original
+    assert not (archive_folder / "copying.wav").exists()
+    assert unfinished(archive_folder / JOURNAL_NAME) == {}
+
+
+def test_encoded_is_on_disk_before_the_ledger_row(tmp_path, monkeypatch):
+    file_name = tmp_path / "library" / "silence.wav"
+    file_name.parent.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+    states_on_disk = []
+    add = ConversionLedger.add
+
+    def add_after_crash_point(self, file_location, **conversion):
+        states_on_disk.append(read_journal(archive_folder / JOURNAL_NAME)[str(file_location)]["state"])
+        add(self, file_location, **conversion)
+
+    monkeypatch.setattr(ConversionLedger, "add", add_after_crash_point)
+
+    with ConversionJournal(archive_folder / JOURNAL_NAME, flush_interval=60) as conversion_journal:
+        convert_files([_track(file_name)], archive_folder, jobs=1, conversion_journal=conversion_journal)
+
+    assert states_on_disk == [journal.ENCODED]
+
+
+def test_resume_reverts_rolled_back_conversions_in_the_ledger(tmp_path):
+    library = tmp_path / "library"
+    archive_folder = tmp_path / "archive"
+    library.mkdir()
+    archive_folder.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, archive_folder / "encoding.wav")
+    (library / "encoding.wav").write_bytes(b"converted")
+    ledger = ConversionLedger(archive_folder)
+    ledger.add(library / "encoding.wav", archive_folder / "encoding.wav", 88200, 24, 44100, 16)
+
+    with ConversionJournal(archive_folder / JOURNAL_NAME) as conversion_journal:
+        _planned(conversion_journal, library / "encoding.wav", archive_folder / "encoding.wav", journal.ENCODING)
+
+    with ConversionJournal(archive_folder / JOURNAL_NAME) as conversion_journal:
+        resume_conversions(archive_folder, ledger, conversion_journal)
+
+    assert (library / "encoding.wav").read_bytes() == Path(TEST_WAV_LOCATION).read_bytes()
+    assert library / "encoding.wav" not in ledger
+    assert library / "encoding.wav" not in ConversionLedger(archive_folder)
@@ -0,0 +1,80 @@
+import json
+import pstats
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from audio_conversion_tools import metrics
+from audio_conversion_tools.convert_audio import convert_wav_to_16bit
+from audio_conversion_tools.metrics import open_metrics, profile, timed_iter, timer
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def test_timer_only_records_within_open_metrics():
+    with timer("probe", "a.wav"):
+        pass
+
+    with open_metrics() as run_metrics:
+        for i in range(100):
+            run_metrics.record("probe", i / 100, item=f"{i % 10}.wav")
+        with timer("ffmpeg", "9.wav"):
+            pass
+        metrics.count("failed_conversions", 2)
+
+    report = run_metrics.report(slowest=2)
+    assert report["stages"]["probe"]["count"] == 100
+    assert report["stages"]["probe"]["p50_seconds"] == pytest.approx(0.495)
+    assert report["stages"]["probe"]["max_seconds"] == pytest.approx(0.99)
+    assert report["stages"]["ffmpeg"]["count"] == 1
+    assert report["counters"] == {"failed_conversions": 2}
+    assert [item["file"] for item in report["slowest_files"]] == ["9.wav", "8.wav"]
+
+    # Outside the block nothing is recorded anymore.
+    with timer("probe"):
+        pass
+    assert run_metrics.report()["stages"]["probe"]["count"] == 100
+
+
+def test_timed_iter_times_the_reader():
+    with open_metrics() as run_metrics:
+        assert list(timed_iter("read_collection", range(3))) == [0, 1, 2]
+
+    # Three items and the final StopIteration.
+    assert run_metrics.report()["stages"]["read_collection"]["count"] == 4
+
+
+def test_conversion_writes_report(tmp_path):
+    file_name = tmp_path / "silence.wav"
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    size = file_name.stat().st_size
+
+    with open_metrics(tmp_path / "run_report.json"):
+        assert convert_wav_to_16bit(str(file_name), str(tmp_path / "archive.wav"))
+
+    with open(tmp_path / "run_report.json") as report_file:
+        report = json.load(report_file)
+    assert {"probe", "archive", "ffmpeg"} <= set(report["stages"])
+    assert report["bytes_processed"] == size
+    assert report["slowest_files"][0]["file"] == str(file_name)
+
+
+def test_profile_writes_to_directory(tmp_path):
+    with profile(tmp_path):
+        sum(range(1000))
+
+    assert (tmp_path / "profile.prof").exists()
+    assert (tmp_path / "tracemalloc.txt").read_text().startswith("Peak traced memory")
+
+
+def _work_in_thread() -> int:
+    return sum(range(1000))
+
+
+def test_profile_covers_worker_threads(tmp_path):
+    with profile(tmp_path), ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(lambda _: _work_in_thread(), range(4))) == [499500] * 4
+
+    functions = {function for _, _, function in pstats.Stats(str(tmp_path / "profile.prof")).stats}
+    assert "_work_in_thread" in functions
@@ -0,0 +1,138 @@
+import shutil
+import subprocess
+import sys
+import textwrap
+
+import mutagen
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_conversion_tools.convert_audio import convert_aif_to_16bit, convert_to_aiff, get_file_info
+from audio_conversion_tools.numpy_backend import StreamingDecimator, convert_file, decimate
+
+TEST_AIFF_LOCATION = "tests/test_audio/silence.aiff"
+
+
+def _write_sine(file_name, sample_rate, subtype, seconds=0.5, frequency=1000.0):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    tone = 0.5 * np.sin(2 * np.pi * frequency * t)
+    sf.write(file_name, np.stack([tone, -tone], axis=1), sample_rate, subtype=subtype)
+
+
+@pytest.mark.parametrize("sample_rate,target_sample_rate", [(88200, 44100), (96000, 48000), (192000, 48000)])
+def test_numpy_backend_matches_ffmpeg(tmp_path, sample_rate, target_sample_rate):
+    source = tmp_path / "sine.wav"
+    _write_sine(source, sample_rate, "PCM_24")
+
+    assert convert_to_aiff(str(source), str(tmp_path / "ffmpeg.aiff"), backend="ffmpeg")
+    assert convert_to_aiff(str(source), str(tmp_path / "numpy.aiff"), backend="numpy")
+
+    ffmpeg_samples, ffmpeg_rate = sf.read(tmp_path / "ffmpeg.aiff")
+    numpy_samples, numpy_rate = sf.read(tmp_path / "numpy.aiff")
+
+    assert sf.info(tmp_path / "numpy.aiff").subtype == "PCM_16"
+    assert numpy_rate == ffmpeg_rate == target_sample_rate
+    assert abs(len(numpy_samples) - len(ffmpeg_samples)) <= 2
+
+    # Ignore the edges, where both resamplers see zero padding.
+    middle = slice(1000, min(len(numpy_samples), len(ffmpeg_samples)) - 1000)
+    difference = numpy_samples[middle] - ffmpeg_samples[middle]
+    assert np.sqrt(np.mean(difference**2)) < 1e-3
+
+
+def test_convert_aiff_with_numpy_backend(tmp_path):
+    file_name = str(tmp_path / "silence.aiff")
+    shutil.copy(TEST_AIFF_LOCATION, file_name)
+
+    assert convert_aif_to_16bit(file_name, backend="numpy")
+
+    assert get_file_info(file_name) == (44100, 16)
+    assert get_file_info(str(tmp_path / "silence_temp.aiff")) == (88200, 32)
+
+
+def test_decimate_keeps_passband_and_removes_aliases():
+    sample_rate = 96000
+    t = np.arange(sample_rate) / sample_rate
+    passband = np.sin(2 * np.pi * 10000 * t)
+    alias = np.sin(2 * np.pi * 30000 * t)  # would fold back to 18 kHz at 48 kHz
+
+    decimated_passband = decimate(passband[:, None], 2)[1000:-1000, 0]
+    decimated_alias = decimate(alias[:, None], 2)[1000:-1000, 0]
+
+    assert np.sqrt(np.mean(decimated_passband**2)) == pytest.approx(np.sqrt(0.5), rel=1e-3)
+    assert np.max(np.abs(decimated_alias)) < 1e-3
+
+
+@pytest.mark.parametrize("factor", [1, 2, 4])
+def test_streaming_decimation_is_bit_identical(factor):
+    samples = np.random.default_rng(1).uniform(-1, 1, (10007, 2))
+
+    decimator = StreamingDecimator(factor, 2)
+    blocks = [decimator.process(samples[start : start + 333]) for start in range(0, len(samples), 333)]
+    streamed = np.concatenate([*blocks, decimator.flush()])
+
+    assert np.array_equal(streamed, decimate(samples, factor))
+
+
+def test_streaming_conversion_is_bit_identical(tmp_path):
+    source = tmp_path / "sine.wav"
+    _write_sine(source, 192000, "PCM_32", seconds=1.0)
+
+    convert_file(source, tmp_path / "single_shot.aiff", 48000, block_size=2**20, max_memory=2**30)
+    convert_file(source, tmp_path / "streamed.aiff", 48000, block_size=1500)
+
+    single_shot, _ = sf.read(tmp_path / "single_shot.aiff", dtype="int16")
+    streamed, _ = sf.read(tmp_path / "streamed.aiff", dtype="int16")
+    assert np.array_equal(single_shot, streamed)
+
+
+def test_streaming_conversion_has_bounded_memory(tmp_path):
+    # 30 seconds of 32 bit / 192kHz stereo, which would take ~90MB once decoded to float64 in one go.
+    source = tmp_path / "long.wav"
+    with sf.SoundFile(source, "w", samplerate=192000, channels=2, subtype="PCM_32") as long_file:
+        for _ in range(30):
+            long_file.write(np.random.default_rng(0).uniform(-0.5, 0.5, (192000, 2)))
+
+    script = textwrap.dedent(
+        f"""
+        import resource
+        import numpy as np
+        import soundfile
+        from audio_conversion_tools.numpy_backend import convert_file
+
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        convert_file({str(source)!r}, {str(tmp_path / "long.aiff")!r}, 48000, max_memory=16 * 2**20)
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+        """
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+
+    peak_rss_increase_kb = int(result.stdout.strip())
+    assert peak_rss_increase_kb < 32 * 1024
+    assert sf.info(tmp_path / "long.aiff").frames == 30 * 48000
+
+
+def test_failed_numpy_conversion_moves_the_original_back(tmp_path, monkeypatch):
+    file_name = tmp_path / "silence.aiff"
+    shutil.copy(TEST_AIFF_LOCATION, file_name)
+    temp_location = tmp_path / "archive.aiff"
+
+    def fail_copy_tags(*args):
+        raise mutagen.MutagenError("corrupt tags")
+
+    monkeypatch.setattr("audio_conversion_tools.numpy_backend._copy_tags", fail_copy_tags)
+
+    assert not convert_aif_to_16bit(str(file_name), str(temp_location), backend="numpy")
+    assert not temp_location.exists()
+    assert get_file_info(str(file_name)) == (88200, 32)
+
+
+def test_unknown_backend_moves_the_original_back(tmp_path):
+    file_name = tmp_path / "silence.aiff"
+    shutil.copy(TEST_AIFF_LOCATION, file_name)
+    temp_location = tmp_path / "archive.aiff"
+
+    assert not convert_aif_to_16bit(str(file_name), str(temp_location), backend="nympy")
+    assert not temp_location.exists()
+    assert get_file_info(str(file_name)) == (88200, 32)
@@ -0,0 +1,128 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import soundfile as sf
+
+from audio_conversion_tools.convert_audio import ConversionError
+from audio_conversion_tools.dedup import same_content
+from audio_conversion_tools.journal import COMMITTED, ConversionJournal, read_journal
+from audio_conversion_tools.pipeline import PipelineConfig, Stage, run_pipeline
+from audio_conversion_tools.rekordbox import convert_audio as rekordbox_convert_audio
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.convert_audio import convert_files
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def _track(file_name: Path) -> SimpleNamespace:
+    # Rekordbox stores locations without the leading /
+    return SimpleNamespace(Location=str(file_name.absolute())[1:], Kind="WAV File")
+
+
+def test_run_pipeline_runs_items_through_all_stages():
+    def check(item):
+        if item == 3:
+            raise ValueError("corrupt file")
+        # Odd items are finished early.
+        return item % 2 == 1 or item
+
+    summary = run_pipeline(
+        range(8),
+        [
+            Stage("double", lambda item: item * 2 if item != 5 else False, workers=2),
+            Stage("check", check, workers=3),
+            Stage("last", lambda item: item % 4 == 0, workers=1),
+        ],
+    )
+
+    assert sorted(result.item for result in summary.succeeded) == [0, 2, 4, 6]
+    assert sorted(result.item for result in summary.failed) == [1, 3, 5, 7]
+
+
+def test_run_pipeline_reports_errors():
+    def fail(item):
+        raise ValueError(f"corrupt file {item}")
+
+    summary = run_pipeline(range(3), [Stage("read", lambda item: item, workers=1), Stage("fail", fail, workers=2)])
+
+    assert sorted(result.error for result in summary.failed) == [f"corrupt file {i}" for i in range(3)]
+
+
+def test_run_pipeline_bounds_the_items_in_flight():
+    taken = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def items():
+        nonlocal taken
+        for i in range(20):
+            with lock:
+                taken += 1
+            yield i
+
+    def slow(item):
+        nonlocal max_in_flight
+        with lock:
+            max_in_flight = max(max_in_flight, taken - item)
+        time.sleep(0.01)
+        return True
+
+    summary = run_pipeline(
+        items(),
+        [Stage("read", lambda item: item, workers=1, queue_size=1), Stage("slow", slow, workers=1, queue_size=1)],
+    )
+
+    assert len(summary.succeeded) == 20
+    # One item in every queue and in every worker, plus the one that is waiting to be put in the first queue.
+    assert max_in_flight <= 5
+
+
+@pytest.mark.parametrize("backend", ["ffmpeg", "numpy"])
+def test_pipelined_conversion(tmp_path, backend):
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+    files = [tmp_path / "library" / f"track {i}.wav" for i in range(4)]
+    files[0].parent.mkdir()
+    for file_name in files:
+        shutil.copy(TEST_WAV_LOCATION, file_name)
+
+    with ConversionJournal(tmp_path / "journal.jsonl") as conversion_journal:
+        convert_files(
+            [_track(file_name) for file_name in files],
+            archive_folder,
+            jobs=2,
+            backend=backend,
+            conversion_journal=conversion_journal,
+            pipeline=PipelineConfig(io_jobs=2, queue_size=1, scratch_budget=1),
+        )
+
+    ledger = ConversionLedger(archive_folder)
+    for file_name in files:
+        assert file_name.absolute() in ledger
+        assert sf.info(str(file_name)).subtype == "PCM_16"
+        assert same_content(archive_folder / file_name.name, TEST_WAV_LOCATION)
+    records = read_journal(tmp_path / "journal.jsonl")
+    assert len(records) == 4
+    assert all(record["state"] == COMMITTED for record in records.values())
+
+
+def test_pipelined_conversion_rolls_back_failures(tmp_path, monkeypatch):
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+    file_name = tmp_path / "track.wav"
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+
+    def fail(*args):
+        raise ConversionError("corrupt file")
+
+    monkeypatch.setattr(rekordbox_convert_audio, "encode_16bit", fail)
+
+    convert_files([_track(file_name)], archive_folder, pipeline=PipelineConfig())
+
+    assert same_content(file_name, TEST_WAV_LOCATION)
+    assert not (archive_folder / file_name.name).exists()
+    assert file_name.absolute() not in ConversionLedger(archive_folder)
@@ -0,0 +1,148 @@
+import shutil
+from dataclasses import replace
+from pathlib import Path
+
+import soundfile as sf
+
+from audio_conversion_tools import journal
+from audio_conversion_tools.journal import ConversionJournal
+from audio_conversion_tools.plan import (
+    AIFF_TO_16BIT,
+    LOSSLESS_TO_AIFF,
+    REKORDBOX_CONVERT,
+    PlanEntry,
+    PlanHeader,
+    execute_plan,
+    in_shard,
+    parse_shard,
+    plan_folder,
+    plan_rekordbox,
+    read_plan,
+    read_plan_header,
+    write_plan,
+)
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+TEST_AIFF_LOCATION = "tests/test_audio/silence.aiff"
+
+
+def _entry(source: str) -> PlanEntry:
+    return PlanEntry(
+        source=source,
+        action=LOSSLESS_TO_AIFF,
+        output=source + ".aiff",
+        target_format="aiff",
+        target_sample_rate=44100,
+        source_sample_rate=88200,
+        source_bit_depth=24,
+        estimated_output_bytes=100,
+        estimated_cost_seconds=0.1,
+    )
+
+
+def test_plan_round_trips_through_jsonl(tmp_path):
+    entries = [_entry(f"/music/{i}.wav") for i in range(3)]
+
+    assert write_plan(entries, tmp_path / "plan.jsonl") == 3
+    assert list(read_plan(tmp_path / "plan.jsonl")) == entries
+
+
+def test_shards_partition_the_plan():
+    entries = [_entry(f"/music/{i}.wav") for i in range(100)]
+    num_shards = 4
+
+    shards = [[entry for entry in entries if in_shard(entry, index, num_shards)] for index in range(num_shards)]
+
+    assert sorted(entry.source for shard in shards for entry in shard) == sorted(entry.source for entry in entries)
+    assert all(shard for shard in shards)
+    assert parse_shard("3/4") == (3, 4)
+
+
+def test_shards_keep_archive_names_together():
+    entries = [
+        replace(_entry(f"/music/{folder}/{i}.wav"), action=REKORDBOX_CONVERT, archive_folder="/archive")
+        for folder in ["a", "b"]
+        for i in range(20)
+    ]
+    num_shards = 4
+
+    for i in range(20):
+        a, b = (entry for entry in entries if entry.source.endswith(f"/{i}.wav"))
+        # Both would be archived as /archive/{i}.wav, so they should never be converted by different processes.
+        assert [in_shard(a, index, num_shards) for index in range(num_shards)] == [
+            in_shard(b, index, num_shards) for index in range(num_shards)
+        ]
+
+
+def test_plan_folder_only_probes(tmp_path):
+    shutil.copy(TEST_WAV_LOCATION, tmp_path / "silence.wav")
+
+    (entry,) = plan_folder(tmp_path, LOSSLESS_TO_AIFF, recursive=True)
+
+    assert entry.source == str(tmp_path / "silence.wav")
+    assert entry.output == str(tmp_path / "silence.aiff")
+    assert (entry.source_sample_rate, entry.target_sample_rate) == (88200, 44100)
+    # 8820 frames at 88.2kHz become 4410 mono 16 bit frames.
+    assert entry.estimated_output_bytes == 4410 * 2 + 54
+    assert not (tmp_path / "silence.aiff").exists()
+
+
+def test_execute_folder_plan(tmp_path):
+    file_name = tmp_path / "silence.aiff"
+    shutil.copy(TEST_AIFF_LOCATION, file_name)
+    entries = list(plan_folder(tmp_path, AIFF_TO_16BIT, recursive=True))
+
+    summary = execute_plan(entries, jobs=1, delete_originals=True)
+
+    assert len(entries) == len(summary.succeeded) == 1
+    assert sf.info(file_name).subtype == "PCM_16"
+    assert not (tmp_path / "silence_temp.aiff").exists()
+
+
+def test_execute_rekordbox_plan(tmp_path):
+    file_name = tmp_path / "library" / "silence.wav"
+    file_name.parent.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    archive_folder = tmp_path / "archive"
+    track = TrackRecord(Location=str(file_name)[1:], Kind="WAV File", SampleRate=88200, BitRate=2822)
+
+    (entry,) = plan_rekordbox([track], archive_folder)
+    assert entry.action == REKORDBOX_CONVERT
+    assert not (archive_folder / "silence.wav").exists()
+
+    execute_plan([entry], jobs=1)
+
+    assert Path(file_name) in ConversionLedger(archive_folder)
+    assert (archive_folder / "silence.wav").exists()
+    assert sf.info(file_name).samplerate == 44100
+
+
+def test_execute_plan_for_its_device(tmp_path, monkeypatch):
+    file_name = tmp_path / "library" / "silence.wav"
+    file_name.parent.mkdir()
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    archive_folder = tmp_path / "archive"
+    track = TrackRecord(Location=str(file_name)[1:], Kind="WAV File", SampleRate=88200, BitRate=2822, BitDepth=32)
+    states = []
+    record = ConversionJournal.record
+    monkeypatch.setattr(
+        ConversionJournal,
+        "record",
+        lambda self, state, *args, **kwargs: states.append(state) or record(self, state, *args, **kwargs),
+    )
+
+    write_plan(
+        plan_rekordbox([track], archive_folder, profile="cdj-3000"), tmp_path / "plan.jsonl", PlanHeader("cdj-3000")
+    )
+    header = read_plan_header(tmp_path / "plan.jsonl")
+    (entry,) = read_plan(tmp_path / "plan.jsonl")
+    assert header == PlanHeader("cdj-3000")
+    assert entry.target_sample_rate == 88200
+
+    execute_plan([entry], jobs=1, profile=header.profile)
+
+    assert sf.info(file_name).samplerate == 88200
+    assert states[0] == journal.PLANNED
+    assert states[-1] == journal.COMMITTED
@@ -0,0 +1,67 @@
+import os
+import shutil
+
+from audio_conversion_tools import probe_cache
+from audio_conversion_tools.convert_audio import probe_file
+from audio_conversion_tools.probe_cache import ProbeCache, ProbeResult
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def test_probe_is_cached_until_file_changes(tmp_path):
+    file_name = tmp_path / "silence.wav"
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+
+    with ProbeCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get(file_name) is None
+        assert probe_file(file_name, cache=cache) == ProbeResult(
+            samplerate=88200, subtype="PCM_32", channels=1, frames=8820
+        )
+        assert cache.get(file_name) == probe_file(file_name)
+
+        stat = os.stat(file_name)
+        os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert cache.get(file_name) is None
+
+    with ProbeCache(tmp_path / "cache.sqlite") as cache:
+        assert probe_file(file_name, cache=cache).samplerate == 88200
+        assert cache.get(file_name) is not None
+
+
+def test_least_recently_used_probes_are_evicted(tmp_path):
+    result = ProbeResult(samplerate=44100, subtype="PCM_16", channels=2, frames=1)
+    files = []
+    for i in range(12):
+        files.append(tmp_path / f"{i}.wav")
+        files[-1].touch()
+
+    with ProbeCache(tmp_path / "cache.sqlite", max_entries=10) as cache:
+        for file_name in files[:10]:
+            cache.put(file_name, result)
+        cache.get(files[0])
+        for file_name in files[10:]:
+            cache.put(file_name, result)
+
+        assert cache.get(files[0]) == result
+        assert cache.get(files[1]) is None
+        assert cache.get(files[11]) == result
+
+
+def test_cache_is_shared_between_processes(tmp_path, monkeypatch):
+    # Another process would wait for the lock, and fail after the timeout.
+    monkeypatch.setattr(probe_cache, "_BUSY_TIMEOUT", 0.1)
+    result = ProbeResult(samplerate=44100, subtype="PCM_16", channels=2, frames=1)
+    files = []
+    for i in range(4):
+        files.append(tmp_path / f"{i}.wav")
+        files[-1].touch()
+
+    with ProbeCache(tmp_path / "cache.sqlite") as first, ProbeCache(tmp_path / "cache.sqlite") as second:
+        first.put(files[0], result)
+        assert second.get(files[0]) == result
+        second.put(files[1], result)
+        assert first.get(files[1]) == result
+        assert first.get(files[0]) == result
+        first.put(files[2], result)
+        second.put(files[3], result)
+        assert first.get(files[3]) == result
@@ -0,0 +1,80 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.revert_conversion import plan_restores, restore_files
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def _converted(tmp_path: Path, name: str) -> tuple[Path, Path]:
+    file_location = tmp_path / "library" / name
+    archive_location = tmp_path / "archive" / name
+    file_location.parent.mkdir(exist_ok=True)
+    archive_location.parent.mkdir(exist_ok=True)
+    file_location.write_bytes(b"converted")
+    shutil.copy(TEST_WAV_LOCATION, archive_location)
+    return file_location, archive_location
+
+
+def test_plan_keeps_the_latest_conversion(tmp_path):
+    file_location, archive_location = _converted(tmp_path, "a.wav")
+    ledger = ConversionLedger(tmp_path / "archive")
+    ledger.add(file_location, tmp_path / "archive" / "old.wav", 96000, 24, 48000, 16)
+    ledger.add(file_location, archive_location, 96000, 24, 48000, 16)
+    # Missing from the archive, so it can't be restored.
+    ledger.add(tmp_path / "library" / "b.wav", tmp_path / "archive" / "b.wav", 96000, 24, 48000, 16)
+
+    (restore,) = plan_restores(tmp_path / "archive")
+
+    assert restore.file_location == str(file_location)
+    assert restore.archive_location == str(archive_location)
+    assert restore.size == archive_location.stat().st_size
+    assert restore.same_device
+
+
+def test_plan_reads_the_given_csv(tmp_path):
+    ledger = ConversionLedger(tmp_path / "archive")
+    for name in ["a.wav", "b.wav"]:
+        file_location, archive_location = _converted(tmp_path, name)
+        ledger.add(file_location, archive_location, 88200, 24, 44100, 16)
+    # Only a.wav is in the CSV that is reverted.
+    rows = (tmp_path / "archive" / "converted.csv").read_text().splitlines(keepends=True)
+    (tmp_path / "archive" / "converted_a.csv").write_text(rows[0])
+
+    (restore,) = plan_restores(tmp_path / "archive", tmp_path / "archive" / "converted_a.csv")
+
+    assert restore.file_location == str(tmp_path / "library" / "a.wav")
+    assert len(plan_restores(tmp_path / "archive")) == 2
+
+
+def test_restore_renames_and_copies(tmp_path, monkeypatch):
+    ledger = ConversionLedger(tmp_path / "archive")
+    for name in ["a.wav", "b.wav", "c.wav"]:
+        file_location, archive_location = _converted(tmp_path, name)
+        ledger.add(file_location, archive_location, 88200, 24, 44100, 16)
+    # b.wav and c.wav are restored as if the archive is on another drive.
+    restores = [
+        restore._replace(same_device=restore.file_location.endswith("a.wav"))
+        for restore in plan_restores(tmp_path / "archive")
+    ]
+    rename = os.rename
+
+    def rename_within_device(source, destination):
+        if not str(destination).endswith("a.wav"):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        rename(source, destination)
+
+    monkeypatch.setattr(os, "rename", rename_within_device)
+
+    summary = restore_files(tmp_path / "archive", restores, jobs=2, verify_contents=True)
+
+    assert len(summary.succeeded) == 3
+    for name in ["a.wav", "b.wav", "c.wav"]:
+        assert (tmp_path / "library" / name).read_bytes() == Path(TEST_WAV_LOCATION).read_bytes()
+        assert not (tmp_path / "archive" / name).exists()
+    # All of them are logged in reverted.csv, so nothing is left to restore.
+    assert len(ConversionLedger(tmp_path / "archive")) == 0
+    assert plan_restores(tmp_path / "archive") == []
@@ -0,0 +1,102 @@
+import shutil
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import soundfile as sf
+
+from audio_conversion_tools.convert_audio import convert_wav_to_16bit, estimate_16bit_size
+from audio_conversion_tools.dedup import same_content
+from audio_conversion_tools.pipeline import PipelineConfig
+from audio_conversion_tools.rekordbox.conversion_ledger import ConversionLedger
+from audio_conversion_tools.rekordbox.convert_audio import convert_files
+from audio_conversion_tools.scratch import PARTIAL_PREFIX, ByteBudget, ScratchFolder, write_back
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+def test_byte_budget_blocks_until_released():
+    budget = ByteBudget(100)
+    budget.acquire(60)
+    acquired = threading.Event()
+
+    thread = threading.Thread(target=lambda: (budget.acquire(60), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+
+    budget.release(60)
+    assert acquired.wait(1)
+    thread.join()
+    budget.release(60)
+
+    # Larger than the budget, but nothing else is using it.
+    budget.acquire(1000)
+    assert budget.in_use == 1000
+
+
+def test_workspaces_are_removed_and_released(tmp_path):
+    scratch = ScratchFolder(tmp_path / "scratch", budget=100)
+    with scratch.workspace(80) as workspace:
+        (workspace / "output.wav").write_bytes(b"conversion")
+        assert scratch.budget.in_use == 80
+
+    assert not workspace.exists()
+    assert scratch.budget.in_use == 0
+
+
+def test_write_back_replaces_destination(tmp_path):
+    (tmp_path / "output.wav").write_bytes(b"conversion")
+    (tmp_path / "track.wav").write_bytes(b"original")
+
+    write_back(tmp_path / "output.wav", tmp_path / "track.wav")
+
+    assert (tmp_path / "track.wav").read_bytes() == b"conversion"
+    assert not (tmp_path / f"{PARTIAL_PREFIX}track.wav").exists()
+
+
+def test_convert_in_scratch_folder(tmp_path):
+    file_name = tmp_path / "track.wav"
+    shutil.copy(TEST_WAV_LOCATION, file_name)
+    scratch = ScratchFolder(tmp_path / "scratch")
+
+    assert convert_wav_to_16bit(str(file_name), str(tmp_path / "archive.wav"), scratch=scratch)
+
+    assert sf.info(str(file_name)).subtype == "PCM_16"
+    assert same_content(tmp_path / "archive.wav", TEST_WAV_LOCATION)
+    assert list(scratch.folder.iterdir()) == []
+    assert scratch.budget.in_use == 0
+
+
+def test_estimate_covers_upsampled_conversions(tmp_path):
+    file_name = tmp_path / "low.wav"
+    sf.write(file_name, np.zeros((22050, 2)), 22050, subtype="PCM_16")
+    input_size = file_name.stat().st_size
+
+    estimate = estimate_16bit_size(file_name, 44100)
+    assert convert_wav_to_16bit(str(file_name), str(tmp_path / "archive.wav"))
+
+    assert input_size < file_name.stat().st_size <= estimate
+
+
+def test_pipelined_conversion_stages_inputs_in_scratch_folder(tmp_path):
+    archive_folder = tmp_path / "archive"
+    archive_folder.mkdir()
+    files = [tmp_path / f"track {i}.wav" for i in range(3)]
+    for i, file_name in enumerate(files):
+        # Different content, so every file is converted instead of copied.
+        sf.write(file_name, sf.read(TEST_WAV_LOCATION)[0] + i / 10, 88200, subtype="PCM_24")
+    scratch = ScratchFolder(tmp_path / "scratch", budget=1)
+
+    convert_files(
+        [SimpleNamespace(Location=str(file_name)[1:], Kind="WAV File") for file_name in files],
+        archive_folder,
+        jobs=2,
+        pipeline=PipelineConfig(io_jobs=2),
+        scratch=scratch,
+    )
+
+    ledger = ConversionLedger(archive_folder)
+    for file_name in files:
+        assert file_name in ledger
+        assert sf.info(str(file_name)).subtype == "PCM_16"
+    assert list(scratch.folder.iterdir()) == []
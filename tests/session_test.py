@@ -0,0 +1,99 @@
+import shutil
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_conversion_tools import ffmpeg_runner
+from audio_conversion_tools.convert_audio import get_file_info
+from audio_conversion_tools.session import ConversionSession
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+TEST_AIFF_LOCATION = "tests/test_audio/silence.aiff"
+
+
+@pytest.fixture
+def session(tmp_path):
+    with ConversionSession(jobs=2, cache=False, ffmpeg_log=tmp_path / "ffmpeg_log.log") as session:
+        yield session
+
+
+def test_submit_converts_for_the_profile(tmp_path, session):
+    wav = tmp_path / "track.wav"
+    aiff = tmp_path / "track.aiff"
+    flac = tmp_path / "album.flac"
+    playable = tmp_path / "playable.wav"
+    shutil.copy(TEST_WAV_LOCATION, wav)
+    shutil.copy(TEST_AIFF_LOCATION, aiff)
+    sf.write(flac, np.zeros((4410, 2)), 44100, subtype="PCM_24")
+    sf.write(playable, np.zeros((4410, 2)), 44100, subtype="PCM_16")
+
+    futures = [session.submit(file_name) for file_name in [wav, aiff, flac, playable, tmp_path / "track.mp3"]]
+
+    assert [future.result() for future in futures] == [True, True, True, True, False]
+    assert get_file_info(wav) == (44100, 16)
+    assert get_file_info(aiff) == (44100, 16)
+    assert get_file_info(tmp_path / "track_temp.wav") == (88200, 32)
+    assert get_file_info(tmp_path / "track_temp.aiff") == (88200, 32)
+    assert get_file_info(tmp_path / "album.aiff") == (44100, 16)
+    assert flac.exists()
+    assert (tmp_path / "ffmpeg_log.log").stat().st_size > 0
+
+
+def test_session_is_reused_across_batches(tmp_path, session):
+    for batch in range(3):
+        files = [tmp_path / f"batch {batch} track {i}.wav" for i in range(3)]
+        for file_name in files:
+            shutil.copy(TEST_WAV_LOCATION, file_name)
+
+        summary = session.run(files)
+
+        assert sorted(result.item for result in summary.succeeded) == sorted(str(file_name) for file_name in files)
+        assert all(get_file_info(file_name) == (44100, 16) for file_name in files)
+
+
+def test_map_bounds_the_files_in_flight(tmp_path, session):
+    taken = 0
+
+    def files():
+        nonlocal taken
+        for i in range(10):
+            taken += 1
+            yield tmp_path / f"{i}.mp3"
+
+    max_in_flight = 0
+    for num_yielded, result in enumerate(session.map(files(), max_in_flight=3)):
+        max_in_flight = max(max_in_flight, taken - num_yielded)
+        assert not result.success
+
+    assert taken == 10
+    # The files in flight, plus the one that is waiting to be submitted.
+    assert max_in_flight <= 4
+
+
+def test_delete_originals(tmp_path):
+    wav = tmp_path / "track.wav"
+    shutil.copy(TEST_WAV_LOCATION, wav)
+
+    with ConversionSession(cache=False, delete_originals=True, ffmpeg_log=tmp_path / "ffmpeg_log.log") as session:
+        assert session.submit(wav).result()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["ffmpeg_log.log", "track.wav"]
+    with pytest.raises(RuntimeError):
+        session.submit(wav)
+
+
+def test_sessions_can_be_closed_in_any_order(tmp_path):
+    wav = tmp_path / "track.wav"
+    shutil.copy(TEST_WAV_LOCATION, wav)
+    current_runner = ffmpeg_runner._current_runner
+
+    first = ConversionSession(cache=False, batch_size=2, ffmpeg_log=tmp_path / "first.log")
+    second = ConversionSession(cache=False, ffmpeg_log=tmp_path / "second.log")
+    first.shutdown()
+
+    assert second.submit(wav).result()
+    second.shutdown()
+    assert get_file_info(wav) == (44100, 16)
+    assert (tmp_path / "second.log").stat().st_size > 0
+    assert ffmpeg_runner._current_runner is current_runner
@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+
+from audio_conversion_tools.rekordbox.classify import CollectionClassification, classify_tracks
+from audio_conversion_tools.rekordbox.track_table import TrackTable
+from audio_conversion_tools.rekordbox.xml_reader import TrackRecord
+
+
+def test_bit_depth_falls_back_to_bit_rate():
+    table = TrackTable.from_tracks(
+        [
+            TrackRecord("a.wav", "WAV File", 44100, 2117, BitDepth=None),
+            TrackRecord("b.wav", "WAV File", 44100, 2117, BitDepth=0),
+            TrackRecord("c.wav", "WAV File", 44100, 2117, BitDepth=16),
+            TrackRecord("d.wav", "WAV File", 0, 0, BitDepth=None),
+        ]
+    )
+
+    assert table.bit_depths.tolist() == [24, 24, 16, 0]
+
+
+def test_missing_kind_never_matches():
+    table = TrackTable.from_tracks(
+        [
+            TrackRecord("a.wav", None, 96000, 4608),
+            TrackRecord("b.flac", "FLAC File", 44100, 1000),
+            TrackRecord("c.aiff", "AIFF File", 96000, 4608),
+        ]
+    )
+
+    assert table.frame["Kind"].cat.codes.tolist()[0] == -1
+    assert table.lossless_mask.tolist() == [False, False, True]
+    assert table.flac_mask.tolist() == [False, True, False]
+    assert table.unplayable_mask.tolist() == [False, False, True]
+
+
+def test_records_round_trip():
+    tracks = [
+        TrackRecord("a.wav", "WAV File", 96000, 4608, BitDepth=24),
+        TrackRecord("b.aiff", "AIFF File", 44100, 2822, BitDepth=None),
+    ]
+    table = TrackTable.from_tracks(tracks)
+
+    records = table.records(np.ones(len(tracks), dtype=bool))
+
+    assert records == tracks
+    assert [type(record.SampleRate) for record in records] == [int, int]
+    assert records[1].BitDepth is None
+
+
+def test_classify_tracks_flushes_slow_readers():
+    def slow_tracks():
+        yield TrackRecord("a.wav", "WAV File", 96000, 4608)
+        time.sleep(0.2)
+        yield TrackRecord("b.wav", "WAV File", 96000, 4608)
+
+    to_convert = classify_tracks(slow_tracks(), CollectionClassification(), chunk_size=1_000, max_wait=0.1)
+    start = time.monotonic()
+    first = next(to_convert)
+
+    assert first.Location == "a.wav"
+    # The first track is yielded when the chunk times out, not when the collection is read.
+    assert time.monotonic() - start < 1
+    assert [track.Location for track in to_convert] == ["b.wav"]
+
+
+def test_classifies_100k_tracks_quickly():
+    kinds = ["WAV File", "AIFF File", "FLAC File", "MP3 File"]
+    tracks = [
+        TrackRecord(f"Music/{i}.wav", kinds[i % 4], [44100, 48000, 96000][i % 3], 1411, BitDepth=[16, 24, 32][i % 3])
+        for i in range(100_000)
+    ]
+
+    start = time.perf_counter()
+    table = TrackTable.from_tracks(tracks)
+    num_unplayable = int(table.unplayable_mask.sum())
+    num_flacs = int(table.flac_mask.sum())
+    elapsed = time.perf_counter() - start
+
+    # Every third track is 96kHz / 32 bit, half of the tracks are WAV or AIFF.
+    assert num_unplayable == sum(1 for i in range(100_000) if i % 4 < 2 and i % 3 == 2)
+    assert num_flacs == 25_000
+    # Generous bound for slow CI machines, this takes well under a second on a laptop.
+    assert elapsed < 5
@@ -0,0 +1,90 @@
+import os
+
+from audio_conversion_tools.utils import find_files, scan_files
+
+
+def _touch(path, content=b""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+def _make_tree(root):
+    _touch(root / "a.wav", b"1234")
+    _touch(root / "b.AIFF")
+    _touch(root / "notes.txt")
+    _touch(root / "label" / "artist" / "c.flac")
+    _touch(root / "label" / "artist" / "d.aif")
+    _touch(root / "promo" / "e.wav")
+
+
+def test_find_files_non_recursive_uses_root_directory(tmp_path, monkeypatch):
+    _make_tree(tmp_path)
+    monkeypatch.chdir(tmp_path / "label")
+
+    files = sorted(find_files(tmp_path, extensions=[".wav", ".aiff"]))
+
+    assert files == [str(tmp_path / "a.wav"), str(tmp_path / "b.AIFF")]
+
+
+def test_find_files_recursive(tmp_path):
+    _make_tree(tmp_path)
+
+    files = sorted(find_files(tmp_path, extensions=[".wav", ".flac", ".aif"], recursive=True))
+
+    assert files == sorted(
+        str(tmp_path / name) for name in ["a.wav", "label/artist/c.flac", "label/artist/d.aif", "promo/e.wav"]
+    )
+
+
+def test_find_files_include_and_exclude(tmp_path):
+    _make_tree(tmp_path)
+
+    files = sorted(find_files(tmp_path, extensions=[".wav", ".flac"], recursive=True, exclude=["promo"]))
+    assert files == [str(tmp_path / "a.wav"), str(tmp_path / "label" / "artist" / "c.flac")]
+
+    files = list(find_files(tmp_path, extensions=[".wav", ".flac"], recursive=True, include=["c.*"]))
+    assert files == [str(tmp_path / "label" / "artist" / "c.flac")]
+
+
+def test_scan_files_returns_stat_data(tmp_path):
+    _make_tree(tmp_path)
+
+    (scanned_file,) = scan_files(tmp_path, extensions=[".wav"])
+
+    assert scanned_file.size == 4
+    assert scanned_file.mtime_ns == os.stat(tmp_path / "a.wav").st_mtime_ns
+
+
+def test_find_files_does_not_stat(tmp_path, monkeypatch):
+    _make_tree(tmp_path)
+    stat_calls = []
+    scandir = os.scandir
+
+    class CountingEntry:
+        def __init__(self, entry):
+            self._entry = entry
+
+        def __getattr__(self, name):
+            return getattr(self._entry, name)
+
+        def stat(self, **kwargs):
+            stat_calls.append(self._entry.path)
+            return self._entry.stat(**kwargs)
+
+    class CountingScandir:
+        def __init__(self, directory):
+            self._entries = scandir(directory)
+
+        def __enter__(self):
+            return (CountingEntry(entry) for entry in self._entries)
+
+        def __exit__(self, *args):
+            self._entries.close()
+
+    monkeypatch.setattr(os, "scandir", CountingScandir)
+
+    assert len(list(find_files(tmp_path, extensions=[".wav"], recursive=True))) == 2
+    assert stat_calls == []
+    assert len(list(scan_files(tmp_path, extensions=[".wav"], recursive=True))) == 2
+    # Once while listing, the second call is answered from the DirEntry cache.
+    assert len(set(stat_calls)) == 2
@@ -0,0 +1,86 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from audio_conversion_tools.cli.convert_to_rekordbox_playable import convert_file
+from audio_conversion_tools.convert_audio import get_file_info
+from audio_conversion_tools.watch import watch_files
+
+TEST_WAV_LOCATION = "tests/test_audio/silence.wav"
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def watch(request, tmp_path):
+    stop = threading.Event()
+    files = watch_files(
+        [tmp_path],
+        extensions=[".wav"],
+        recursive=True,
+        exclude=[".*"],
+        settle_time=0.3,
+        poll_interval=0.05,
+        use_inotify=request.param,
+        stop=stop,
+    )
+    yield files
+    stop.set()
+    files.close()
+
+
+def test_existing_files_are_yielded_first(tmp_path):
+    (tmp_path / "a.wav").write_bytes(b"a")
+    (tmp_path / "b.mp3").write_bytes(b"b")
+    stop = threading.Event()
+
+    files = watch_files([tmp_path], extensions=[".wav"], settle_time=0, poll_interval=0.05, stop=stop)
+
+    assert next(files) == str(tmp_path / "a.wav")
+    stop.set()
+    assert list(files) == []
+
+
+def test_files_are_yielded_once_written(tmp_path, watch):
+    file_name = tmp_path / "download.wav"
+
+    def download():
+        with open(file_name, "wb") as file:
+            for _ in range(5):
+                file.write(b"x" * 1000)
+                file.flush()
+                time.sleep(0.1)
+
+    downloader = threading.Thread(target=download)
+    downloader.start()
+
+    assert next(watch) == str(file_name)
+    assert os.path.getsize(file_name) == 5000
+    downloader.join()
+
+
+def test_only_new_and_changed_files_are_yielded(tmp_path, watch):
+    (tmp_path / "subfolder").mkdir()
+    (tmp_path / "a.wav").write_bytes(b"a")
+    assert next(watch) == str(tmp_path / "a.wav")
+
+    (tmp_path / ".partial_b.wav").write_bytes(b"b")
+    (tmp_path / "b.txt").write_bytes(b"b")
+    (tmp_path / "subfolder" / "b.wav").write_bytes(b"b")
+    assert next(watch) == str(tmp_path / "subfolder" / "b.wav")
+
+    (tmp_path / "a.wav").write_bytes(b"changed")
+    assert next(watch) == str(tmp_path / "a.wav")
+
+
+def test_convert_file(tmp_path):
+    wav = tmp_path / "track.wav"
+    shutil.copy(TEST_WAV_LOCATION, wav)
+
+    assert convert_file(str(wav), delete_files=True)
+    # The AIFF of the WAV is picked up by the watcher as well, and is already 16 bit.
+    assert convert_file(str(tmp_path / "track.aiff"))
+
+    assert not wav.exists()
+    assert get_file_info(tmp_path / "track.aiff") == (44100, 16)
@@ -0,0 +1,58 @@
+from pyrekordbox.xml import RekordboxXml
+
+from audio_conversion_tools.rekordbox.classify import CollectionClassification, classify_tracks
+from audio_conversion_tools.rekordbox.xml_reader import iter_tracks
+
+REKORDBOX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<DJ_PLAYLISTS Version="1.0.0">
+  <PRODUCT Name="rekordbox" Version="6.8.5" Company="AlphaTheta"/>
+  <COLLECTION Entries="5">
+    <TRACK TrackID="1" Name="Hi-res" Kind="WAV File" SampleRate="96000" BitRate="4608"
+           Location="file://localhost/Music/Label/Hi%20res.wav">
+      <TEMPO Inizio="0.025" Bpm="128.00" Metro="4/4" Battito="1"/>
+    </TRACK>
+    <TRACK TrackID="2" Name="Playable" Kind="AIFF File" SampleRate="44100" BitRate="1411"
+           Location="file://localhost/Music/Label/Playable.aiff"/>
+    <TRACK TrackID="3" Name="32 bit" Kind="AIFF File" SampleRate="44100" BitRate="2822"
+           Location="file://localhost/Music/Label/32%20bit.aiff"/>
+    <TRACK TrackID="4" Name="Flac" Kind="FLAC File" SampleRate="44100" BitRate="1000"
+           Location="file://localhost/Music/Label/Flac.flac"/>
+    <TRACK TrackID="5" Name="Mp3" Kind="MP3 File" SampleRate="44100" BitRate="320"
+           Location="file://localhost/Music/Label/Mp3.mp3"/>
+  </COLLECTION>
+  <PLAYLISTS>
+    <NODE Type="0" Name="ROOT" Count="1">
+      <NODE Name="Playlist" Type="1" KeyType="0" Entries="1">
+        <TRACK Key="1"/>
+      </NODE>
+    </NODE>
+  </PLAYLISTS>
+</DJ_PLAYLISTS>
+"""
+
+
+def test_iter_tracks_matches_pyrekordbox(tmp_path):
+    xml_location = tmp_path / "rekordbox.xml"
+    xml_location.write_text(REKORDBOX_XML)
+
+    tracks = list(iter_tracks(xml_location))
+    expected = RekordboxXml(xml_location).get_tracks()
+
+    assert [track.Location for track in tracks] == [track.Location for track in expected]
+    assert [track.Kind for track in tracks] == [track.Kind for track in expected]
+    assert [track.SampleRate for track in tracks] == [int(track.SampleRate) for track in expected]
+    assert [track.BitRate for track in tracks] == [track.BitRate for track in expected]
+
+
+def test_classify_tracks_in_one_pass(tmp_path):
+    xml_location = tmp_path / "rekordbox.xml"
+    xml_location.write_text(REKORDBOX_XML)
+
+    classification = CollectionClassification()
+    to_convert = list(classify_tracks(iter_tracks(xml_location), classification))
+
+    assert [track.Location for track in to_convert] == ["Music/Label/Hi res.wav", "Music/Label/32 bit.aiff"]
+    assert classification.unplayable_files == to_convert
+    assert [track.Location for track in classification.flac_files] == ["Music/Label/Flac.flac"]
+    assert classification.num_tracks == 5
+    assert classification.num_lossless == 3